@@ -7,14 +7,14 @@ from config import Config
 db = SQLAlchemy()
 login_manager = LoginManager()
 
-def create_app():
+def create_app(config_class=Config):
     # Crear la aplicación Flask
     app = Flask(__name__, 
                 static_folder='static',
                 static_url_path='/static')
     
     # Cargar configuración
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
     
     # Inicializar la base de datos con la app
     db.init_app(app)
@@ -23,6 +23,48 @@ def create_app():
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Por favor inicia sesión para acceder a esta página.'
+
+    # Inicializar el pool de hash de contraseñas
+    from app.services.passwords import password_service
+    password_service.init_app(app)
+
+    # Límite de intentos fallidos de login
+    from app.services.login_throttle import login_throttle
+    login_throttle.init_app(app)
+
+    # Cache del usuario autenticado
+    from app.services.user_cache import user_cache
+    user_cache.init_app(app)
+
+    # Catálogos (tablas de referencia) cacheados por worker
+    from app.services.catalogos import catalogos, registrar_catalogos
+    catalogos.init_app(app)
+    registrar_catalogos()
+
+    # Asignador de IDs por bloques (tabla Secuencias)
+    from app.services.ids import id_allocator
+    id_allocator.init_app(app)
+
+    # Filtro de emails registrados (registro sin consultar la base)
+    from app.services.emails import emails_registrados
+    emails_registrados.init_app(app)
+
+    # Índices en memoria para sugerir posibles duplicados
+    from app.services.duplicados import duplicados
+    duplicados.init_app(app)
+
+    # Números de factura por bloques del CAI de cada sucursal
+    from app.services.facturacion import numeros_factura
+    numeros_factura.init_app(app)
+
+    # Conteos de uso agregados (GROUP BY) para los listados de catálogos
+    from app.services.conteos import conteos_uso, registrar_conteos
+    conteos_uso.init_app(app)
+    registrar_conteos()
+
+    # Libros más vendidos por categoría y sucursal, cacheados por período
+    from app.services.top_ventas import top_ventas
+    top_ventas.init_app(app)
     
     # Registrar blueprints (rutas)
     from app.routes import main
@@ -32,6 +74,7 @@ def create_app():
     from app.routes.tipos_documentos import tipos_documentos_bp
     from app.routes.categorias import categorias_bp
     from app.routes.estado_usuarios import estado_usuarios_bp
+    from app.routes.reportes import reportes_bp
     
     app.register_blueprint(main)
     app.register_blueprint(auth)
@@ -40,10 +83,15 @@ def create_app():
     app.register_blueprint(tipos_documentos_bp)
     app.register_blueprint(categorias_bp)
     app.register_blueprint(estado_usuarios_bp)
+    app.register_blueprint(reportes_bp)
+
+    # Comandos de administración (flask <comando>)
+    from app.commands import register_commands
+    register_commands(app)
 
     return app
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import Clientes
-    return db.session.get(Clientes, int(user_id))
\ No newline at end of file
+    from app.services.user_cache import user_cache, cargar_usuario_sesion
+    return user_cache.get(int(user_id), cargar_usuario_sesion)
\ No newline at end of file
@@ -0,0 +1,481 @@
+import os
+
+import click
+
+
+def register_commands(app):
+    """Registrar comandos de administración en `flask`"""
+
+    @app.cli.command('crear-tablas-soporte')
+    def crear_tablas_soporte():
+        """Crear las tablas, columnas e índices de soporte de la aplicación si no existen"""
+        from sqlalchemy import func, inspect, select
+        from sqlalchemy.schema import CreateColumn
+        from app import db
+        from models import Base, TABLAS_SOPORTE, COLUMNAS_SOPORTE, INDICES_SOPORTE
+
+        Base.metadata.create_all(db.engine, tables=TABLAS_SOPORTE, checkfirst=True)
+        for tabla in TABLAS_SOPORTE:
+            click.echo(f'✅ {tabla.name}')
+
+        preparer = db.engine.dialect.identifier_preparer
+        for columna, nombre_indice in COLUMNAS_SOPORTE:
+            tabla = columna.table
+            inspector = inspect(db.engine)
+            if columna.name not in {c['name'] for c in inspector.get_columns(tabla.name)}:
+                ddl = CreateColumn(columna).compile(dialect=db.engine.dialect)
+                with db.engine.begin() as conn:
+                    conn.exec_driver_sql(f'ALTER TABLE {preparer.format_table(tabla)} ADD {ddl}')
+            indice = next(i for i in tabla.indexes if i.name == nombre_indice)
+            if nombre_indice not in {i['name'] for i in inspector.get_indexes(tabla.name)}:
+                if indice.unique:
+                    repetidos = db.session.execute(
+                        select(columna, func.count()).group_by(columna).having(func.count() > 1).limit(20)
+                    ).all()
+                    if repetidos:
+                        for valor, cantidad in repetidos:
+                            click.echo(f'  {valor!r} aparece {cantidad} veces', err=True)
+                        click.echo(f'❌ {tabla.name}.{columna.name}: corrige los duplicados y vuelve a ejecutar', err=True)
+                        continue
+                indice.create(db.engine)
+            click.echo(f'✅ {tabla.name}.{columna.name} ({nombre_indice})')
+
+        for indice in INDICES_SOPORTE:
+            if indice.name not in {i['name'] for i in inspect(db.engine).get_indexes(indice.table.name)}:
+                if indice.unique:
+                    columnas = list(indice.columns)
+                    repetidos = db.session.execute(
+                        select(*columnas, func.count()).group_by(*columnas).having(func.count() > 1).limit(20)
+                    ).all()
+                    if repetidos:
+                        for *valores, cantidad in repetidos:
+                            click.echo(f'  {tuple(valores)!r} aparece {cantidad} veces', err=True)
+                        click.echo(f'❌ {indice.table.name} ({indice.name}): corrige los duplicados y vuelve a ejecutar',
+                                   err=True)
+                        continue
+                indice.create(db.engine)
+            click.echo(f'✅ {indice.table.name} ({indice.name})')
+
+    @app.cli.command('calibrar-bcrypt')
+    @click.option('--objetivo-ms', default=250, show_default=True, help='Latencia objetivo por hash en milisegundos')
+    @click.option('--costo-min', default=10, show_default=True)
+    @click.option('--costo-max', default=16, show_default=True)
+    def calibrar_bcrypt(objetivo_ms, costo_min, costo_max):
+        """Medir bcrypt en este host y recomendar BCRYPT_ROUNDS"""
+        from app.services.passwords import calibrar_costo
+
+        recomendado, tiempos = calibrar_costo(objetivo_ms, costo_min, costo_max)
+        for costo, ms in tiempos.items():
+            marca = '  <-- recomendado' if costo == recomendado else ''
+            click.echo(f'rounds={costo:2d}  {ms:8.1f} ms{marca}')
+        click.echo(f'\nBCRYPT_ROUNDS={recomendado} (actual: {app.config.get("BCRYPT_ROUNDS")})')
+        click.echo('Los hashes existentes se re-hashean automáticamente en el siguiente login.')
+
+    @app.cli.command('medir-validaciones')
+    @click.option('--filas', default=100000, show_default=True, help='Filas sintéticas por esquema')
+    def medir_validaciones(filas):
+        """Medir validaciones por segundo de los esquemas de formularios"""
+        import time
+        from app.services.validacion import ESQUEMA_AUTOR, ESQUEMA_CLIENTE
+
+        muestras = {
+            'clientes': (ESQUEMA_CLIENTE, [
+                {'nombres': 'María José', 'apellidos': 'López Díaz', 'email': 'maria.lopez@correo.hn',
+                 'telefono': '+504 9999-8888', 'direccion': 'Col. Centro, casa 12', 'observaciones': ''},
+                {'nombres': 'Juan3', 'apellidos': 'Pérez', 'email': 'x@dominiomuylargo.com',
+                 'telefono': '2222-1111', 'direccion': 'Col', 'observaciones': 'Cliente frecuente'},
+            ]),
+            'autores': (ESQUEMA_AUTOR, [
+                {'nombres': 'Gabriel', 'apellidos': 'García Márquez', 'nacionalidad': 'Colombiana',
+                 'fecha_nacimiento': '1927-03-06'},
+                {'nombres': 'Jorge Luis', 'apellidos': 'Borges', 'nacionalidad': 'Argentina',
+                 'fecha_nacimiento': '1899-13-24'},
+            ]),
+        }
+        for nombre, (esquema, ejemplos) in muestras.items():
+            lote = [ejemplos[i % len(ejemplos)] for i in range(filas)]
+            inicio = time.perf_counter()
+            resultado = esquema.validar_lote(lote)
+            segundos = time.perf_counter() - inicio
+            con_error = sum(1 for errores in resultado if errores)
+            click.echo(f'{nombre:9s} {filas / segundos:12,.0f} filas/s  '
+                       f'{filas * len(esquema.campos) / segundos:12,.0f} validaciones/s  '
+                       f'({con_error} con error)')
+
+    @app.cli.command('medir-impuestos')
+    @click.option('--lineas', default=1000000, show_default=True, help='Líneas de venta sintéticas')
+    @click.option('--verificar', default=200000, show_default=True,
+                  help='Líneas comparadas contra el cálculo con Decimal')
+    def medir_impuestos(lineas, verificar):
+        """Medir el cálculo de totales de Venta por lotes y compararlo con Decimal"""
+        import random
+        import time
+        from array import array
+        from app.services.impuestos import (ReglasImpuestos, a_decimal, calcular_decimal, calcular_lote,
+                                            TASA_15, TASA_18)
+
+        aleatorio = random.Random(7)
+        reglas = ReglasImpuestos(TASA_15, TASA_18, frozenset(range(0, 5000, 7)), frozenset(range(0, 5000, 11)))
+        por_venta, libros, cantidades, precios = [], array('q'), array('q'), array('q')
+        while len(libros) < lineas:
+            n = min(aleatorio.randint(1, 8), lineas - len(libros))
+            por_venta.append(n)
+            for _ in range(n):
+                libros.append(aleatorio.randrange(5000))
+                cantidades.append(aleatorio.randint(1, 5))
+                precios.append(aleatorio.randint(1, 250000))
+        descuentos = [aleatorio.choice((0, 0, 0, aleatorio.randint(1, 50000))) for _ in por_venta]
+        exoneradas = [int(aleatorio.random() < 0.05) for _ in por_venta]
+
+        inicio = time.perf_counter()
+        totales = calcular_lote(por_venta, reglas.clases(libros), cantidades, precios, descuentos, exoneradas,
+                                reglas)
+        segundos = time.perf_counter() - inicio
+        click.echo(f'centavos {lineas / segundos:12,.0f} líneas/s  {len(por_venta) / segundos:10,.0f} ventas/s')
+
+        inicio, linea, diferencias, comparadas = time.perf_counter(), 0, 0, 0
+        por_fila = list(zip(*totales))
+        for i, n in enumerate(por_venta):
+            if linea >= verificar:
+                break
+            referencia = calcular_decimal(
+                [(libros[j], cantidades[j], a_decimal(precios[j])) for j in range(linea, linea + n)],
+                reglas, a_decimal(descuentos[i]), exoneradas[i])
+            if tuple(referencia) != tuple(map(a_decimal, por_fila[i])):
+                diferencias += 1
+            linea += n
+            comparadas += 1
+        segundos = time.perf_counter() - inicio
+        click.echo(f'Decimal  {linea / segundos:12,.0f} líneas/s  {comparadas / segundos:10,.0f} ventas/s')
+        click.echo(f'{comparadas} ventas comparadas con Decimal: {diferencias} diferencias')
+
+    @app.cli.command('medir-ventas')
+    @click.option('--sucursales', default=4, show_default=True)
+    @click.option('--cajas', default=2, show_default=True, help='Cajas (hilos) por sucursal')
+    @click.option('--segundos', default=10.0, show_default=True)
+    @click.option('--libros', default=500, show_default=True, help='Libros del catálogo sintético')
+    @click.option('--lineas', default=4, show_default=True, help='Máximo de libros por carrito')
+    @click.option('--base', type=click.Path(dir_okay=False),
+                  help='Archivo SQLite a crear (por defecto uno temporal que se borra al terminar)')
+    def medir_ventas_cmd(sucursales, cajas, segundos, libros, lineas, base):
+        """Medir ventas por segundo por sucursal con procesar_venta sobre una base SQLite sintética"""
+        import tempfile
+        from app.services.banco_pruebas import medir_ventas
+
+        if base and os.path.exists(base):
+            raise click.ClickException(f'{base} ya existe; indica un archivo nuevo')
+        click.echo(f'{sucursales} sucursales × {cajas} cajas, {libros} libros, {segundos:.0f} s...')
+        with tempfile.TemporaryDirectory() as carpeta:
+            # App propia sobre SQLite: no toca la base configurada
+            medicion = medir_ventas(base or os.path.join(carpeta, 'ventas.db'), sucursales, cajas, segundos, libros,
+                                    max_lineas=lineas)
+
+        for id_sucursal, conteo in medicion.por_sucursal.items():
+            click.echo(f'sucursal {id_sucursal:3d} {conteo["ventas"] / medicion.segundos:10,.1f} ventas/s  '
+                       f'{conteo["rechazadas"]} rechazadas, {conteo["reintentos"]} reintentos, '
+                       f'{conteo["errores"]} errores')
+        total = sum(c['ventas'] for c in medicion.por_sucursal.values())
+        click.echo(f'total        {total / medicion.segundos:10,.1f} ventas/s con {sucursales * cajas} cajas '
+                   f'en {medicion.segundos:.1f} s; números de factura repetidos: {medicion.facturas_repetidas}')
+
+    @app.cli.command('recalcular-impuestos')
+    @click.option('--desde', type=click.DateTime(['%Y-%m-%d']), required=True)
+    @click.option('--hasta', type=click.DateTime(['%Y-%m-%d']), required=True, help='Exclusiva')
+    @click.option('--lote', default=20000, show_default=True, help='Ventas por transacción')
+    @click.option('--simular', is_flag=True, help='Solo contar las ventas cuyo total cambiaría')
+    def recalcular_impuestos(desde, hasta, lote, simular):
+        """Recalcular subtotal, descuento, ISV y totales de Venta con las reglas vigentes"""
+        import time
+        from app.services.impuestos import recalcular_ventas
+
+        inicio = time.perf_counter()
+        ventas, lineas, cambiadas = recalcular_ventas(desde, hasta, tamano_lote=lote, aplicar=not simular)
+        accion = 'cambiarían' if simular else 'cambiaron'
+        click.echo(f'{ventas} ventas ({lineas} líneas) en {time.perf_counter() - inicio:.1f} s; '
+                   f'{cambiadas} {accion} de total')
+        if cambiadas and not simular:
+            from datetime import timedelta
+            from app.services.resumenes import reconstruir
+
+            resultado = reconstruir(desde.date(), (hasta - timedelta(days=1)).date(), os.cpu_count())
+            click.echo(f'Resúmenes de {resultado.dias} días reconstruidos')
+
+    @app.cli.command('reconstruir-resumenes')
+    @click.option('--desde', type=click.DateTime(['%Y-%m-%d']), required=True)
+    @click.option('--hasta', type=click.DateTime(['%Y-%m-%d']), required=True, help='Incluida')
+    @click.option('--procesos', default=os.cpu_count() or 2, show_default=True, help='Tramos de días en paralelo')
+    def reconstruir_resumenes(desde, hasta, procesos):
+        """Recalcular Resumen_Ventas_Dia y Resumen_Ventas_Libro desde Venta, Detalle_Venta y Facturas_Sar"""
+        from app.services.resumenes import reconstruir
+
+        if hasta < desde:
+            raise click.UsageError('--hasta es anterior a --desde')
+        resultado = reconstruir(desde.date(), hasta.date(), procesos)
+        click.echo(f'{resultado.dias} días, {resultado.ventas} ventas en {resultado.segundos:.1f} s: '
+                   f'{resultado.filas_dia} filas por día y {resultado.filas_libro} por libro')
+
+    @app.cli.command('anular-venta')
+    @click.argument('id_venta', type=int)
+    def anular_venta_cmd(id_venta):
+        """Anular la factura de una venta y descontarla de los resúmenes"""
+        from app.services.ventas import anular_venta
+
+        try:
+            anulada = anular_venta(id_venta)
+        except LookupError as error:
+            raise click.ClickException(str(error))
+        click.echo(f'Venta {id_venta} anulada' if anulada else f'La venta {id_venta} ya estaba anulada')
+
+    @app.cli.command('buscar-duplicados')
+    @click.argument('entidad', type=click.Choice(['autores', 'clientes']))
+    @click.option('--umbral', default=None, type=float, help='Similitud mínima 0-1 (por defecto DUPLICADOS_UMBRAL)')
+    @click.option('--salida', type=click.Path(dir_okay=False), help='CSV con grupo, id y nombre')
+    def buscar_duplicados(entidad, umbral, salida):
+        """Agrupar registros posiblemente duplicados de toda la tabla"""
+        import time
+        from app.services.duplicados import DetectorDuplicados
+
+        umbral = umbral or app.config.get('DUPLICADOS_UMBRAL', 0.75)
+        inicio = time.perf_counter()
+        indice = DetectorDuplicados.construir(entidad, umbral)
+        construido = time.perf_counter() - inicio
+        grupos = indice.grupos()
+        total = time.perf_counter() - inicio
+
+        for numero, ids in enumerate(grupos, start=1):
+            click.echo(f'Grupo {numero}: ' + ' | '.join(f'#{i} {indice.registros[i][0]}' for i in ids))
+        click.echo(f'{len(indice.registros)} {entidad}, {len(grupos)} grupos '
+                   f'({sum(len(g) for g in grupos)} registros) en {total:.1f} s '
+                   f'(índice {construido:.1f} s)')
+        if salida:
+            import csv
+            with open(salida, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['grupo', 'id', 'nombre'])
+                for numero, ids in enumerate(grupos, start=1):
+                    for i in ids:
+                        writer.writerow([numero, i, indice.registros[i][0]])
+            click.echo(f'Grupos en {salida}')
+
+    @app.cli.command('conciliar-inventario')
+    @click.option('--procesos', default=os.cpu_count() or 2, show_default=True, help='Sucursales en paralelo')
+    @click.option('--lote', default=10000, show_default=True, help='Movimientos por lectura')
+    @click.option('--sucursal', 'sucursales', multiple=True, type=int, help='Solo estas sucursales (repetible)')
+    @click.option('--salida', type=click.Path(dir_okay=False), help='CSV con las diferencias')
+    @click.option('--corregir', is_flag=True, help='Reconstruir Stock_Actual y registrar ajustes contra Libros')
+    @click.option('--sucursal-ajuste', type=int, help='Sucursal donde se registran los ajustes (con --corregir)')
+    @click.option('--empleado', type=int, help='Empleado que firma los ajustes (con --corregir)')
+    def conciliar_inventario_cmd(procesos, lote, sucursales, salida, corregir, sucursal_ajuste, empleado):
+        """Verificar Stock_Actual y los totales de Libros contra el libro mayor (Inventarios)"""
+        from app.services.conciliacion import conciliar_inventario, corregir as aplicar_correcciones
+
+        if corregir and sucursales:
+            raise click.UsageError('--corregir requiere recorrer todas las sucursales (sin --sucursal)')
+        if corregir and (sucursal_ajuste is None or empleado is None):
+            raise click.UsageError('--corregir requiere --sucursal-ajuste y --empleado')
+
+        reporte = conciliar_inventario(procesos=procesos, tamano_lote=lote, sucursales=list(sucursales) or None)
+        for d in reporte.discrepancias[:50]:
+            sucursal = f' sucursal {d.id_sucursal}' if d.id_sucursal is not None else ''
+            click.echo(f'  [{d.tipo}] libro {d.id_libro}{sucursal} {d.formato}: '
+                       f'esperado {d.esperado}, registrado {d.registrado} ({d.detalle})', err=True)
+        if len(reporte.discrepancias) > 50:
+            click.echo(f'  ... y {len(reporte.discrepancias) - 50} más', err=True)
+        omitidas = f' (+{reporte.rupturas_omitidas} rupturas sin detalle)' if reporte.rupturas_omitidas else ''
+        click.echo(f'{reporte.movimientos} movimientos, {reporte.claves} claves, {reporte.sucursales} sucursales '
+                   f'en {reporte.segundos:.1f} s; diferencias: {reporte.por_tipo() or "ninguna"}{omitidas}')
+
+        if salida:
+            import csv
+            with open(salida, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['tipo', 'id_libro', 'id_sucursal', 'formato', 'esperado', 'registrado', 'detalle'])
+                writer.writerows(reporte.discrepancias)
+            click.echo(f'Diferencias en {salida}')
+
+        if corregir:
+            ajustes = aplicar_correcciones(reporte, sucursal_ajuste, empleado)
+            click.echo(f'Stock_Actual reconstruido; {len(ajustes)} movimientos de ajuste registrados')
+
+    @app.cli.command('cortes-inventario')
+    @click.option('--horas', type=int, default=None, help='Horas entre cortes (por defecto INVENTARIO_CORTE_HORAS)')
+    def cortes_inventario(horas):
+        """Registrar los cortes de inventario vencidos (ejecutar periódicamente, p. ej. con cron)"""
+        from app.services.cortes import tomar_cortes_pendientes
+
+        horas = horas or app.config.get('INVENTARIO_CORTE_HORAS', 24)
+        cortes = tomar_cortes_pendientes(horas, app.config.get('INVENTARIO_CORTE_MARGEN', 300))
+        for corte in cortes:
+            click.echo(f'  {corte.fecha_corte:%Y-%m-%d %H:%M}: {corte.movimientos} movimientos, {corte.claves} claves')
+        click.echo(f'{len(cortes)} cortes registrados')
+
+    @app.cli.command('stock-a-fecha')
+    @click.option('--sucursal', type=int, required=True)
+    @click.option('--fecha', type=click.DateTime(['%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S']),
+                  required=True, help='Sin hora se toma el final del día')
+    @click.option('--libro', type=int, help='Solo este libro')
+    @click.option('--salida', type=click.Path(dir_okay=False), help='CSV con id_libro, formato y stock')
+    def stock_a_fecha_cmd(sucursal, fecha, libro, salida):
+        """Stock de una sucursal (o de un libro) a una fecha, desde el corte más cercano"""
+        from datetime import timedelta
+        from app.services.cortes import stock_a_fecha, stock_sucursal_a_fecha
+        from app.services.inventario import DIGITAL, FISICO
+
+        if fecha.time() == fecha.min.time():
+            fecha += timedelta(days=1, microseconds=-1)
+        if libro is not None:
+            saldos = {(libro, formato): stock_a_fecha(libro, sucursal, fecha, formato) for formato in (FISICO, DIGITAL)}
+        else:
+            saldos = stock_sucursal_a_fecha(sucursal, fecha)
+        if salida:
+            import csv
+            with open(salida, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['id_libro', 'formato', 'stock'])
+                writer.writerows((id_libro, formato, stock) for (id_libro, formato), stock in saldos.items())
+            click.echo(f'Stock en {salida}')
+        else:
+            for (id_libro, formato), stock in saldos.items():
+                click.echo(f'  libro {id_libro} {formato}: {stock}')
+        click.echo(f'{len(saldos)} claves de la sucursal {sucursal} al {fecha:%Y-%m-%d %H:%M:%S}')
+
+    @app.cli.command('compactar-inventario')
+    @click.option('--conservar-dias', type=int, default=None,
+                  help='Días de movimientos que quedan en Inventarios (por defecto INVENTARIO_CONSERVAR_DIAS)')
+    @click.option('--lote', default=1000, show_default=True, help='Movimientos por transacción')
+    def compactar_inventario(conservar_dias, lote):
+        """Mover a Inventarios_Archivo los movimientos cubiertos por un corte antiguo"""
+        from datetime import datetime, timedelta
+        from app.services.cortes import compactar
+
+        if conservar_dias is None:
+            conservar_dias = app.config.get('INVENTARIO_CONSERVAR_DIAS', 90)
+        corte, archivados = compactar(datetime.now() - timedelta(days=conservar_dias), lote)
+        if corte is None:
+            click.echo(f'No hay cortes con más de {conservar_dias} días; ejecuta flask cortes-inventario')
+            return
+        click.echo(f'{archivados} movimientos hasta el corte del {corte.fecha_corte:%Y-%m-%d %H:%M} '
+                   f'movidos a Inventarios_Archivo')
+
+    @app.cli.command('registrar-cai')
+    @click.option('--sucursal', type=int, required=True)
+    @click.option('--cai', required=True, help='Código de Autorización de Impresión')
+    @click.option('--rtn', required=True, help='RTN de la empresa')
+    @click.option('--prefijo', required=True, help='Establecimiento-punto de emisión-tipo, ej. 001-001-01')
+    @click.option('--desde', 'inicial', type=int, required=True, help='Primer número autorizado')
+    @click.option('--hasta', 'final', type=int, required=True, help='Último número autorizado')
+    @click.option('--fecha-autorizacion', type=click.DateTime(['%Y-%m-%d']), required=True)
+    @click.option('--fecha-limite', type=click.DateTime(['%Y-%m-%d']), required=True, help='Fecha límite de emisión')
+    def registrar_cai(sucursal, cai, rtn, prefijo, inicial, final, fecha_autorizacion, fecha_limite):
+        """Registrar un rango de facturación autorizado (CAI) para una sucursal"""
+        from app import db
+        from app.services.ids import siguiente_id
+        from models import CaiSucursales
+
+        if not 0 < inicial <= final:
+            raise click.BadParameter('el rango debe cumplir 0 < desde <= hasta')
+        registro = CaiSucursales(
+            id_cai=siguiente_id(CaiSucursales), id_sucursal=sucursal, cai=cai.strip(), rtn_empresa=rtn.strip(),
+            prefijo=prefijo.strip(), rango_inicial=inicial, rango_final=final, ultimo_numero=inicial - 1,
+            fecha_autorizacion=fecha_autorizacion.date(), fecha_limite=fecha_limite.date(), activo=True,
+        )
+        db.session.add(registro)
+        db.session.commit()
+        click.echo(f'✅ CAI {registro.cai} de la sucursal {sucursal}: {final - inicial + 1} números '
+                   f'({prefijo}-{inicial:08d} a {prefijo}-{final:08d}), vigente hasta {fecha_limite:%Y-%m-%d}')
+
+    @app.cli.command('numeros-factura')
+    @click.option('--sucursal', type=int, help='Solo esta sucursal')
+    def numeros_factura_cmd(sucursal):
+        """Listar los números de factura reservados en bloques abiertos que todavía no tienen Venta"""
+        from app.services.facturacion import formatear_factura, numeros_sin_usar
+
+        total = 0
+        for cai, id_bloque, titular, libres in numeros_sin_usar(sucursal):
+            total += len(libres)
+            if libres:
+                muestra = ', '.join(formatear_factura(cai.prefijo, n) for n in libres[:5])
+                mas = f' y {len(libres) - 5} más' if len(libres) > 5 else ''
+                click.echo(f'  sucursal {cai.id_sucursal} CAI {cai.cai} bloque {id_bloque} '
+                           f'({titular or "libre"}): {muestra}{mas}')
+        click.echo(f'{total} números reservados sin usar')
+
+    def _mostrar_reporte(reporte, salida, unidad='filas'):
+        for linea, mensajes in reporte.errores:
+            click.echo(f'  línea {linea}: ' + '; '.join(mensajes), err=True)
+        actualizadas = f'{reporte.actualizadas} actualizadas, ' if reporte.actualizadas else ''
+        click.echo(f'{reporte.procesadas} {unidad} leídas, {reporte.insertadas} insertadas, {actualizadas}'
+                   f'{len(reporte.errores)} con error en {reporte.segundos:.1f} s '
+                   f'({reporte.filas_por_segundo} {unidad}/s)')
+        for entidad, cantidad in reporte.relacionados.items():
+            click.echo(f'  {entidad} creados: {cantidad}')
+        if salida:
+            import csv
+            with open(salida, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['linea', 'estado', 'id', 'registro', 'password_temporal', 'errores'])
+                for linea, id_registro, descripcion, temporal in reporte.creados:
+                    writer.writerow([linea, 'creado', id_registro, descripcion, temporal or '', ''])
+                for linea, mensajes in reporte.errores:
+                    writer.writerow([linea, 'error', '', '', '', '; '.join(mensajes)])
+            click.echo(f'Reporte por fila en {salida}')
+
+    @app.cli.command('importar-autores')
+    @click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--lote', default=500, show_default=True, help='Filas por transacción')
+    @click.option('--reporte', 'salida', type=click.Path(dir_okay=False), help='CSV de resultado por fila')
+    def importar_autores_cmd(archivo, lote, salida):
+        """Importar autores desde un CSV"""
+        from app.services.importar import importar_autores, ArchivoInvalido
+
+        try:
+            with open(archivo, encoding='utf-8-sig', newline='') as f:
+                reporte = importar_autores(f, tamano_lote=lote)
+        except ArchivoInvalido as e:
+            raise click.ClickException(str(e))
+        _mostrar_reporte(reporte, salida)
+
+    @app.cli.command('importar-clientes')
+    @click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--lote', default=500, show_default=True, help='Filas por transacción')
+    @click.option('--procesos', default=os.cpu_count() or 2, show_default=True, help='Procesos para bcrypt')
+    @click.option('--reporte', 'salida', type=click.Path(dir_okay=False),
+                  help='CSV de resultado por fila (incluye las contraseñas temporales)')
+    def importar_clientes_cmd(archivo, lote, procesos, salida):
+        """Importar clientes desde un CSV con contraseñas temporales"""
+        from app.services.importar import importar_clientes, ArchivoInvalido
+        from app.services.passwords import PasswordHasher
+
+        if not salida:
+            click.echo('Aviso: sin --reporte las contraseñas temporales no se guardan en ningún lado.', err=True)
+        # Pool propio con todos los núcleos: el CLI no compite con logins
+        hasher = PasswordHasher(workers=procesos, max_pending=max(procesos, 16),
+                                rounds=app.config.get('BCRYPT_ROUNDS', 12),
+                                timeout=app.config.get('PASSWORD_POOL_TIMEOUT', 10.0))
+        try:
+            with open(archivo, encoding='utf-8-sig', newline='') as f:
+                reporte = importar_clientes(f, tamano_lote=lote, hasher=hasher)
+        except ArchivoInvalido as e:
+            raise click.ClickException(str(e))
+        finally:
+            hasher.shutdown()
+        _mostrar_reporte(reporte, salida)
+
+    @app.cli.command('importar-libros')
+    @click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--formato', type=click.Choice(['csv', 'json']), default=None,
+                  help='Por defecto según la extensión (.json / .ndjson -> json)')
+    @click.option('--lote', default=500, show_default=True, help='Libros por transacción')
+    @click.option('--pais', default=None, help='País (nombre o código ISO) para las editoriales nuevas')
+    @click.option('--reporte', 'salida', type=click.Path(dir_okay=False), help='CSV de resultado por fila')
+    def importar_libros_cmd(archivo, formato, lote, pais, salida):
+        """Cargar el catálogo de libros (clave ISBN) con autores, categorías y editoriales"""
+        from app.services.importar import importar_libros, ArchivoInvalido
+
+        formato = formato or ('json' if archivo.lower().endswith(('.json', '.ndjson', '.jsonl')) else 'csv')
+        try:
+            with open(archivo, encoding='utf-8-sig', newline='') as f:
+                reporte = importar_libros(f, formato=formato, tamano_lote=lote, pais_defecto=pais)
+        except ArchivoInvalido as e:
+            raise click.ClickException(str(e))
+        _mostrar_reporte(reporte, salida, unidad='libros')
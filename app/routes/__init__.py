@@ -1,5 +1,5 @@
-from flask import Blueprint, render_template
-from flask_login import current_user
+from flask import Blueprint, render_template, jsonify, abort
+from flask_login import current_user, login_required
 
 # Crear el blueprint principal
 main = Blueprint('main', __name__)
@@ -20,4 +20,17 @@ def libros():
 
 @main.route('/clientes')
 def usuarios():
-    return "Aquí irán los usuarios"
\ No newline at end of file
+    return "Aquí irán los usuarios"
+
+@main.route('/metricas')
+@login_required
+def metricas():
+    """Métricas por worker de los servicios internos (solo administradores)"""
+    if current_user.tipo_usuario != 'admin':
+        abort(403)
+    from app.services.passwords import password_service
+    from app.services.user_cache import user_cache
+    return jsonify({
+        'password_service': password_service.metrics(),
+        'user_cache': user_cache.stats(),
+    })
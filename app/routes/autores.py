@@ -1,69 +1,147 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required
 from app import db
+from app.services.ids import siguiente_id
+from app.services.duplicados import duplicados
+from app.services.dependencias import dependencias
+from app.services.paginacion import ordenar, paginar, nombre_de_orden
+from app.services.exportar import exportar_consulta
+from app.services.importar import importar_autores, ArchivoInvalido, COLUMNAS_AUTORES
+from app.services.validacion import validar_solo_letras, validar_nacionalidad, validar_fecha_nacimiento
 from models import Autores
-from datetime import datetime, date
-from sqlalchemy import func
-import re
+from datetime import datetime
+from sqlalchemy import or_
+import io
 
 autores_bp = Blueprint('autores', __name__, url_prefix='/autores')
 
-def validar_solo_letras(texto, campo):
-    """Validar que un campo solo contenga letras y espacios"""
-    if not texto or not texto.strip():
-        return False, f'{campo} es obligatorio'
-    if not re.match(r'^[A-Za-zÁÉÍÓÚáéíóúÑñ\s]+$', texto):
-        return False, f'{campo} solo puede contener letras y espacios'
-    if len(texto.strip()) < 2:
-        return False, f'{campo} debe tener al menos 2 caracteres'
-    if len(texto.strip()) > 50:
-        return False, f'{campo} no puede exceder 50 caracteres'
-    return True, None
-
-def validar_fecha_nacimiento(fecha_str):
-    """Validar fecha de nacimiento"""
-    if not fecha_str:
-        return False, 'Fecha de nacimiento es obligatoria'
-    
-    try:
-        fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
-        
-        # No puede ser fecha futura
-        if fecha > date.today():
-            return False, 'La fecha de nacimiento no puede ser futura'
-        
-        # No puede ser muy antigua (más de 150 años)
-        edad_maxima = date.today().year - 150
-        if fecha.year < edad_maxima:
-            return False, 'Fecha de nacimiento inválida (muy antigua)'
-        
-        return True, None
-    except ValueError:
-        return False, 'Formato de fecha inválido'
-
-def validar_nacionalidad(nacionalidad):
-    """Validar nacionalidad"""
-    if not nacionalidad or not nacionalidad.strip():
-        return False, 'Nacionalidad es obligatoria'
-    if not re.match(r'^[A-Za-zÁÉÍÓÚáéíóúÑñ\s]+$', nacionalidad):
-        return False, 'Nacionalidad solo puede contener letras'
-    if len(nacionalidad.strip()) < 3:
-        return False, 'Nacionalidad debe tener al menos 3 caracteres'
-    if len(nacionalidad.strip()) > 50:
-        return False, 'Nacionalidad no puede exceder 50 caracteres'
-    return True, None
-
 def get_next_id():
     """Obtener el siguiente ID disponible para autores"""
-    ultimo_id = db.session.query(func.max(Autores.id_autor)).scalar()
-    return (ultimo_id or 0) + 1
+    return siguiente_id(Autores)
+
+def autor_con_nombre(nombres, apellidos, excluir=None):
+    """
+    Autor con exactamente ese nombre (como se guarda, en formato título).
+    Igualdad directa sobre las columnas para usar IX_Autores_nombre; la
+    collation CI de SQL Server ya ignora mayúsculas.
+    """
+    consulta = db.session.query(Autores.id_autor).filter(
+        Autores.apellidos == apellidos.title(),
+        Autores.nombres == nombres.title()
+    )
+    if excluir is not None:
+        consulta = consulta.filter(Autores.id_autor != excluir)
+    return consulta.first()
+
+ORDENES_AUTORES = {
+    'apellidos': ordenar(Autores.apellidos, Autores.nombres, Autores.id_autor),
+    '-apellidos': ordenar(Autores.apellidos, Autores.nombres, Autores.id_autor, desc=True),
+    'nacionalidad': ordenar(Autores.nacionalidad, Autores.id_autor),
+    '-nacionalidad': ordenar(Autores.nacionalidad, Autores.id_autor, desc=True),
+    'fecha_nacimiento': ordenar(Autores.fecha_nacimiento, Autores.id_autor),
+    '-fecha_nacimiento': ordenar(Autores.fecha_nacimiento, Autores.id_autor, desc=True),
+}
+
+# Columnas del listado; descripcion y observaciones (TEXT) se piden al abrir el detalle
+COLUMNAS_LISTADO = (
+    Autores.id_autor, Autores.nombres, Autores.apellidos,
+    Autores.nacionalidad, Autores.fecha_nacimiento,
+)
+
+COLUMNAS_EXPORTAR = COLUMNAS_LISTADO + (Autores.descripcion, Autores.observaciones)
+
+def leer_filtros_listado(args):
+    """Filtros del listado de autores desde los query params"""
+    return {
+        'q': ' '.join(args.get('q', '').split())[:100],
+        'nacionalidad': args.get('nacionalidad', '').strip()[:50],
+    }
+
+def filtrar_autores(consulta, filtros):
+    """Aplicar búsqueda por nombre/apellido y nacionalidad"""
+    for termino in filtros['q'].split():
+        consulta = consulta.filter(or_(
+            Autores.nombres.contains(termino, autoescape=True),
+            Autores.apellidos.contains(termino, autoescape=True),
+        ))
+    if filtros['nacionalidad']:
+        consulta = consulta.filter(Autores.nacionalidad == filtros['nacionalidad'])
+    return consulta
 
-# READ - Listar todos los autores
+# READ - Listar autores (paginado en el servidor)
 @autores_bp.route('/')
 @login_required
 def listar():
-    autores = db.session.query(Autores).order_by(Autores.apellidos, Autores.nombres).all()
-    return render_template('autores/listar.html', autores=autores)
+    filtros = leer_filtros_listado(request.args)
+    consulta = filtrar_autores(db.session.query(*COLUMNAS_LISTADO), filtros)
+    
+    pagina = paginar(consulta, ORDENES_AUTORES, request.args, defecto='apellidos', contar=Autores)
+    nacionalidades = [n for (n,) in db.session.query(Autores.nacionalidad).distinct().order_by(Autores.nacionalidad)]
+    return render_template('autores/listar.html', autores=pagina.items, pagina=pagina,
+                           q=filtros['q'], nacionalidad=filtros['nacionalidad'],
+                           nacionalidades=nacionalidades)
+
+# READ - Exportar autores (CSV o NDJSON en streaming, mismos filtros que el listado)
+@autores_bp.route('/exportar')
+@login_required
+def exportar():
+    filtros = leer_filtros_listado(request.args)
+    orden = ORDENES_AUTORES[nombre_de_orden(ORDENES_AUTORES, request.args, 'apellidos')]
+    consulta = filtrar_autores(db.session.query(*COLUMNAS_EXPORTAR), filtros).order_by(*orden.order_by())
+    return exportar_consulta(consulta, 'autores', request.args.get('formato', 'csv'))
+
+# CREATE - Importación masiva desde CSV
+@autores_bp.route('/importar', methods=['GET', 'POST'])
+@login_required
+def importar():
+    max_filas = current_app.config.get('IMPORTACION_MAX_FILAS_WEB', 5000)
+    reporte = None
+    if request.method == 'POST':
+        archivo = request.files.get('archivo')
+        if not archivo or not archivo.filename:
+            flash('Selecciona un archivo CSV.', 'error')
+        else:
+            try:
+                texto = io.TextIOWrapper(archivo.stream, encoding='utf-8-sig', newline='')
+                reporte = importar_autores(texto, max_filas=max_filas)
+                flash(f'Importación terminada: {reporte.insertadas} autores creados, '
+                      f'{len(reporte.errores)} filas con error.',
+                      'success' if not reporte.errores else 'warning')
+            except ArchivoInvalido as e:
+                flash(str(e), 'error')
+            except UnicodeDecodeError:
+                flash('El archivo debe estar codificado en UTF-8.', 'error')
+    
+    return render_template('importar.html', titulo='Autores', reporte=reporte,
+                           requeridas=COLUMNAS_AUTORES, opcionales=('descripcion', 'observaciones'),
+                           max_filas=max_filas, comando='importar-autores',
+                           volver_url=url_for('autores.listar'), mostrar_passwords=False)
+
+# READ - Posibles duplicados mientras se llena el formulario
+@autores_bp.route('/posibles-duplicados')
+@login_required
+def posibles_duplicados():
+    nombres = request.args.get('nombres', '').strip()[:100]
+    apellidos = request.args.get('apellidos', '').strip()[:100]
+    if len(nombres) + len(apellidos) < 4:
+        return jsonify([])
+    excluir = request.args.get('excluir', type=int)
+    return jsonify([
+        {'id_autor': id_autor, 'nombre': nombre, 'similitud': similitud,
+         'url': url_for('autores.editar', id=id_autor)}
+        for similitud, id_autor, nombre in duplicados.autores_similares(nombres, apellidos, excluir=excluir)
+    ])
+
+# READ - Campos largos para el modal de detalles
+@autores_bp.route('/detalle/<int:id>')
+@login_required
+def detalle(id):
+    fila = db.session.query(Autores.descripcion, Autores.observaciones).filter(
+        Autores.id_autor == id
+    ).first()
+    if fila is None:
+        return jsonify({'error': 'Autor no encontrado'}), 404
+    return jsonify({'descripcion': fila.descripcion, 'observaciones': fila.observaciones})
 
 # CREATE - Mostrar formulario de creación
 @autores_bp.route('/nuevo', methods=['GET', 'POST'])
@@ -100,14 +178,15 @@ def crear():
                 flash(error, 'error')
                 return render_template('autores/form.html')
             
-            # Verificar si ya existe un autor con el mismo nombre
-            autor_existe = db.session.query(Autores).filter(
-                func.lower(Autores.nombres) == nombres.lower(),
-                func.lower(Autores.apellidos) == apellidos.lower()
-            ).first()
-            if autor_existe:
+            # Mismo nombre = duplicado (se consulta la base: el índice en memoria
+            # puede estar atrasado); nombres parecidos se muestran para que el usuario confirme
+            similares = duplicados.autores_similares(nombres, apellidos)
+            if autor_con_nombre(nombres, apellidos):
                 flash(f'Ya existe un autor con el nombre {nombres} {apellidos}.', 'error')
-                return render_template('autores/form.html')
+                return render_template('autores/form.html', similares=similares)
+            if similares and not request.form.get('confirmar_duplicado'):
+                flash('Hay autores con un nombre parecido. Revisa la lista antes de continuar.', 'warning')
+                return render_template('autores/form.html', similares=similares)
             
             # Convertir fecha
             fecha_nacimiento = datetime.strptime(fecha_nac_str, '%Y-%m-%d').date()
@@ -127,6 +206,7 @@ def crear():
             
             db.session.add(nuevo_autor)
             db.session.commit()
+            duplicados.registrar_autor(nuevo_id, nuevo_autor.nombres, nuevo_autor.apellidos)
             
             flash(f'Autor {nombres} {apellidos} creado exitosamente.', 'success')
             return redirect(url_for('autores.listar'))
@@ -178,12 +258,7 @@ def editar(id):
                 return render_template('autores/form.html', autor=autor)
             
             # Verificar si ya existe otro autor con el mismo nombre
-            autor_existe = db.session.query(Autores).filter(
-                func.lower(Autores.nombres) == nombres.lower(),
-                func.lower(Autores.apellidos) == apellidos.lower(),
-                Autores.id_autor != id
-            ).first()
-            if autor_existe:
+            if autor_con_nombre(nombres, apellidos, excluir=id):
                 flash(f'Ya existe otro autor con el nombre {nombres} {apellidos}.', 'error')
                 return render_template('autores/form.html', autor=autor)
             
@@ -199,6 +274,7 @@ def editar(id):
             autor.observaciones = request.form.get('observaciones', '').strip() or None
             
             db.session.commit()
+            duplicados.registrar_autor(autor.id_autor, autor.nombres, autor.apellidos)
             flash(f'Autor {nombres} {apellidos} actualizado exitosamente.', 'success')
             return redirect(url_for('autores.listar'))
             
@@ -219,13 +295,15 @@ def eliminar(id):
             return redirect(url_for('autores.listar'))
         
         # Verificar si tiene libros asociados
-        if hasattr(autor, 'libros') and autor.libros:
-            flash(f'No se puede eliminar a {autor.nombres} {autor.apellidos} porque tiene libros asociados.', 'error')
+        libros_count = dependencias(autor)['Libro_Autores']
+        if libros_count:
+            flash(f'No se puede eliminar a {autor.nombres} {autor.apellidos} porque tiene {libros_count} libro(s) asociado(s).', 'error')
             return redirect(url_for('autores.listar'))
         
         nombre_completo = f'{autor.nombres} {autor.apellidos}'
         db.session.delete(autor)
         db.session.commit()
+        duplicados.quitar('autores', id)
         flash(f'Autor {nombre_completo} eliminado exitosamente.', 'error')  # Red notification
         
     except Exception as e:
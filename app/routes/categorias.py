@@ -1,47 +1,80 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required
 from app import db
+from app.services.catalogos import catalogos
+from app.services.conteos import conteos_uso
+from app.services.dependencias import dependencias
+from app.services.ids import siguiente_id
+from app.services.paginacion import ordenar, paginar, nombre_de_orden
+from app.services.exportar import exportar_consulta
+from app.services.validacion import validar_nombre_categoria, validar_descripcion_categoria
 from models import Categorias
-from sqlalchemy import func
-import re
+from sqlalchemy import func, or_
 
 categorias_bp = Blueprint('categorias', __name__, url_prefix='/categorias')
 
-def validar_nombre(nombre):
-    """Validar nombre de categoría"""
-    if not nombre or not nombre.strip():
-        return False, 'El nombre es obligatorio'
-    
-    if len(nombre.strip()) < 2:
-        return False, 'El nombre debe tener al menos 2 caracteres'
-    
-    if len(nombre.strip()) > 50:
-        return False, 'El nombre no puede exceder 50 caracteres'
-    
-    # Validar que contenga al menos algunas letras
-    if not re.search(r'[A-Za-zÁÉÍÓÚáéíóúÑñ]', nombre):
-        return False, 'El nombre debe contener al menos algunas letras'
-    
-    return True, None
-
-def validar_descripcion(descripcion):
-    """Validar descripción de categoría"""
-    if descripcion and len(descripcion.strip()) > 200:
-        return False, 'La descripción no puede exceder 200 caracteres'
-    
-    return True, None
-
 def get_next_id():
     """Obtener el siguiente ID disponible para categorías"""
-    ultimo_id = db.session.query(func.max(Categorias.id_categoria)).scalar()
-    return (ultimo_id or 0) + 1
+    return siguiente_id(Categorias)
+
+ORDENES_CATEGORIAS = {
+    'nombre': ordenar(Categorias.nombre, Categorias.id_categoria),
+    '-nombre': ordenar(Categorias.nombre, Categorias.id_categoria, desc=True),
+    'id': ordenar(Categorias.id_categoria),
+    '-id': ordenar(Categorias.id_categoria, desc=True),
+}
 
-# READ - Listar todas las categorías
+# Columnas del listado: de la descripción (TEXT) solo el inicio que se muestra;
+# observaciones se pide en el detalle. El número de libros sale de conteos_uso
+COLUMNAS_LISTADO = (
+    Categorias.id_categoria,
+    Categorias.nombre,
+    func.substring(Categorias.descripcion, 1, 81).label('descripcion'),
+)
+
+COLUMNAS_EXPORTAR = (
+    Categorias.id_categoria, Categorias.nombre, Categorias.descripcion, Categorias.observaciones,
+)
+
+def filtrar_categorias(consulta, q):
+    """Cada término debe aparecer en el nombre o la descripción"""
+    for termino in q.split():
+        consulta = consulta.filter(or_(
+            Categorias.nombre.contains(termino, autoescape=True),
+            Categorias.descripcion.contains(termino, autoescape=True),
+        ))
+    return consulta
+
+# READ - Listar categorías (paginado en el servidor)
 @categorias_bp.route('/')
 @login_required
 def listar():
-    categorias = db.session.query(Categorias).order_by(Categorias.nombre).all()
-    return render_template('categorias/listar.html', categorias=categorias)
+    q = ' '.join(request.args.get('q', '').split())[:100]
+    consulta = filtrar_categorias(db.session.query(*COLUMNAS_LISTADO), q)
+    
+    pagina = paginar(consulta, ORDENES_CATEGORIAS, request.args, defecto='nombre', contar=Categorias)
+    return render_template('categorias/listar.html', categorias=pagina.items, pagina=pagina, q=q,
+                           usos=conteos_uso.get('Categorias'))
+
+# READ - Exportar categorías (CSV o NDJSON en streaming, mismos filtros que el listado)
+@categorias_bp.route('/exportar')
+@login_required
+def exportar():
+    q = ' '.join(request.args.get('q', '').split())[:100]
+    orden = ORDENES_CATEGORIAS[nombre_de_orden(ORDENES_CATEGORIAS, request.args, 'nombre')]
+    consulta = filtrar_categorias(db.session.query(*COLUMNAS_EXPORTAR), q).order_by(*orden.order_by())
+    return exportar_consulta(consulta, 'categorias', request.args.get('formato', 'csv'))
+
+# READ - Campos largos para el modal de detalles
+@categorias_bp.route('/detalle/<int:id>')
+@login_required
+def detalle(id):
+    fila = db.session.query(Categorias.descripcion, Categorias.observaciones).filter(
+        Categorias.id_categoria == id
+    ).first()
+    if fila is None:
+        return jsonify({'error': 'Categoría no encontrada'}), 404
+    return jsonify({'descripcion': fila.descripcion, 'observaciones': fila.observaciones})
 
 # CREATE - Mostrar formulario de creación
 @categorias_bp.route('/nuevo', methods=['GET', 'POST'])
@@ -54,13 +87,13 @@ def crear():
             observaciones = request.form.get('observaciones', '').strip()
             
             # Validar nombre
-            valido, error = validar_nombre(nombre)
+            valido, error = validar_nombre_categoria(nombre)
             if not valido:
                 flash(error, 'error')
                 return render_template('categorias/form.html')
             
             # Validar descripción
-            valido, error = validar_descripcion(descripcion)
+            valido, error = validar_descripcion_categoria(descripcion)
             if not valido:
                 flash(error, 'error')
                 return render_template('categorias/form.html')
@@ -86,6 +119,7 @@ def crear():
             
             db.session.add(nueva_categoria)
             db.session.commit()
+            catalogos.invalidar('Categorias')
             
             flash(f'Categoría "{nombre}" creada exitosamente.', 'success')
             return redirect(url_for('categorias.listar'))
@@ -112,13 +146,13 @@ def editar(id):
             observaciones = request.form.get('observaciones', '').strip()
             
             # Validar nombre
-            valido, error = validar_nombre(nombre)
+            valido, error = validar_nombre_categoria(nombre)
             if not valido:
                 flash(error, 'error')
                 return render_template('categorias/form.html', categoria=categoria)
             
             # Validar descripción
-            valido, error = validar_descripcion(descripcion)
+            valido, error = validar_descripcion_categoria(descripcion)
             if not valido:
                 flash(error, 'error')
                 return render_template('categorias/form.html', categoria=categoria)
@@ -139,6 +173,7 @@ def editar(id):
             categoria.observaciones = observaciones.strip() if observaciones else None
             
             db.session.commit()
+            catalogos.invalidar('Categorias')
             flash(f'Categoría "{nombre}" actualizada exitosamente.', 'success')
             return redirect(url_for('categorias.listar'))
             
@@ -159,9 +194,7 @@ def eliminar(id):
             return redirect(url_for('categorias.listar'))
         
         # Verificar si tiene libros asociados
-        libros_count = 0
-        if hasattr(categoria, 'Libro_Categoria') and categoria.Libro_Categoria:
-            libros_count = len(categoria.Libro_Categoria)
+        libros_count = dependencias(categoria)['Libro_Categoria']
         
         if libros_count > 0:
             flash(f'No se puede eliminar "{categoria.nombre}" porque tiene {libros_count} libro(s) asociado(s).', 'error')
@@ -170,6 +203,7 @@ def eliminar(id):
         nombre = categoria.nombre
         db.session.delete(categoria)
         db.session.commit()
+        catalogos.invalidar('Categorias')
         flash(f'Categoría "{nombre}" eliminada exitosamente.', 'error')  # Red notification
         
     except Exception as e:
@@ -1,220 +1,193 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, abort
 from flask_login import login_required, current_user
 from app import db
-from models import Clientes, EstadoUsuarios
-from bcrypt import hashpw, gensalt
+from app.services.passwords import hash_password, generar_password_temporal, PasswordServiceBusy
+from app.services.user_cache import user_cache
+from app.services.catalogos import catalogos
+from app.services.conteos import conteos_uso
+from app.services.ids import siguiente_id
+from app.services.emails import emails_registrados
+from app.services.duplicados import duplicados
+from app.services.dependencias import dependencias, describir
+from app.services.paginacion import ordenar, paginar, leer_por_pagina, POR_PAGINA_OPCIONES
+from app.services.exportar import exportar_consulta
+from app.services.importar import importar_clientes, ArchivoInvalido, COLUMNAS_CLIENTES
+from app.services.validacion import (validar_solo_letras, validar_email, validar_telefono,
+                                     validar_direccion, validar_observaciones)
+from models import Clientes
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
-import re
-import secrets
-import string
-import hmac
-import hashlib
+import io
 
 clientes_bp = Blueprint('clientes', __name__, url_prefix='/clientes')
 
-def hash_password(password):
-    """
-    Hash de contraseña completamente aleatorio y único:
-    1. Genera una sal aleatoria única de 32 bytes
-    2. HMAC con pepper + sal
-    3. Bcrypt
-    4. Almacena: sal_aleatoria + hash (todo en hex)
-    Resultado: Cada hash comienza diferente
-    """
-    # Obtener pepper desde configuración
-    try:
-        pepper = current_app.config.get('PEPPER_SECRET', '')
-    except RuntimeError:
-        from config import Config
-        pepper = Config.PEPPER_SECRET
-    
-    # Generar sal aleatoria única de 32 bytes
-    random_salt = secrets.token_bytes(32)
-    
-    # HMAC con pepper + sal aleatoria
-    hmac_hash = hmac.new(
-        (pepper + random_salt.hex()).encode('utf-8'),
-        password.encode('utf-8'),
-        hashlib.sha256
-    ).digest()
-    
-    # Bcrypt sobre el HMAC
-    bcrypt_hash = hashpw(hmac_hash, gensalt(rounds=12))
-    
-    # Combinar: sal_aleatoria + bcrypt_hash, todo en hexadecimal
-    # La sal aleatoria va primero (64 caracteres hex = 32 bytes)
-    final_hash = random_salt.hex() + bcrypt_hash.hex()
-    
-    return final_hash
+def get_next_id():
+    """Obtener el siguiente ID disponible para clientes"""
+    return siguiente_id(Clientes)
 
-def validar_solo_letras(texto, campo):
-    """Validar que un campo solo contenga letras y espacios con reglas estrictas"""
-    if not texto or not texto.strip():
-        return False, f'{campo} es obligatorio'
-    
-    # Eliminar espacios múltiples para validación
-    texto_limpio = ' '.join(texto.split())
-    
-    # Solo letras y espacios
-    if not re.match(r'^[A-Za-zÁÉÍÓÚáéíóúÑñ\s]+$', texto_limpio):
-        return False, f'{campo} solo puede contener letras y espacios'
-    
-    # No más de 2 espacios seguidos en el texto original
-    if '   ' in texto:  # 3 espacios
-        return False, f'{campo} no puede tener más de 2 espacios consecutivos'
-    
-    # No más de 2 letras iguales seguidas (no existe en español)
-    if re.search(r'(.)\1{2,}', texto_limpio):
-        return False, f'{campo} no puede tener la misma letra repetida más de 2 veces seguidas'
-    
-    # Longitud
-    if len(texto_limpio) < 2:
-        return False, f'{campo} debe tener al menos 2 caracteres'
-    if len(texto_limpio) > 50:
-        return False, f'{campo} no puede exceder 50 caracteres'
-    
-    return True, None
+# Más recientes primero; id_cliente desempata registros con la misma fecha
+ORDENES_CLIENTES = {
+    'recientes': ordenar(Clientes.fecha_registro, Clientes.id_cliente, desc=True),
+}
 
-def validar_email(email):
-    """Validar formato de email con reglas específicas"""
-    if not email or not email.strip():
-        return False, 'Email es obligatorio'
-    
-    email = email.strip().lower()
-    
-    # Patrón básico de email
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    if not re.match(pattern, email):
-        return False, 'Formato de email inválido'
-    
-    # Separar parte local (antes de @) y dominio (después de @)
-    try:
-        local, dominio = email.split('@')
-    except:
-        return False, 'Formato de email inválido'
-    
-    # Parte local: mínimo 2 caracteres antes del @
-    if len(local) < 2:
-        return False, 'El email debe tener al menos 2 caracteres antes del @'
-    
-    # Parte del dominio: máximo 8 caracteres antes del punto
-    dominio_sin_extension = dominio.split('.')[0]
-    if len(dominio_sin_extension) > 8:
-        return False, 'El dominio del email no puede tener más de 8 caracteres antes del punto'
-    
-    # No más de 2 caracteres iguales seguidos
-    if re.search(r'(.)\1{2,}', email):
-        return False, 'El email no puede tener el mismo carácter repetido más de 2 veces seguidas'
-    
-    # Longitud total
-    if len(email) > 100:
-        return False, 'Email no puede exceder 100 caracteres'
-    
-    return True, None
+NOMBRES_RELACIONES = {
+    'Clientes_Documento': 'documento(s)', 'Notificaciones': 'notificación(es)', 'Prestamos': 'préstamo(s)',
+    'Resenas': 'reseña(s)', 'Temas_Foros': 'tema(s) de foro', 'Tickets': 'ticket(s)', 'Venta': 'venta(s)',
+    'Mensajes_Foros': 'mensaje(s) de foro', 'Respuesta_Ticket': 'respuesta(s) a tickets',
+}
 
-def validar_telefono(telefono):
-    """Validar formato de teléfono hondureño (+504 y debe empezar con 3, 7, 8 o 9)"""
-    if not telefono or telefono == 'No especificado':
-        return True, None
-    
-    # Limpiar espacios y guiones para validación
-    telefono_limpio = telefono.replace(' ', '').replace('-', '').replace('(', '').replace(')', '')
-    
-    # Debe empezar con +504 o solo el número
-    if telefono_limpio.startswith('+504'):
-        numero = telefono_limpio[4:]  # Quitar +504
-    elif telefono_limpio.startswith('504'):
-        numero = telefono_limpio[3:]  # Quitar 504
-    else:
-        numero = telefono_limpio
-    
-    # Validar que solo contenga dígitos después de limpiar
-    if not numero.isdigit():
-        return False, 'El teléfono solo puede contener números después del código de país'
-    
-    # Debe tener exactamente 8 dígitos
-    if len(numero) != 8:
-        return False, 'El número de teléfono debe tener exactamente 8 dígitos'
-    
-    # Debe empezar con 3, 7, 8 o 9
-    if numero[0] not in ['3', '7', '8', '9']:
-        return False, 'El número de teléfono debe empezar con 3, 7, 8 o 9'
-    
-    # Formato válido: debe incluir +504
-    if not telefono_limpio.startswith('+504'):
-        return False, 'El teléfono debe incluir el código de país +504 (ej: +504 9999-9999)'
-    
-    return True, None
+def leer_filtros_listado(args):
+    """Filtros del listado de clientes desde los query params"""
+    return {
+        'q': ' '.join(args.get('q', '').split())[:100],
+        'estado': args.get('estado', '') if args.get('estado') in ('active', 'inactive') else '',
+        'tipo': args.get('tipo', '').strip()[:50],
+        'por_pagina': leer_por_pagina(args),
+    }
 
-def validar_direccion(direccion):
-    """Validar dirección con límites de caracteres"""
-    if not direccion or direccion == 'No especificada':
-        return True, None
-    
-    direccion = direccion.strip()
-    
-    # No más de 2 espacios consecutivos
-    if '   ' in direccion:
-        return False, 'La dirección no puede tener más de 2 espacios consecutivos'
-    
-    # No más de 2 caracteres iguales seguidos (excepto espacios)
-    if re.search(r'([^\s])\1{2,}', direccion):
-        return False, 'La dirección no puede tener el mismo carácter repetido más de 2 veces seguidas'
-    
-    # Longitud máxima
-    if len(direccion) > 200:
-        return False, 'La dirección no puede exceder 200 caracteres'
-    
-    # Mínimo 5 caracteres
-    if len(direccion) < 5:
-        return False, 'La dirección debe tener al menos 5 caracteres'
-    
-    return True, None
+# Columnas que muestra el listado: sin password_hash ni los TEXT (direccion,
+# observaciones), que se piden al abrir el detalle
+COLUMNAS_LISTADO = (
+    Clientes.id_cliente, Clientes.nombres, Clientes.apellidos, Clientes.email,
+    Clientes.telefono, Clientes.tipo_usuario, Clientes.fecha_registro, Clientes.id_estado,
+)
 
-def validar_observaciones(observaciones):
-    """Validar observaciones con límites"""
-    if not observaciones:
-        return True, None
-    
-    observaciones = observaciones.strip()
-    
-    # No más de 2 espacios consecutivos
-    if '   ' in observaciones:
-        return False, 'Las observaciones no pueden tener más de 2 espacios consecutivos'
-    
-    # Longitud máxima
-    if len(observaciones) > 500:
-        return False, 'Las observaciones no pueden exceder 500 caracteres'
-    
-    return True, None
+# Exportación: todo menos password_hash
+COLUMNAS_EXPORTAR = COLUMNAS_LISTADO + (Clientes.direccion, Clientes.observaciones)
 
-def get_next_id():
-    """Obtener el siguiente ID disponible para clientes"""
-    ultimo_id = db.session.query(func.max(Clientes.id_cliente)).scalar()
-    return (ultimo_id or 0) + 1
+def filtrar_clientes(consulta, filtros):
+    """Aplicar búsqueda, estado y tipo del listado a una consulta de clientes"""
+    # Cada término debe aparecer en nombres, apellidos, email o teléfono
+    for termino in filtros['q'].split():
+        consulta = consulta.filter(or_(
+            Clientes.nombres.contains(termino, autoescape=True),
+            Clientes.apellidos.contains(termino, autoescape=True),
+            Clientes.email.contains(termino, autoescape=True),
+            Clientes.telefono.contains(termino, autoescape=True),
+        ))
+    
+    if filtros['estado'] == 'active':
+        consulta = consulta.filter(Clientes.id_estado == 1)
+    elif filtros['estado'] == 'inactive':
+        consulta = consulta.filter(Clientes.id_estado != 1)
+    
+    if filtros['tipo']:
+        consulta = consulta.filter(Clientes.tipo_usuario == filtros['tipo'])
+    
+    return consulta
 
-# READ - Listar todos los clientes
+def buscar_pagina_clientes(filtros, args):
+    """
+    Una página de clientes con paginación keyset sobre (fecha_registro, id_cliente).
+    Solo se consulta la página actual (+1 fila para saber si hay más).
+    """
+    consulta = filtrar_clientes(db.session.query(*COLUMNAS_LISTADO), filtros)
+    return paginar(consulta, ORDENES_CLIENTES, args, defecto='recientes')
+
+# READ - Listar clientes (primera página renderizada en el servidor)
 @clientes_bp.route('/')
 @login_required
 def listar():
-    # Use joinedload to eagerly load the Estado_Usuarios relationship
-    clientes = db.session.query(Clientes).options(
-        joinedload(Clientes.Estado_Usuarios)
-    ).order_by(Clientes.fecha_registro.desc()).all()
+    filtros = leer_filtros_listado(request.args)
+    pagina = buscar_pagina_clientes(filtros, request.args)
     
-    # Create a dictionary of estados for easy lookup
-    estados = db.session.query(EstadoUsuarios).all()
-    estados_dict = {estado.id_estado: estado for estado in estados}
+    # Diccionario de estados desde el catálogo cacheado
+    estados_dict = catalogos.dict('EstadoUsuarios')
     
-    return render_template('clientes/listar.html', clientes=clientes, estados_dict=estados_dict)
+    return render_template('clientes/listar.html', clientes=pagina.items, estados_dict=estados_dict,
+                           filtros=filtros, filas_por_pagina=POR_PAGINA_OPCIONES,
+                           cursor_siguiente=pagina.siguiente)
+
+# READ - Búsqueda paginada (JSON para el listado)
+@clientes_bp.route('/buscar')
+@login_required
+def buscar():
+    filtros = leer_filtros_listado(request.args)
+    pagina = buscar_pagina_clientes(filtros, request.args)
+    html = render_template('clientes/_filas.html', clientes=pagina.items,
+                           estados_dict=catalogos.dict('EstadoUsuarios'))
+    return jsonify({
+        'html': html,
+        'cantidad': len(pagina.items),
+        'cursor_siguiente': pagina.siguiente,
+    })
+
+# READ - Exportar clientes (CSV o NDJSON en streaming, solo administradores)
+@clientes_bp.route('/exportar')
+@login_required
+def exportar():
+    if current_user.tipo_usuario != 'admin':
+        abort(403)
+    filtros = leer_filtros_listado(request.args)
+    consulta = filtrar_clientes(db.session.query(*COLUMNAS_EXPORTAR), filtros).order_by(
+        *ORDENES_CLIENTES['recientes'].order_by()
+    )
+    return exportar_consulta(consulta, 'clientes', request.args.get('formato', 'csv'))
+
+# CREATE - Importación masiva desde CSV (solo administradores)
+@clientes_bp.route('/importar', methods=['GET', 'POST'])
+@login_required
+def importar():
+    if current_user.tipo_usuario != 'admin':
+        abort(403)
+    max_filas = current_app.config.get('IMPORTACION_MAX_CLIENTES_WEB', 500)
+    reporte = None
+    if request.method == 'POST':
+        archivo = request.files.get('archivo')
+        if not archivo or not archivo.filename:
+            flash('Selecciona un archivo CSV.', 'error')
+        else:
+            try:
+                texto = io.TextIOWrapper(archivo.stream, encoding='utf-8-sig', newline='')
+                reporte = importar_clientes(texto, max_filas=max_filas)
+                flash(f'Importación terminada: {reporte.insertadas} clientes creados, '
+                      f'{len(reporte.errores)} filas con error. Comparte las contraseñas temporales con cada usuario.',
+                      'success' if not reporte.errores else 'warning')
+            except ArchivoInvalido as e:
+                flash(str(e), 'error')
+            except UnicodeDecodeError:
+                flash('El archivo debe estar codificado en UTF-8.', 'error')
+    
+    return render_template('importar.html', titulo='Clientes', reporte=reporte,
+                           requeridas=COLUMNAS_CLIENTES,
+                           opcionales=('telefono', 'direccion', 'observaciones', 'tipo_usuario', 'id_estado'),
+                           max_filas=max_filas, comando='importar-clientes',
+                           volver_url=url_for('clientes.listar'), mostrar_passwords=True)
+
+# READ - Posibles duplicados (nombre parecido o mismo teléfono)
+@clientes_bp.route('/posibles-duplicados')
+@login_required
+def posibles_duplicados():
+    nombres = request.args.get('nombres', '').strip()[:100]
+    apellidos = request.args.get('apellidos', '').strip()[:100]
+    telefono = request.args.get('telefono', '').strip()[:50]
+    if len(nombres) + len(apellidos) < 4 and not telefono:
+        return jsonify([])
+    similares = duplicados.clientes_similares(nombres, apellidos, telefono,
+                                              excluir=request.args.get('excluir', type=int))
+    return jsonify([
+        {'id_cliente': id_cliente, 'nombre': nombre, 'similitud': similitud}
+        for similitud, id_cliente, nombre in similares
+    ])
+
+# READ - Campos largos para el modal de detalles
+@clientes_bp.route('/detalle/<int:id>')
+@login_required
+def detalle(id):
+    fila = db.session.query(Clientes.direccion, Clientes.observaciones).filter(
+        Clientes.id_cliente == id
+    ).first()
+    if fila is None:
+        return jsonify({'error': 'Cliente no encontrado'}), 404
+    return jsonify({'direccion': fila.direccion, 'observaciones': fila.observaciones})
 
 # CREATE - Mostrar formulario de creación
 @clientes_bp.route('/nuevo', methods=['GET', 'POST'])
 @login_required
 def crear():
-    estados = db.session.query(EstadoUsuarios).all()
+    estados = catalogos.lista('EstadoUsuarios')
     
     if request.method == 'POST':
         try:
@@ -243,11 +216,8 @@ def crear():
                 flash(error, 'error')
                 return render_template('clientes/form.html', cliente=None, estados=estados)
             
-            # Verificar email duplicado
-            email_existe = db.session.query(Clientes).filter(
-                func.lower(Clientes.email) == email
-            ).first()
-            if email_existe:
+            # Verificar email duplicado (filtro Bloom, luego índice)
+            if emails_registrados.existe(email):
                 flash('Este email ya está registrado.', 'error')
                 return render_template('clientes/form.html', cliente=None, estados=estados)
             
@@ -273,8 +243,7 @@ def crear():
             
             # Generar contraseña temporal automáticamente (más segura)
             # Incluye mayúsculas, minúsculas, dígitos y símbolos
-            chars = string.ascii_letters + string.digits + '!@#$%'
-            temp_password = ''.join(secrets.choice(chars) for _ in range(10))
+            temp_password = generar_password_temporal()
             
             # Crear cliente con el método de hash personalizado
             nuevo_id = get_next_id()
@@ -295,12 +264,29 @@ def crear():
                 observaciones=observaciones or None
             )
             
+            # Otros clientes con nombre parecido o el mismo teléfono (aviso, no bloquea:
+            # el email distinto ya garantiza que es otra cuenta)
+            similares = duplicados.clientes_similares(nombres, apellidos, telefono)
+            
             db.session.add(nuevo_cliente)
             db.session.commit()
+            emails_registrados.agregar(email)
+            duplicados.registrar_cliente(nuevo_id, nuevo_cliente.nombres, nuevo_cliente.apellidos, nuevo_cliente.telefono)
+            conteos_uso.invalidar('EstadoUsuarios')
             
             flash(f'Cliente {nombres} {apellidos} creado exitosamente. Contraseña temporal: {temp_password} (Comparte esta contraseña con el usuario)', 'success')
+            if similares:
+                flash('Posible duplicado de: ' + ', '.join(f'#{i} {nombre}' for _, i, nombre in similares), 'warning')
             return redirect(url_for('clientes.listar'))
-            
+
+        except PasswordServiceBusy:
+            db.session.rollback()
+            flash('El servidor está ocupado. Intenta de nuevo en unos segundos.', 'warning')
+            return render_template('clientes/form.html', cliente=None, estados=estados), 503
+        except IntegrityError:
+            db.session.rollback()
+            flash('Este email ya está registrado.', 'error')
+            return render_template('clientes/form.html', cliente=None, estados=estados)
         except Exception as e:
             db.session.rollback()
             flash(f'Error al crear cliente: {str(e)}', 'error')
@@ -312,7 +298,7 @@ def crear():
 @clientes_bp.route('/editar/<int:id>', methods=['GET', 'POST'])
 @login_required
 def editar(id):
-    estados = db.session.query(EstadoUsuarios).all()
+    estados = catalogos.lista('EstadoUsuarios')
     # Use joinedload to eagerly load the Estado_Usuarios relationship
     cliente = db.session.query(Clientes).options(
         joinedload(Clientes.Estado_Usuarios)
@@ -373,6 +359,9 @@ def editar(id):
             cliente.observaciones = observaciones or None
             
             db.session.commit()
+            user_cache.invalidar(id)
+            duplicados.registrar_cliente(id, cliente.nombres, cliente.apellidos, cliente.telefono)
+            conteos_uso.invalidar('EstadoUsuarios')
             flash(f'Cliente {nombres} {apellidos} actualizado exitosamente.', 'success')
             return redirect(url_for('clientes.listar'))
             
@@ -397,9 +386,18 @@ def eliminar(id):
             flash('No puedes eliminar tu propia cuenta.', 'error')
             return redirect(url_for('clientes.listar'))
         
+        # Ventas, préstamos, tickets, etc. que lo referencian (una sola consulta)
+        relaciones = dependencias(cliente)
+        if any(relaciones.values()):
+            flash(f'No se puede eliminar a {cliente.nombres} {cliente.apellidos} porque tiene {describir(relaciones, NOMBRES_RELACIONES)} asociados.', 'error')
+            return redirect(url_for('clientes.listar'))
+        
         nombre_completo = f'{cliente.nombres} {cliente.apellidos}'
         db.session.delete(cliente)
         db.session.commit()
+        user_cache.invalidar(id)
+        duplicados.quitar('clientes', id)
+        conteos_uso.invalidar('EstadoUsuarios')
         flash(f'Cliente {nombre_completo} eliminado exitosamente.', 'success')
         
     except Exception as e:
@@ -419,8 +417,7 @@ def resetear_password(id):
             return redirect(url_for('clientes.listar'))
         
         # Generate random password (más segura con caracteres especiales)
-        chars = string.ascii_letters + string.digits + '!@#$%'
-        temp_password = ''.join(secrets.choice(chars) for _ in range(10))
+        temp_password = generar_password_temporal()
         
         # Hash the temporary password usando el método personalizado
         cliente.password_hash = hash_password(temp_password)
@@ -429,9 +426,13 @@ def resetear_password(id):
         # cliente.id_estado = 4
         
         db.session.commit()
+        user_cache.invalidar(id)
         
         flash(f'Contraseña temporal para {cliente.nombres}: {temp_password} (Comparte esta contraseña con el usuario)', 'warning')
-        
+
+    except PasswordServiceBusy:
+        db.session.rollback()
+        flash('El servidor está ocupado. Intenta de nuevo en unos segundos.', 'warning')
     except Exception as e:
         db.session.rollback()
         flash(f'Error al resetear contraseña: {str(e)}', 'error')
@@ -1,6 +1,12 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required
 from app import db
+from app.services.user_cache import user_cache
+from app.services.catalogos import catalogos
+from app.services.conteos import conteos_uso
+from app.services.dependencias import dependencias
+from app.services.ids import siguiente_id
+from app.services.paginacion import ordenar, paginar
 from models import EstadoUsuarios
 from sqlalchemy import func
 
@@ -8,8 +14,7 @@ estado_usuarios_bp = Blueprint('estado_usuarios', __name__, url_prefix='/estado-
 
 def get_next_id():
     """Obtener el siguiente ID disponible para estados"""
-    ultimo_id = db.session.query(func.max(EstadoUsuarios.id_estado)).scalar()
-    return (ultimo_id or 0) + 1
+    return siguiente_id(EstadoUsuarios)
 
 # API para crear desde modal (PARA EL MODAL DENTRO DEL FORMULARIO)
 @estado_usuarios_bp.route('/crear-rapido', methods=['POST'])
@@ -45,6 +50,7 @@ def crear_rapido():
         
         db.session.add(nuevo_estado)
         db.session.commit()
+        catalogos.invalidar('EstadoUsuarios')
         
         return jsonify({
             'success': True,
@@ -57,12 +63,34 @@ def crear_rapido():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
+# Columnas del listado: de la descripción (TEXT) solo el inicio que se muestra;
+# observaciones se pide al editar. Los clientes por estado salen de conteos_uso
+COLUMNAS_LISTADO = (
+    EstadoUsuarios.id_estado,
+    EstadoUsuarios.nombre,
+    EstadoUsuarios.permite_login,
+    func.substring(EstadoUsuarios.descripcion, 1, 81).label('descripcion'),
+)
+
+ORDENES_ESTADOS = {
+    'id': ordenar(EstadoUsuarios.id_estado),
+    '-id': ordenar(EstadoUsuarios.id_estado, desc=True),
+    'nombre': ordenar(EstadoUsuarios.nombre, EstadoUsuarios.id_estado),
+    '-nombre': ordenar(EstadoUsuarios.nombre, EstadoUsuarios.id_estado, desc=True),
+}
+
 # CRUD completo - Listar
 @estado_usuarios_bp.route('/')
 @login_required
 def listar():
-    estados = db.session.query(EstadoUsuarios).all()
-    return render_template('estado_usuarios/listar.html', estados=estados)
+    q = ' '.join(request.args.get('q', '').split())[:100]
+    consulta = db.session.query(*COLUMNAS_LISTADO)
+    for termino in q.split():
+        consulta = consulta.filter(EstadoUsuarios.nombre.contains(termino, autoescape=True))
+    
+    pagina = paginar(consulta, ORDENES_ESTADOS, request.args, defecto='id')
+    return render_template('estado_usuarios/listar.html', estados=pagina.items, pagina=pagina, q=q,
+                           usos=conteos_uso.get('EstadoUsuarios'))
 
 # CREATE - Formulario completo
 @estado_usuarios_bp.route('/nuevo', methods=['GET', 'POST'])
@@ -91,6 +119,7 @@ def crear():
             
             db.session.add(nuevo_estado)
             db.session.commit()
+            catalogos.invalidar('EstadoUsuarios')
             
             flash('Estado creado exitosamente.', 'success')
             return redirect(url_for('estado_usuarios.listar'))
@@ -130,6 +159,8 @@ def editar(id):
             estado.observaciones = request.form.get('observaciones', '')
             
             db.session.commit()
+            user_cache.invalidar_estado(id)
+            catalogos.invalidar('EstadoUsuarios')
             flash('Estado actualizado exitosamente.', 'success')
             return redirect(url_for('estado_usuarios.listar'))
             
@@ -149,13 +180,15 @@ def eliminar(id):
             flash('Estado no encontrado.', 'error')
             return redirect(url_for('estado_usuarios.listar'))
         
-        # Verificar si tiene clientes asociados
-        if estado.Clientes:
-            flash(f'No se puede eliminar el estado "{estado.nombre}" porque tiene {len(estado.Clientes)} clientes asociados.', 'error')
+        # Verificar si tiene clientes asociados (COUNT sin cargar la colección)
+        clientes_count = dependencias(estado)['Clientes']
+        if clientes_count:
+            flash(f'No se puede eliminar el estado "{estado.nombre}" porque tiene {clientes_count} clientes asociados.', 'error')
             return redirect(url_for('estado_usuarios.listar'))
         
         db.session.delete(estado)
         db.session.commit()
+        catalogos.invalidar('EstadoUsuarios')
         flash('Estado eliminado exitosamente.', 'success')
         
     except Exception as e:
@@ -0,0 +1,114 @@
+from datetime import date, datetime, timedelta
+
+from flask import Blueprint, abort, jsonify, render_template, request
+from flask_login import current_user, login_required
+from sqlalchemy import select
+
+from app import db
+from app.services.catalogos import catalogos
+from app.services.resumenes import IMPORTES, libros_mas_vendidos, resumen_ventas
+from app.services.top_ventas import DIMENSIONES, top_ventas
+from models import Empleados
+
+reportes_bp = Blueprint('reportes', __name__, url_prefix='/reportes')
+
+AGRUPACIONES = {
+    'fecha': 'Día',
+    'id_sucursal': 'Sucursal',
+    'id_empleado': 'Empleado',
+    'id_metodo_pago': 'Método de pago',
+}
+
+def solo_administradores():
+    if current_user.tipo_usuario != 'admin':
+        abort(403)
+
+def leer_fecha(nombre, defecto):
+    try:
+        return datetime.strptime(request.args.get(nombre, ''), '%Y-%m-%d').date()
+    except ValueError:
+        return defecto
+
+def leer_periodo():
+    """desde / hasta (incluida) de la URL, o el mes de ?mes=AAAA-MM; por defecto los últimos 30 días"""
+    try:
+        inicio = datetime.strptime(request.args.get('mes', ''), '%Y-%m').date()
+    except ValueError:
+        inicio = None
+    if inicio is not None:
+        siguiente = (inicio + timedelta(days=32)).replace(day=1)
+        return inicio, siguiente - timedelta(days=1)
+    hasta = leer_fecha('hasta', date.today())
+    desde = leer_fecha('desde', hasta - timedelta(days=29))
+    return min(desde, hasta), hasta
+
+def nombres(agrupar, claves):
+    """{clave: texto} para mostrar la columna agrupada"""
+    if agrupar == 'id_sucursal':
+        sucursales = catalogos.dict('Sucursales')
+        return {c: sucursales[c].nombre if c in sucursales else f'#{c}' for c in claves}
+    if agrupar == 'id_metodo_pago':
+        metodos = catalogos.dict('MetodoDePago')
+        return {c: metodos[c].nombre if c in metodos else f'#{c}' for c in claves}
+    if agrupar == 'id_empleado':
+        empleados = dict(db.session.execute(
+            select(Empleados.id_empleado, Empleados.nombres + ' ' + Empleados.apellidos)
+            .where(Empleados.id_empleado.in_(claves))
+        ).all()) if claves else {}
+        return {c: empleados.get(c, f'#{c}') for c in claves}
+    return {c: c.strftime('%d/%m/%Y') for c in claves}
+
+# Ventas del período agrupadas (lee Resumen_Ventas_Dia)
+@reportes_bp.route('/ventas')
+@login_required
+def ventas():
+    solo_administradores()
+    desde, hasta = leer_periodo()
+    agrupar = request.args.get('agrupar', 'fecha')
+    if agrupar not in AGRUPACIONES:
+        agrupar = 'fecha'
+    id_sucursal = request.args.get('sucursal', type=int)
+
+    filas = resumen_ventas(desde, hasta, agrupar, id_sucursal)
+    etiquetas = nombres(agrupar, [f.clave for f in filas])
+    totales = {campo: sum(getattr(f, campo) or 0 for f in filas)
+               for campo in ('ventas', 'anuladas', 'unidades', *IMPORTES)}
+    return render_template('reportes/ventas.html', filas=filas, etiquetas=etiquetas, totales=totales,
+                           desde=desde, hasta=hasta, agrupar=agrupar, agrupaciones=AGRUPACIONES,
+                           id_sucursal=id_sucursal, sucursales=catalogos.lista('Sucursales'))
+
+# Libros más vendidos del período (lee Resumen_Ventas_Libro)
+@reportes_bp.route('/libros')
+@login_required
+def libros():
+    solo_administradores()
+    desde, hasta = leer_periodo()
+    limite = min(max(request.args.get('limite', 50, type=int), 1), 500)
+    filas = libros_mas_vendidos(desde, hasta, limite)
+    return render_template('reportes/libros.html', filas=filas, desde=desde, hasta=hasta, limite=limite)
+
+# Top N libros por categoría o sucursal en JSON (cacheado por período)
+@reportes_bp.route('/top-libros')
+@login_required
+def top_libros():
+    solo_administradores()
+    por = request.args.get('por', 'categoria')
+    if por not in DIMENSIONES:
+        return jsonify({'error': f'por debe ser {" o ".join(DIMENSIONES)}'}), 400
+    desde, hasta = leer_periodo()
+    n = min(max(request.args.get('n', 20, type=int), 1), 100)
+
+    top = top_ventas.get(por, desde, hasta, n)
+    catalogo = catalogos.dict('Categorias' if por == 'categoria' else 'Sucursales')
+    return jsonify({
+        'por': por,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'n': n,
+        'generado': top.generado.isoformat(timespec='seconds'),
+        'grupos': [
+            {'id': grupo, 'nombre': catalogo[grupo].nombre if grupo in catalogo else None,
+             'libros': [libro._asdict() for libro in libros]}
+            for grupo, libros in top.grupos.items()
+        ],
+    })
@@ -1,85 +1,51 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required
 from app import db
+from app.services.catalogos import catalogos
+from app.services.conteos import conteos_uso
+from app.services.dependencias import dependencias, describir, tiene_dependencias
+from app.services.paginacion import ordenar, paginar
+from app.services.validacion import (validar_id_tipo_documento, validar_nombre_tipo_documento,
+                                     validar_descripcion_tipo_documento)
 from models import TiposDocumentos
-from sqlalchemy import func
-import re
+from sqlalchemy import func, or_
 
 tipos_documentos_bp = Blueprint('tipos_documentos', __name__, url_prefix='/tipos-documentos')
 
-def validar_id(id_str):
-    """Validar ID del tipo de documento"""
-    if not id_str or not id_str.strip():
-        return False, 'El ID es obligatorio'
-    
-    try:
-        id_num = int(id_str)
-    except ValueError:
-        return False, 'El ID debe ser un número entero'
-    
-    if id_num <= 0:
-        return False, 'El ID debe ser un número positivo'
-    
-    if id_num > 9999:
-        return False, 'El ID no puede exceder 9999'
-    
-    return True, None
+ORDENES_TIPOS = {
+    'nombre': ordenar(TiposDocumentos.nombre, TiposDocumentos.id_tipo_documento),
+    '-nombre': ordenar(TiposDocumentos.nombre, TiposDocumentos.id_tipo_documento, desc=True),
+    'id': ordenar(TiposDocumentos.id_tipo_documento),
+    '-id': ordenar(TiposDocumentos.id_tipo_documento, desc=True),
+}
 
-def validar_nombre(nombre):
-    """Validar nombre del tipo de documento con reglas estrictas"""
-    if not nombre or not nombre.strip():
-        return False, 'El nombre es obligatorio'
-    
-    nombre_limpio = ' '.join(nombre.split())
-    
-    # Longitud mínima y máxima
-    if len(nombre_limpio) < 2:
-        return False, 'El nombre debe tener al menos 2 caracteres'
-    
-    if len(nombre_limpio) > 30:
-        return False, 'El nombre no puede exceder 30 caracteres'
-    
-    # No más de 2 espacios seguidos en el texto original
-    if '   ' in nombre:  # 3 espacios
-        return False, 'El nombre no puede tener más de 2 espacios consecutivos'
-    
-    # Validar caracteres permitidos
-    if not re.match(r'^[A-Za-z0-9ÁÉÍÓÚáéíóúÑñ\s\-\.]+$', nombre_limpio):
-        return False, 'El nombre solo puede contener letras, números, espacios, guiones y puntos'
-    
-    # No más de 2 caracteres iguales seguidos (excepto espacios)
-    if re.search(r'([^\s])\1{2,}', nombre_limpio):
-        return False, 'El nombre no puede tener el mismo carácter repetido más de 2 veces seguidas'
-    
-    return True, None
-
-def validar_descripcion(descripcion):
-    """Validar descripción del tipo de documento con reglas estrictas"""
-    if not descripcion:
-        return True, None
-    
-    descripcion = descripcion.strip()
-    
-    # No más de 2 espacios consecutivos
-    if '   ' in descripcion:
-        return False, 'La descripción no puede tener más de 2 espacios consecutivos'
-    
-    # Longitud máxima
-    if len(descripcion) > 100:
-        return False, 'La descripción no puede exceder 100 caracteres'
-    
-    # Mínimo 5 caracteres si se proporciona
-    if len(descripcion) > 0 and len(descripcion) < 5:
-        return False, 'La descripción debe tener al menos 5 caracteres'
-    
-    return True, None
+NOMBRES_RELACIONES = {'Clientes_Documento': 'cliente(s)', 'Empleados_Documento': 'empleado(s)'}
 
-# READ - Listar todos los tipos de documentos
+# READ - Listar tipos de documentos (paginado en el servidor)
 @tipos_documentos_bp.route('/')
 @login_required
 def listar():
-    tipos = db.session.query(TiposDocumentos).order_by(TiposDocumentos.nombre).all()
-    return render_template('tipos_documentos/listar.html', tipos=tipos)
+    q = ' '.join(request.args.get('q', '').split())[:100]
+    estado = request.args.get('estado', '') if request.args.get('estado') in ('active', 'inactive') else ''
+    
+    consulta = db.session.query(TiposDocumentos)
+    for termino in q.split():
+        consulta = consulta.filter(or_(
+            TiposDocumentos.nombre.contains(termino, autoescape=True),
+            TiposDocumentos.descripcion.contains(termino, autoescape=True),
+        ))
+    if estado:
+        consulta = consulta.filter(TiposDocumentos.activo == (estado == 'active'))
+    
+    pagina = paginar(consulta, ORDENES_TIPOS, request.args, defecto='nombre')
+    
+    # Totales de las tarjetas desde el catálogo cacheado (sin consultar la tabla)
+    todos = catalogos.lista('TiposDocumentos')
+    total_activos = sum(1 for t in todos if t.activo)
+    return render_template('tipos_documentos/listar.html', tipos=pagina.items, pagina=pagina,
+                           q=q, estado=estado, total_activos=total_activos,
+                           total_inactivos=len(todos) - total_activos,
+                           usos=conteos_uso.get('TiposDocumentos'))
 
 # CREATE - Mostrar formulario de creación
 @tipos_documentos_bp.route('/nuevo', methods=['GET', 'POST'])
@@ -93,7 +59,7 @@ def crear():
             activo = request.form.get('activo') == 'on'
             
             # Validar ID
-            valido, error = validar_id(id_tipo_documento_str)
+            valido, error = validar_id_tipo_documento(id_tipo_documento_str)
             if not valido:
                 flash(error, 'error')
                 return render_template('tipos_documentos/form.html')
@@ -107,7 +73,7 @@ def crear():
                 return render_template('tipos_documentos/form.html')
             
             # Validar nombre
-            valido, error = validar_nombre(nombre)
+            valido, error = validar_nombre_tipo_documento(nombre)
             if not valido:
                 flash(error, 'error')
                 return render_template('tipos_documentos/form.html')
@@ -122,7 +88,7 @@ def crear():
                 return render_template('tipos_documentos/form.html')
             
             # Validar descripción
-            valido, error = validar_descripcion(descripcion)
+            valido, error = validar_descripcion_tipo_documento(descripcion)
             if not valido:
                 flash(error, 'error')
                 return render_template('tipos_documentos/form.html')
@@ -137,6 +103,7 @@ def crear():
             
             db.session.add(nuevo_tipo)
             db.session.commit()
+            catalogos.invalidar('TiposDocumentos')
             
             flash(f'Tipo de documento "{nombre}" creado exitosamente.', 'success')
             return redirect(url_for('tipos_documentos.listar'))
@@ -163,7 +130,7 @@ def editar(id):
             activo = request.form.get('activo') == 'on'
             
             # Validar nombre
-            valido, error = validar_nombre(nombre)
+            valido, error = validar_nombre_tipo_documento(nombre)
             if not valido:
                 flash(error, 'error')
                 return render_template('tipos_documentos/form.html', tipo=tipo)
@@ -179,7 +146,7 @@ def editar(id):
                 return render_template('tipos_documentos/form.html', tipo=tipo)
             
             # Validar descripción
-            valido, error = validar_descripcion(descripcion)
+            valido, error = validar_descripcion_tipo_documento(descripcion)
             if not valido:
                 flash(error, 'error')
                 return render_template('tipos_documentos/form.html', tipo=tipo)
@@ -190,6 +157,7 @@ def editar(id):
             tipo.activo = activo
             
             db.session.commit()
+            catalogos.invalidar('TiposDocumentos')
             flash(f'Tipo de documento "{nombre}" actualizado exitosamente.', 'success')
             return redirect(url_for('tipos_documentos.listar'))
             
@@ -209,25 +177,18 @@ def eliminar(id):
             flash('Tipo de documento no encontrado.', 'error')
             return redirect(url_for('tipos_documentos.listar'))
         
-        # Verificar si tiene registros relacionados
-        tiene_relaciones = False
-        mensaje_relaciones = []
-        
-        if hasattr(tipo, 'Clientes_Documento') and tipo.Clientes_Documento:
-            tiene_relaciones = True
-            mensaje_relaciones.append(f'{len(tipo.Clientes_Documento)} cliente(s)')
+        # Verificar si tiene registros relacionados (una consulta para todas las FK)
+        relaciones = dependencias(tipo)
         
-        if hasattr(tipo, 'Empleados_Documento') and tipo.Empleados_Documento:
-            tiene_relaciones = True
-            mensaje_relaciones.append(f'{len(tipo.Empleados_Documento)} empleado(s)')
-        
-        if tiene_relaciones:
-            flash(f'No se puede eliminar "{tipo.nombre}" porque está asociado a {" y ".join(mensaje_relaciones)}.', 'error')
+        if any(relaciones.values()):
+            mensaje_relaciones = describir(relaciones, NOMBRES_RELACIONES)
+            flash(f'No se puede eliminar "{tipo.nombre}" porque está asociado a {mensaje_relaciones}.', 'error')
             return redirect(url_for('tipos_documentos.listar'))
         
         nombre = tipo.nombre
         db.session.delete(tipo)
         db.session.commit()
+        catalogos.invalidar('TiposDocumentos')
         flash(f'Tipo de documento "{nombre}" eliminado exitosamente.', 'error')  # Red notification
         
     except Exception as e:
@@ -248,19 +209,14 @@ def toggle_activo(id):
         
         # Verificar si tiene registros asociados antes de desactivar
         if tipo.activo:  # Si está activo y queremos desactivar
-            tiene_uso = False
-            if hasattr(tipo, 'Clientes_Documento') and tipo.Clientes_Documento:
-                tiene_uso = True
-            if hasattr(tipo, 'Empleados_Documento') and tipo.Empleados_Documento:
-                tiene_uso = True
-            
-            if tiene_uso:
+            if tiene_dependencias(tipo):
                 flash(f'Advertencia: El tipo "{tipo.nombre}" tiene documentos asociados. Al desactivarlo, no estará disponible para nuevos registros.', 'warning')
         
         tipo.activo = not tipo.activo
         estado = "activado" if tipo.activo else "desactivado"
         
         db.session.commit()
+        catalogos.invalidar('TiposDocumentos')
         
         # Usar categoría apropiada
         categoria = 'success' if tipo.activo else 'warning'
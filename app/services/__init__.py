@@ -0,0 +1 @@
+# Servicios compartidos por los blueprints (hash de contraseñas, caches, etc.)
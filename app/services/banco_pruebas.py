@@ -0,0 +1,156 @@
+"""
+Banco de pruebas de ventas sobre SQLite (flask medir-ventas).
+
+El esquema real es de SQL Server (models.py generado con sqlacodegen).
+Para medir sin un servidor se crea un archivo SQLite aparte con una copia
+de la metadata: MONEY y TINYINT pasan a tipos de SQLite y las columnas no
+llevan collation. La metadata de models.py no se modifica, así que la
+app del proceso sigue generando el DDL de SQL Server. Las conexiones usan
+WAL para que las cajas (hilos) compartan el archivo.
+
+- esquema_sqlite: la copia de la metadata (también la usan las pruebas).
+- medir_ventas: crea la base, siembra sucursales con CAI vigente y libros
+  con stock, y corre `cajas` hilos por sucursal llamando a procesar_venta.
+"""
+import copy
+import decimal
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Integer, MetaData, Numeric, event, func, insert, select
+from sqlalchemy.dialects.mssql import MONEY, TINYINT
+
+MedicionVentas = namedtuple('MedicionVentas', 'segundos por_sucursal facturas_repetidas')
+
+
+def esquema_sqlite():
+    """Copia de Base.metadata con tipos de SQLite y sin collations"""
+    from models import Base
+
+    copia = MetaData()
+    for tabla in Base.metadata.sorted_tables:
+        tabla.to_metadata(copia)
+    for tabla in copia.tables.values():
+        for columna in tabla.columns:
+            # La copia de la columna comparte el objeto de tipo con el original: se reemplaza, no se modifica
+            if isinstance(columna.type, MONEY):
+                columna.type = Numeric(19, 4)
+            elif isinstance(columna.type, TINYINT):
+                columna.type = Integer()
+            elif getattr(columna.type, 'collation', None):
+                columna.type = copy.copy(columna.type)
+                columna.type.collation = None
+    return copia
+
+
+def _pragmas(conexion, registro):
+    # WAL: los lectores no esperan al escritor
+    conexion.execute('PRAGMA journal_mode=WAL')
+    conexion.execute('PRAGMA busy_timeout=60000')
+
+
+def _crear_banco(ruta_db):
+    """App propia con la base en `ruta_db` (archivo nuevo) y el esquema creado"""
+    from app import create_app, db
+    from config import Config
+
+    sqlite3.register_adapter(decimal.Decimal, str)
+    app = create_app(type('ConfigBanco', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{ruta_db}',
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 60}},
+        'PASSWORD_POOL_WORKERS': 0,
+    }))
+    with app.app_context():
+        event.listen(db.engine, 'connect', _pragmas)
+        esquema_sqlite().create_all(db.engine)
+    return app
+
+
+def _sembrar(app, sucursales, libros, stock=10 ** 6):
+    """Sucursales 1..n con un CAI vigente cada una y libros 1..m con stock físico en todas"""
+    from app import db
+    from models import CaiSucursales, Libros, StockActual, Sucursales
+
+    hoy = date.today()
+    with app.app_context():
+        db.session.execute(insert(Sucursales), [
+            dict(id_sucursal=s, nombre=f'Sucursal {s}', direccion='-', telefono='-', email='-', ciudad='-',
+                 departamento='-', codigo_postal='-', activo=1)
+            for s in range(1, sucursales + 1)
+        ])
+        db.session.execute(insert(Libros), [
+            dict(id_libro=l, isbn=str(l), titulo=f'Libro {l}', formato='Físico', num_pag=100,
+                 stock_fisico=stock * sucursales, stock_digital=0, precio_venta=100 + l % 37,
+                 precio_prestamo=1, disp_venta=1)
+            for l in range(1, libros + 1)
+        ])
+        db.session.execute(insert(StockActual), [
+            dict(id_libro=l, id_sucursal=s, formato='fisico', stock=stock, fecha_actualizacion=datetime.now())
+            for l in range(1, libros + 1) for s in range(1, sucursales + 1)
+        ])
+        db.session.execute(insert(CaiSucursales), [
+            dict(id_cai=s, id_sucursal=s, cai=f'CAI-{s}', rtn_empresa='08011999000001', prefijo=f'{s:03d}-001-01',
+                 rango_inicial=1, rango_final=10 ** 6, ultimo_numero=0, fecha_autorizacion=hoy,
+                 fecha_limite=hoy + timedelta(days=365), activo=True)
+            for s in range(1, sucursales + 1)
+        ])
+        db.session.commit()
+
+
+def medir_ventas(ruta_db, sucursales, cajas, segundos, libros, max_lineas=4, semilla=0):
+    """
+    Crear la base en `ruta_db` y, durante `segundos`, `cajas` hilos por
+    sucursal registran carritos al azar de 1 a max_lineas libros. Devuelve
+    MedicionVentas con un Counter por sucursal (ventas, rechazadas,
+    reintentos, errores).
+    """
+    from app import db
+    from app.services.inventario import StockInsuficiente
+    from app.services.ventas import VentaRechazada, procesar_venta
+    from models import Venta
+
+    app = _crear_banco(ruta_db)
+    _sembrar(app, sucursales, libros)
+    por_sucursal = {s: Counter() for s in range(1, sucursales + 1)}
+    lock = threading.Lock()
+    fin = time.monotonic() + segundos
+
+    def caja(id_sucursal, k):
+        aleatorio = random.Random(semilla * 10000 + id_sucursal * 100 + k)
+        conteo = Counter()
+        with app.app_context():
+            while time.monotonic() < fin:
+                carrito = [(aleatorio.randint(1, libros), aleatorio.randint(1, 3))
+                           for _ in range(aleatorio.randint(1, max_lineas))]
+                try:
+                    resultado = procesar_venta(carrito, id_sucursal, id_sucursal * 100 + k, 1, 1)
+                    conteo['ventas'] += 1
+                    conteo['reintentos'] += resultado.intentos - 1
+                except (StockInsuficiente, VentaRechazada):
+                    conteo['rechazadas'] += 1
+                except Exception as e:
+                    db.session.rollback()
+                    conteo['errores'] += 1
+                    if conteo['errores'] <= 3:
+                        print(f'Error en la caja {k} de la sucursal {id_sucursal}: {e}')
+        with lock:
+            por_sucursal[id_sucursal].update(conteo)
+
+    hilos = [threading.Thread(target=caja, args=(s, k), name=f'caja-{s}-{k}')
+             for s in range(1, sucursales + 1) for k in range(cajas)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    with app.app_context():
+        repetidas = db.session.scalar(
+            select(func.count(Venta.numero_factura) - func.count(func.distinct(Venta.numero_factura))))
+        db.engine.dispose()
+    return MedicionVentas(duracion, por_sucursal, repetidas)
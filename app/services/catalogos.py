@@ -0,0 +1,150 @@
+"""
+Registro de catálogos (tablas de referencia pequeñas).
+
+Cada worker carga una vez Estado_Usuarios, Tipos_Documentos, Categorias, etc.
+y los sirve como tuplas/diccionarios inmutables. Versiones_Catalogo guarda
+un contador por tabla: los blueprints CRUD lo incrementan al escribir y los
+demás workers recargan de forma perezosa al detectar el cambio (la lectura
+de versiones es una sola consulta cada CATALOGOS_INTERVALO segundos).
+"""
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from sqlalchemy import inspect, select, update, insert
+
+
+class Catalogo:
+    """Filas inmutables de una tabla de referencia"""
+
+    __slots__ = ('filas', 'por_id', 'version')
+
+    def __init__(self, filas, por_id, version):
+        self.filas = filas
+        self.por_id = por_id
+        self.version = version
+
+
+class CatalogRegistry:
+
+    def __init__(self, intervalo=5.0):
+        self.intervalo = intervalo
+        self._definiciones = {}
+        self._catalogos = {}
+        self._versiones = {}
+        self._versiones_leidas = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.intervalo = app.config.get('CATALOGOS_INTERVALO', self.intervalo)
+        app.extensions['catalogos'] = self
+
+    def registrar(self, modelo, orden=None):
+        """Registrar un modelo como catálogo; orden: columnas para order_by"""
+        mapper = inspect(modelo)
+        columnas = [c.key for c in mapper.column_attrs]
+        pk = mapper.primary_key[0].key
+        fila_cls = namedtuple(modelo.__name__ + 'Fila', columnas)
+        self._definiciones[modelo.__name__] = (modelo, columnas, pk, fila_cls, orden)
+
+    def _tabla(self, nombre):
+        return self._definiciones[nombre][0].__tablename__
+
+    def _leer_versiones(self):
+        """Versiones de todos los catálogos en una sola consulta (conexión aparte)"""
+        from app import db
+        from models import VersionesCatalogo
+
+        ahora = time.monotonic()
+        if ahora - self._versiones_leidas < self.intervalo:
+            return self._versiones
+        try:
+            with db.engine.connect() as conn:
+                filas = conn.execute(select(VersionesCatalogo.tabla, VersionesCatalogo.version)).all()
+            self._versiones = {tabla: version for tabla, version in filas}
+        except Exception as e:
+            # Sin la tabla de versiones se sigue funcionando con recarga por intervalo
+            print(f"Error leyendo versiones de catálogos: {str(e)}")
+            self._versiones = {}
+            self._catalogos.clear()
+        self._versiones_leidas = ahora
+        return self._versiones
+
+    def _cargar(self, nombre, version):
+        from app import db
+
+        modelo, columnas, pk, fila_cls, orden = self._definiciones[nombre]
+        consulta = select(*[getattr(modelo, c) for c in columnas])
+        if orden:
+            consulta = consulta.order_by(*[getattr(modelo, c) for c in orden])
+        with db.engine.connect() as conn:
+            filas = tuple(fila_cls(*fila) for fila in conn.execute(consulta))
+        por_id = MappingProxyType({getattr(f, pk): f for f in filas})
+        return Catalogo(filas, por_id, version)
+
+    def get(self, nombre):
+        with self._lock:
+            version = self._leer_versiones().get(self._tabla(nombre), 0)
+            catalogo = self._catalogos.get(nombre)
+            if catalogo is None or catalogo.version != version:
+                catalogo = self._catalogos[nombre] = self._cargar(nombre, version)
+            return catalogo
+
+    def lista(self, nombre):
+        """Tupla de filas (namedtuple) del catálogo"""
+        return self.get(nombre).filas
+
+    def dict(self, nombre):
+        """Diccionario de solo lectura {pk: fila}"""
+        return self.get(nombre).por_id
+
+    def version(self, tabla):
+        """Versión de una tabla en Versiones_Catalogo (releída cada `intervalo` segundos)"""
+        with self._lock:
+            return self._leer_versiones().get(tabla, 0)
+
+    def incrementar(self, tabla):
+        """
+        Incrementar la versión de `tabla` para que los demás workers la vean.
+        Se llama después del commit de la vista; usa su propia transacción.
+        """
+        from app import db
+        from models import VersionesCatalogo
+
+        try:
+            with db.engine.begin() as conn:
+                resultado = conn.execute(
+                    update(VersionesCatalogo)
+                    .where(VersionesCatalogo.tabla == tabla)
+                    .values(version=VersionesCatalogo.version + 1)
+                )
+                if not resultado.rowcount:
+                    conn.execute(insert(VersionesCatalogo).values(tabla=tabla, version=1))
+        except Exception as e:
+            print(f"Error incrementando versión de {tabla}: {str(e)}")
+        with self._lock:
+            # Forzar relectura de versiones en la próxima consulta de este worker
+            self._versiones_leidas = 0.0
+
+    def invalidar(self, nombre):
+        """Incrementar la versión del catálogo tras una escritura"""
+        self.incrementar(self._tabla(nombre))
+        with self._lock:
+            self._catalogos.pop(nombre, None)
+
+
+catalogos = CatalogRegistry()
+
+
+def registrar_catalogos():
+    from models import (EstadoUsuarios, TiposDocumentos, Categorias, Pais,
+                        MetodoDePago, EstadoVenta, Sucursales)
+
+    catalogos.registrar(EstadoUsuarios, orden=['id_estado'])
+    catalogos.registrar(TiposDocumentos, orden=['nombre'])
+    catalogos.registrar(Categorias, orden=['nombre'])
+    catalogos.registrar(Pais, orden=['nombre_pais'])
+    catalogos.registrar(MetodoDePago, orden=['nombre'])
+    catalogos.registrar(EstadoVenta, orden=['id_estado'])
+    catalogos.registrar(Sucursales, orden=['nombre'])
@@ -0,0 +1,247 @@
+"""
+Conciliación del inventario contra el libro mayor (Inventarios).
+
+Cada sucursal se procesa en un proceso aparte con su propia conexión. El
+proceso recorre sus movimientos ordenados por (id_libro, formato,
+fecha_movimiento, id_inventario) con un cursor del servidor, de a
+`tamano_lote` filas (índice IX_Inventarios_conciliacion), y por cada clave
+(libro, sucursal, formato) guarda solo el saldo en curso:
+
+- stock_anterior de cada fila debe ser el stock_nuevo de la anterior
+  (la primera parte de 0) y stock_nuevo = stock_anterior + cantidad;
+- el saldo final debe coincidir con Stock_Actual.
+
+Si el libro mayor fue compactado (app/services/cortes.py) cada clave parte
+del saldo del último corte archivado en lugar de 0 y solo se recorren los
+movimientos posteriores a ese corte.
+
+Cada proceso devuelve sus diferencias y la suma por (libro, formato); el
+proceso principal suma las sucursales y las compara con
+Libros.stock_fisico / stock_digital recorriendo Libros también por lotes.
+La memoria depende de la cantidad de libros, no de movimientos.
+
+Las correcciones (opcionales) dejan Stock_Actual igual a lo reconstruido y
+agregan un movimiento de ajuste por cada libro cuyo total en Libros no
+coincide con el libro mayor. Conviene ejecutarlas sin ventas en curso.
+"""
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import and_, create_engine, delete, select, update
+from sqlalchemy.pool import NullPool
+
+from app.services.cortes import fecha_archivada, saldos_corte
+from app.services.ids import id_allocator
+from app.services.inventario import DIGITAL, FISICO, registrar_movimiento
+
+TAMANO_LOTE = 10000
+# Diferencias de cadena que se reportan por clave (el resto solo se cuentan)
+MAX_RUPTURAS_POR_CLAVE = 5
+
+Discrepancia = namedtuple('Discrepancia', 'tipo id_libro id_sucursal formato esperado registrado detalle')
+
+
+class ReporteConciliacion:
+    """Resultado de conciliar_inventario"""
+
+    def __init__(self):
+        self.movimientos = 0
+        self.claves = 0
+        self.sucursales = 0
+        self.discrepancias = []
+        self.rupturas_omitidas = 0
+        self.ajustes = []
+        self.segundos = 0.0
+
+    def por_tipo(self):
+        conteo = defaultdict(int)
+        for d in self.discrepancias:
+            conteo[d.tipo] += 1
+        return dict(conteo)
+
+
+def _cerrar_clave(clave, saldo, stock_actual, discrepancias):
+    id_libro, id_sucursal, formato = clave
+    registrado = stock_actual.pop((id_libro, formato), None)
+    if registrado != saldo:
+        discrepancias.append(Discrepancia('stock_actual', id_libro, id_sucursal, formato, saldo, registrado,
+                                          'Stock_Actual no coincide con el libro mayor'))
+
+
+def conciliar_sucursal(url, opciones_engine, id_sucursal, tamano_lote=TAMANO_LOTE, archivada=None):
+    """
+    Recorrer el libro mayor de una sucursal (se ejecuta en un proceso del
+    pool) desde el corte archivado en `archivada`, si lo hay. Devuelve
+    (movimientos, claves, discrepancias, rupturas omitidas,
+    {(id_libro, formato): suma}).
+    """
+    from models import Inventarios, StockActual
+
+    engine = create_engine(url, poolclass=NullPool, **opciones_engine)
+    discrepancias = []
+    sumas = {}
+    movimientos = claves = omitidas = 0
+    try:
+        with engine.connect() as conn:
+            stock_actual = {
+                (id_libro, formato): stock
+                for id_libro, formato, stock in conn.execute(
+                    select(StockActual.id_libro, StockActual.formato, StockActual.stock)
+                    .where(StockActual.id_sucursal == id_sucursal)
+                )
+            }
+            iniciales = {}
+            if archivada is not None:
+                iniciales = {(id_libro, formato): saldo for (_, id_libro, formato), saldo
+                             in saldos_corte(conn, archivada, id_sucursal).items()}
+            consulta = (
+                select(Inventarios.id_inventario, Inventarios.id_libro, Inventarios.formato, Inventarios.cantidad,
+                       Inventarios.stock_anterior, Inventarios.stock_nuevo)
+                .where(Inventarios.id_sucursal == id_sucursal)
+                .order_by(Inventarios.id_libro, Inventarios.formato,
+                          Inventarios.fecha_movimiento, Inventarios.id_inventario)
+            )
+            if archivada is not None:
+                # Los anteriores al corte pueden seguir aquí si la compactación no terminó
+                consulta = consulta.where(Inventarios.fecha_movimiento > archivada)
+            clave = None
+            saldo = rupturas = 0
+            resultado = conn.execution_options(yield_per=tamano_lote).execute(consulta)
+            for id_inventario, id_libro, formato, cantidad, anterior, nuevo in resultado:
+                movimientos += 1
+                actual = (id_libro, id_sucursal, formato)
+                if actual != clave:
+                    if clave is not None:
+                        _cerrar_clave(clave, saldo, stock_actual, discrepancias)
+                        sumas[(clave[0], clave[2])] = saldo
+                    clave, saldo, rupturas = actual, iniciales.pop((id_libro, formato), 0), 0
+                    claves += 1
+
+                if anterior != saldo or nuevo != anterior + cantidad:
+                    rupturas += 1
+                    if rupturas <= MAX_RUPTURAS_POR_CLAVE:
+                        discrepancias.append(Discrepancia(
+                            'cadena', id_libro, id_sucursal, formato, saldo, anterior,
+                            f'Movimiento {id_inventario}: anterior {anterior}, cantidad {cantidad}, nuevo {nuevo}'))
+                    else:
+                        omitidas += 1
+                saldo += cantidad
+            if clave is not None:
+                _cerrar_clave(clave, saldo, stock_actual, discrepancias)
+                sumas[(clave[0], clave[2])] = saldo
+            # Claves sin movimientos después del corte archivado
+            claves += len(iniciales)
+            for (id_libro, formato), saldo in iniciales.items():
+                _cerrar_clave((id_libro, id_sucursal, formato), saldo, stock_actual, discrepancias)
+                sumas[(id_libro, formato)] = saldo
+
+        # Claves con saldo en Stock_Actual pero sin movimientos
+        for (id_libro, formato), registrado in stock_actual.items():
+            if registrado:
+                discrepancias.append(Discrepancia('stock_actual', id_libro, id_sucursal, formato, 0, registrado,
+                                                  'Stock_Actual sin movimientos en el libro mayor'))
+    finally:
+        engine.dispose()
+    return movimientos, claves, discrepancias, omitidas, sumas
+
+
+def _comparar_libros(sumas, tamano_lote):
+    """Comparar Libros.stock_fisico / stock_digital con la suma del libro mayor de todas las sucursales"""
+    from app import db
+    from models import Libros
+
+    discrepancias = []
+    consulta = select(Libros.id_libro, Libros.stock_fisico, Libros.stock_digital)
+    for id_libro, fisico, digital in db.session.execute(consulta.execution_options(yield_per=tamano_lote)):
+        for formato, registrado in ((FISICO, fisico), (DIGITAL, digital)):
+            esperado = sumas.get((id_libro, formato), 0)
+            if registrado != esperado:
+                discrepancias.append(Discrepancia(
+                    'libro', id_libro, None, formato, esperado, registrado,
+                    f'Libros.stock_{formato} no coincide con la suma del libro mayor'))
+    return discrepancias
+
+
+def conciliar_inventario(procesos=None, tamano_lote=TAMANO_LOTE, sucursales=None):
+    """Conciliar todas las sucursales (o las indicadas) en un pool de procesos"""
+    from flask import current_app
+    from app import db
+    from models import Sucursales
+
+    inicio = time.perf_counter()
+    reporte = ReporteConciliacion()
+    todas = sucursales is None
+    if todas:
+        sucursales = list(db.session.scalars(select(Sucursales.id_sucursal).order_by(Sucursales.id_sucursal)))
+    reporte.sucursales = len(sucursales)
+    archivada = fecha_archivada(db.session)
+
+    url = db.engine.url.render_as_string(hide_password=False)
+    opciones = current_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    opciones = {k: v for k, v in opciones.items() if k not in ('pool_size', 'max_overflow', 'pool_recycle', 'pool_timeout')}
+    # Las conexiones del proceso principal no deben heredarse al hacer fork
+    db.session.close()
+    db.engine.dispose()
+
+    sumas = defaultdict(int)
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = [pool.submit(conciliar_sucursal, url, opciones, id_sucursal, tamano_lote, archivada)
+                   for id_sucursal in sucursales]
+        for futuro in futuros:
+            movimientos, claves, discrepancias, omitidas, por_libro = futuro.result()
+            reporte.movimientos += movimientos
+            reporte.claves += claves
+            reporte.discrepancias.extend(discrepancias)
+            reporte.rupturas_omitidas += omitidas
+            for clave, saldo in por_libro.items():
+                sumas[clave] += saldo
+
+    if todas:
+        # El total de Libros solo se puede comparar si se recorrieron todas las sucursales
+        reporte.discrepancias.extend(_comparar_libros(sumas, tamano_lote))
+    reporte.segundos = time.perf_counter() - inicio
+    return reporte
+
+
+def corregir(reporte, id_sucursal_ajuste, id_empleado, motivo='Ajuste por conciliación de inventario'):
+    """
+    Aplicar las correcciones del reporte en una transacción:
+    - Stock_Actual toma el saldo reconstruido del libro mayor;
+    - por cada diferencia con Libros se agrega un movimiento en
+      `id_sucursal_ajuste` por la diferencia, sin volver a sumarlo a Libros.
+    Las rupturas de cadena no se corrigen (son historia); solo se reportan.
+    """
+    from app import db
+    from models import Inventarios, StockActual
+
+    por_libro = [d for d in reporte.discrepancias if d.tipo == 'libro']
+    # IDs reservados antes de escribir: la reserva usa su propia transacción
+    ids = iter(id_allocator.reservar_rango(Inventarios, len(por_libro)))
+    ahora = datetime.now()
+    for d in reporte.discrepancias:
+        if d.tipo != 'stock_actual':
+            continue
+        clave = and_(StockActual.id_libro == d.id_libro, StockActual.id_sucursal == d.id_sucursal,
+                     StockActual.formato == d.formato)
+        if d.registrado is None:
+            db.session.add(StockActual(id_libro=d.id_libro, id_sucursal=d.id_sucursal, formato=d.formato,
+                                       stock=d.esperado, fecha_actualizacion=ahora))
+        elif d.esperado == 0 and d.detalle.startswith('Stock_Actual sin movimientos'):
+            db.session.execute(delete(StockActual).where(clave))
+        else:
+            db.session.execute(update(StockActual).where(clave).values(stock=d.esperado)
+                               .execution_options(synchronize_session=False))
+    db.session.flush()
+
+    ajustes = [
+        registrar_movimiento(
+            d.id_libro, id_sucursal_ajuste, d.formato, d.registrado - d.esperado, 'ajuste', id_empleado, motivo,
+            referencia='conciliacion', permitir_negativo=True, id_inventario=next(ids), actualizar_libro=False,
+        )
+        for d in por_libro
+    ]
+    db.session.commit()
+    reporte.ajustes = ajustes
+    return ajustes
@@ -0,0 +1,106 @@
+"""
+Conteos de uso para los listados (libros por categoría, clientes por
+estado, documentos por tipo).
+
+Cada conteo registrado se calcula con una sola consulta agregada sobre las
+tablas que referencian al modelo (las relaciones uno-a-muchos del mapper):
+
+    SELECT 'Clientes_Documento', id_tipo_documento, COUNT(*) FROM Clientes_Documento GROUP BY id_tipo_documento
+    UNION ALL
+    SELECT 'Empleados_Documento', id_tipo_documento, COUNT(*) FROM Empleados_Documento GROUP BY id_tipo_documento
+
+El resultado queda en memoria del worker CONTEOS_TTL segundos y las vistas
+que escriben en esas tablas lo invalidan, así que un listado hace siempre
+el mismo número de consultas sin importar cuántas filas muestre.
+"""
+import threading
+import time
+from types import MappingProxyType
+
+from sqlalchemy import func, literal, select, union_all
+
+from app.services.dependencias import referencias
+
+_VACIO = MappingProxyType({})
+
+
+class Conteos:
+    """{relación: {id: cantidad}} de un modelo, de solo lectura"""
+
+    __slots__ = ('por_relacion', 'leido')
+
+    def __init__(self, por_relacion, leido):
+        self.por_relacion = por_relacion
+        self.leido = leido
+
+    def de(self, relacion, id_registro):
+        return self.por_relacion.get(relacion, _VACIO).get(id_registro, 0)
+
+    def total(self, id_registro):
+        return sum(conteo.get(id_registro, 0) for conteo in self.por_relacion.values())
+
+
+class ConteosUso:
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._definiciones = {}
+        self._conteos = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('CONTEOS_TTL', self.ttl)
+        app.extensions['conteos_uso'] = self
+
+    def registrar(self, modelo, relaciones=None):
+        """Contar los registros de `relaciones` (todas las uno-a-muchos si es None) por PK del modelo"""
+        seleccionadas = [(nombre, tabla, pares) for nombre, tabla, pares in referencias(modelo)
+                         if relaciones is None or nombre in relaciones]
+        # Solo FK de una columna: el GROUP BY devuelve (relación, id, cantidad)
+        self._definiciones[modelo.__name__] = [(nombre, tabla, pares[0][1])
+                                              for nombre, tabla, pares in seleccionadas if len(pares) == 1]
+
+    def _consulta(self, nombre):
+        partes = [
+            select(literal(relacion).label('relacion'), columna.label('id'), func.count().label('cantidad'))
+            .select_from(tabla).group_by(columna)
+            for relacion, tabla, columna in self._definiciones[nombre]
+        ]
+        return partes[0] if len(partes) == 1 else union_all(*partes)
+
+    def _cargar(self, nombre):
+        from app import db
+
+        por_relacion = {relacion: {} for relacion, _, _ in self._definiciones[nombre]}
+        if por_relacion:
+            for relacion, id_registro, cantidad in db.session.execute(self._consulta(nombre)):
+                por_relacion[relacion][id_registro] = cantidad
+        por_relacion = MappingProxyType({r: MappingProxyType(c) for r, c in por_relacion.items()})
+        return Conteos(por_relacion, time.monotonic())
+
+    def get(self, nombre):
+        """Conteos del modelo `nombre` (se recalculan pasado el TTL)"""
+        with self._lock:
+            conteos = self._conteos.get(nombre)
+        if conteos is None or time.monotonic() - conteos.leido > self.ttl:
+            conteos = self._cargar(nombre)
+            with self._lock:
+                self._conteos[nombre] = conteos
+        return conteos
+
+    def invalidar(self, *nombres):
+        """Descartar los conteos tras escribir en una tabla que los afecta"""
+        with self._lock:
+            for nombre in nombres:
+                self._conteos.pop(nombre, None)
+
+
+conteos_uso = ConteosUso()
+
+
+def registrar_conteos():
+    from models import Categorias, EstadoUsuarios, TiposDocumentos
+
+    conteos_uso.registrar(Categorias, ['Libro_Categoria'])
+    conteos_uso.registrar(EstadoUsuarios, ['Clientes'])
+    conteos_uso.registrar(TiposDocumentos, ['Clientes_Documento', 'Empleados_Documento'])
@@ -0,0 +1,250 @@
+"""
+Cortes del libro mayor de inventario y stock a una fecha.
+
+Cada cierto intervalo (INVENTARIO_CORTE_HORAS) `flask cortes-inventario`
+registra un corte: una fila en Inventario_Cortes y, en
+Inventario_Corte_Stock, el saldo de cada (sucursal, libro, formato) que
+tuvo movimientos desde el corte anterior. El saldo se calcula sumando al
+corte anterior los movimientos del intervalo, así que cada corte solo lee
+su propio tramo de Inventarios.
+
+El stock de una clave a la fecha F es:
+
+    fila más reciente de la clave en un corte <= C   (C = último corte <= F)
+    + SUM(cantidad) de los movimientos con C < fecha_movimiento <= F
+
+La primera parte es una búsqueda por PK; la segunda recorre a lo sumo un
+intervalo del libro mayor (IX_Inventarios_conciliacion). Las claves sin
+fila en los cortes intermedios no tuvieron movimientos en ellos.
+
+`flask compactar-inventario` mueve a Inventarios_Archivo los movimientos
+hasta un corte anterior a INVENTARIO_CONSERVAR_DIAS y lo marca como
+archivado; las consultas que empiezan antes de ese corte leen también el
+archivo. Los cortes toman la fecha actual menos INVENTARIO_CORTE_MARGEN
+para no cerrar un tramo con transacciones todavía abiertas.
+"""
+from collections import defaultdict
+from datetime import datetime, time as hora, timedelta
+
+from sqlalchemy import and_, delete, func, insert, literal, select, union_all, update
+
+from app.services.ids import siguiente_id
+from app.services.inventario import FISICO, normalizar_formato
+
+INTERVALO_HORAS = 24
+MARGEN_SEGUNDOS = 300
+TAMANO_LOTE = 1000
+
+_COLUMNAS_MOVIMIENTO = ('id_inventario', 'id_libro', 'id_sucursal', 'tipo_movimiento', 'cantidad', 'stock_anterior',
+                        'stock_nuevo', 'formato', 'fecha_movimiento', 'id_empleado', 'motivo', 'observaciones',
+                        'referencia')
+
+
+def _sesion(sesion):
+    from app import db
+    return sesion or db.session
+
+
+def ultimo_corte(hasta=None, sesion=None):
+    """Corte más reciente (con fecha_corte <= hasta si se indica) o None"""
+    from models import InventarioCortes
+
+    consulta = select(InventarioCortes).order_by(InventarioCortes.fecha_corte.desc()).limit(1)
+    if hasta is not None:
+        consulta = consulta.where(InventarioCortes.fecha_corte <= hasta)
+    return _sesion(sesion).scalars(consulta).first()
+
+
+def fecha_archivada(conexion):
+    """fecha_corte del último corte archivado (lo anterior puede estar en Inventarios_Archivo) o None"""
+    from models import InventarioCortes
+
+    return conexion.execute(
+        select(func.max(InventarioCortes.fecha_corte)).where(InventarioCortes.archivado.is_(True))
+    ).scalar()
+
+
+def saldos_corte(conexion, fecha_corte, id_sucursal=None):
+    """{(id_sucursal, id_libro, formato): stock} vigente en el corte de `fecha_corte`"""
+    from models import InventarioCortes, InventarioCorteStock as CS
+
+    numeradas = (
+        select(CS.id_sucursal, CS.id_libro, CS.formato, CS.stock,
+               func.row_number().over(partition_by=(CS.id_sucursal, CS.id_libro, CS.formato),
+                                      order_by=InventarioCortes.fecha_corte.desc()).label('orden'))
+        .join(InventarioCortes, InventarioCortes.id_corte == CS.id_corte)
+        .where(InventarioCortes.fecha_corte <= fecha_corte)
+    )
+    if id_sucursal is not None:
+        numeradas = numeradas.where(CS.id_sucursal == id_sucursal)
+    numeradas = numeradas.subquery()
+    filas = conexion.execute(
+        select(numeradas.c.id_sucursal, numeradas.c.id_libro, numeradas.c.formato, numeradas.c.stock)
+        .where(numeradas.c.orden == 1)
+    )
+    return {(id_sucursal, id_libro, formato): stock for id_sucursal, id_libro, formato, stock in filas}
+
+
+def _sumas(conexion, desde, hasta, id_sucursal=None, id_libro=None, formato=None):
+    """{(id_sucursal, id_libro, formato): [suma, movimientos]} con desde < fecha_movimiento <= hasta"""
+    from models import Inventarios, InventariosArchivo
+
+    tablas = [Inventarios]
+    archivada = fecha_archivada(conexion)
+    if archivada is not None and (desde is None or desde < archivada):
+        tablas.append(InventariosArchivo)
+
+    partes = []
+    for tabla in tablas:
+        condiciones = [tabla.fecha_movimiento <= hasta]
+        if desde is not None:
+            condiciones.append(tabla.fecha_movimiento > desde)
+        if id_sucursal is not None:
+            condiciones.append(tabla.id_sucursal == id_sucursal)
+        if id_libro is not None:
+            condiciones.append(tabla.id_libro == id_libro)
+        if formato is not None:
+            condiciones.append(tabla.formato == formato)
+        partes.append(
+            select(tabla.id_sucursal, tabla.id_libro, tabla.formato,
+                   func.sum(tabla.cantidad).label('cantidad'), func.count().label('movimientos'))
+            .where(*condiciones).group_by(tabla.id_sucursal, tabla.id_libro, tabla.formato)
+        )
+
+    sumas = defaultdict(lambda: [0, 0])
+    for id_suc, id_lib, fmt, cantidad, movimientos in conexion.execute(
+            partes[0] if len(partes) == 1 else union_all(*partes)):
+        suma = sumas[(id_suc, id_lib, fmt)]
+        suma[0] += cantidad
+        suma[1] += movimientos
+    return sumas
+
+
+def stock_a_fecha(id_libro, id_sucursal, fecha, formato=FISICO, sesion=None):
+    """Stock de la clave al final de `fecha` (último corte anterior + movimientos desde ese corte)"""
+    from models import InventarioCortes, InventarioCorteStock as CS
+
+    sesion = _sesion(sesion)
+    formato = normalizar_formato(formato)
+    corte = ultimo_corte(fecha, sesion)
+    base, desde = 0, None
+    if corte is not None:
+        desde = corte.fecha_corte
+        base = sesion.execute(
+            select(CS.stock).join(InventarioCortes, InventarioCortes.id_corte == CS.id_corte)
+            .where(CS.id_sucursal == id_sucursal, CS.id_libro == id_libro, CS.formato == formato,
+                   InventarioCortes.fecha_corte <= desde)
+            .order_by(InventarioCortes.fecha_corte.desc()).limit(1)
+        ).scalar() or 0
+    suma = _sumas(sesion, desde, fecha, id_sucursal, id_libro, formato).get((id_sucursal, id_libro, formato))
+    return base + (suma[0] if suma else 0)
+
+
+def stock_sucursal_a_fecha(id_sucursal, fecha, sesion=None):
+    """{(id_libro, formato): stock} de la sucursal a `fecha` (claves con algún movimiento hasta entonces)"""
+    sesion = _sesion(sesion)
+    corte = ultimo_corte(fecha, sesion)
+    saldos = saldos_corte(sesion, corte.fecha_corte, id_sucursal) if corte is not None else {}
+    for clave, (cantidad, _) in _sumas(sesion, corte.fecha_corte if corte else None, fecha, id_sucursal).items():
+        saldos[clave] = saldos.get(clave, 0) + cantidad
+    return {(id_libro, formato): stock for (_, id_libro, formato), stock in sorted(saldos.items())}
+
+
+def _registrar_corte(sesion, fecha_corte, anterior, saldos):
+    """Guardar el corte de `fecha_corte` a partir de `saldos` (los del corte anterior; se actualizan)"""
+    from models import InventarioCortes, InventarioCorteStock
+
+    sumas = _sumas(sesion, anterior.fecha_corte if anterior else None, fecha_corte)
+    corte = InventarioCortes(
+        id_corte=siguiente_id(InventarioCortes), fecha_corte=fecha_corte, fecha_creacion=datetime.now(),
+        movimientos=sum(n for _, n in sumas.values()), claves=len(sumas), archivado=False,
+    )
+    sesion.add(corte)
+    sesion.flush()
+
+    filas = []
+    for clave, (cantidad, _) in sumas.items():
+        saldos[clave] = saldos.get(clave, 0) + cantidad
+        id_sucursal, id_libro, formato = clave
+        filas.append({'id_corte': corte.id_corte, 'id_sucursal': id_sucursal, 'id_libro': id_libro,
+                      'formato': formato, 'stock': saldos[clave]})
+    for i in range(0, len(filas), TAMANO_LOTE):
+        sesion.execute(insert(InventarioCorteStock), filas[i:i + TAMANO_LOTE])
+    sesion.commit()
+    return corte
+
+
+def tomar_corte(fecha_corte, sesion=None):
+    """Registrar un corte en `fecha_corte` (posterior al último) y confirmarlo"""
+    sesion = _sesion(sesion)
+    anterior = ultimo_corte(sesion=sesion)
+    if anterior is not None and fecha_corte <= anterior.fecha_corte:
+        raise ValueError(f'Ya existe un corte en {anterior.fecha_corte:%Y-%m-%d %H:%M}, posterior a {fecha_corte}')
+    saldos = saldos_corte(sesion, anterior.fecha_corte) if anterior is not None else {}
+    return _registrar_corte(sesion, fecha_corte, anterior, saldos)
+
+
+def tomar_cortes_pendientes(intervalo_horas=INTERVALO_HORAS, margen_segundos=MARGEN_SEGUNDOS, ahora=None,
+                            sesion=None):
+    """
+    Registrar todos los cortes vencidos: cada `intervalo_horas` desde el
+    último (o desde la medianoche del primer movimiento) hasta ahora menos el
+    margen. La primera ejecución completa la historia.
+    """
+    from models import Inventarios
+
+    sesion = _sesion(sesion)
+    intervalo = timedelta(hours=intervalo_horas)
+    limite = (ahora or datetime.now()) - timedelta(seconds=margen_segundos)
+    anterior = ultimo_corte(sesion=sesion)
+    if anterior is not None:
+        siguiente = anterior.fecha_corte + intervalo
+        saldos = saldos_corte(sesion, anterior.fecha_corte)
+    else:
+        primero = sesion.execute(select(func.min(Inventarios.fecha_movimiento))).scalar()
+        if primero is None:
+            return []
+        siguiente = datetime.combine(primero.date(), hora()) + intervalo
+        saldos = {}
+
+    cortes = []
+    while siguiente <= limite:
+        anterior = _registrar_corte(sesion, siguiente, anterior, saldos)
+        cortes.append(anterior)
+        siguiente += intervalo
+    return cortes
+
+
+def compactar(antes_de, tamano_lote=TAMANO_LOTE, sesion=None):
+    """
+    Mover a Inventarios_Archivo los movimientos hasta el último corte
+    anterior a `antes_de`, de a `tamano_lote` por transacción. El corte se
+    marca archivado antes de mover nada, así las consultas leen ambas
+    tablas mientras dura. Devuelve (corte, movimientos archivados).
+    """
+    from models import InventarioCortes, Inventarios, InventariosArchivo
+
+    sesion = _sesion(sesion)
+    corte = ultimo_corte(antes_de, sesion)
+    if corte is None:
+        return None, 0
+    if not corte.archivado:
+        sesion.execute(update(InventarioCortes).where(InventarioCortes.id_corte == corte.id_corte)
+                       .values(archivado=True).execution_options(synchronize_session=False))
+        sesion.commit()
+
+    columnas = [getattr(Inventarios, c) for c in _COLUMNAS_MOVIMIENTO]
+    archivados = 0
+    while True:
+        ids = sesion.scalars(
+            select(Inventarios.id_inventario).where(Inventarios.fecha_movimiento <= corte.fecha_corte)
+            .order_by(Inventarios.fecha_movimiento).limit(tamano_lote)
+        ).all()
+        if not ids:
+            break
+        lote = and_(Inventarios.id_inventario.in_(ids), Inventarios.fecha_movimiento <= corte.fecha_corte)
+        sesion.execute(insert(InventariosArchivo).from_select(
+            [*_COLUMNAS_MOVIMIENTO, 'id_corte'], select(*columnas, literal(corte.id_corte)).where(lote)))
+        archivados += sesion.execute(delete(Inventarios).where(lote)).rowcount
+        sesion.commit()
+    return corte, archivados
@@ -0,0 +1,78 @@
+"""
+Verificación de dependencias antes de eliminar o desactivar.
+
+En lugar de cargar colecciones completas (len(estado.Clientes) trae todos
+los clientes del estado) se leen las relaciones uno-a-muchos del mapper y
+se arma una sola consulta con una subconsulta por llave foránea:
+
+    SELECT (SELECT COUNT(*) FROM Clientes WHERE id_estado = ?) AS Clientes, ...
+
+o, si solo importa saber si hay alguno, CASE WHEN EXISTS(...) THEN 1 ELSE 0.
+Cada subconsulta usa el índice de la FK y nada se materializa en Python.
+"""
+import threading
+
+from sqlalchemy import and_, case, exists, func, inspect, literal, select
+from sqlalchemy.orm import RelationshipDirection
+
+_referencias = {}
+_lock = threading.Lock()
+
+
+def referencias(modelo):
+    """[(relación, tabla hija, [(columna local, columna remota)])] de las relaciones uno-a-muchos"""
+    resultado = _referencias.get(modelo)
+    if resultado is None:
+        resultado = []
+        for relacion in inspect(modelo).relationships:
+            if relacion.direction is not RelationshipDirection.ONETOMANY or relacion.viewonly:
+                continue
+            resultado.append((relacion.key, relacion.mapper.local_table, list(relacion.local_remote_pairs)))
+        with _lock:
+            _referencias[modelo] = resultado
+    return resultado
+
+
+def _valores(objeto, pares):
+    mapper = inspect(objeto).mapper
+    return [(getattr(objeto, mapper.get_property_by_column(local).key), remota) for local, remota in pares]
+
+
+def dependencias(objeto, relaciones=None, contar=True):
+    """
+    {relación: cantidad} de registros que referencian a `objeto`, en una
+    consulta. Con contar=False cada valor es 0/1 (EXISTS, se detiene en la
+    primera fila). `relaciones` limita la verificación a esas claves.
+    """
+    from app import db
+
+    columnas = []
+    for nombre, tabla, pares in referencias(type(objeto)):
+        if relaciones is not None and nombre not in relaciones:
+            continue
+        condicion = and_(*(remota == valor for valor, remota in _valores(objeto, pares)))
+        if contar:
+            columna = select(func.count()).select_from(tabla).where(condicion).scalar_subquery()
+        else:
+            columna = case((exists().select_from(tabla).where(condicion), literal(1)), else_=literal(0))
+        columnas.append(columna.label(nombre))
+
+    if not columnas:
+        return {}
+    fila = db.session.execute(select(*columnas)).one()
+    return dict(fila._mapping)
+
+
+def tiene_dependencias(objeto, relaciones=None):
+    """¿Algún registro referencia a `objeto`? (una consulta con EXISTS)"""
+    return any(dependencias(objeto, relaciones, contar=False).values())
+
+
+def describir(conteos, nombres=None):
+    """'3 cliente(s) y 1 empleado(s)' a partir de {relación: cantidad}; omite los ceros"""
+    nombres = nombres or {}
+    partes = [f'{cantidad} {nombres.get(relacion, relacion.replace("_", " "))}'
+              for relacion, cantidad in conteos.items() if cantidad]
+    if len(partes) > 1:
+        return ', '.join(partes[:-1]) + ' y ' + partes[-1]
+    return ''.join(partes)
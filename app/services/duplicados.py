@@ -0,0 +1,329 @@
+"""
+Detección de posibles duplicados de Autores y Clientes.
+
+Cada worker mantiene en memoria, por entidad:
+- una clave de bloque exacta (nombre completo sin tildes, en minúsculas y
+  con las palabras ordenadas): "García Márquez Gabriel" y "gabriel garcia
+  marquez" caen en el mismo bloque;
+- un índice invertido de trigramas de caracteres para encontrar variantes
+  con errores de tipeo ("Garcia Marques").
+
+Una búsqueda solo recorre las listas de los trigramas menos frecuentes del
+texto (filtro por prefijo: un registro con similitud >= umbral comparte al
+menos uno de ellos) y verifica esos candidatos con el coeficiente de Dice,
+así que responde en menos de un milisegundo con miles de registros y en
+alrededor de uno con decenas de miles. El índice se reconstruye en segundo
+plano cada DUPLICADOS_TTL segundos y las vistas de este worker lo
+actualizan al crear, editar o eliminar.
+"""
+import math
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from itertools import chain
+
+UMBRAL = 0.75
+MAX_SUGERENCIAS = 5
+# Trigramas en común que debe tener un candidato dentro de los prefijos
+COMUNES = 4
+
+
+def plegar(texto):
+    """Minúsculas, sin tildes ni signos y con espacios simples"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in sin_tildes.lower()).split())
+
+
+def trigramas(texto_plegado):
+    """Trigramas de cada palabra con relleno (' ga', 'gar', ..., 'ia ')"""
+    resultado = set()
+    for palabra in texto_plegado.split():
+        palabra = f' {palabra} '
+        resultado.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return frozenset(resultado)
+
+
+def clave_bloque(texto_plegado):
+    return ' '.join(sorted(texto_plegado.split()))
+
+
+class IndiceDuplicados:
+    """
+    Clave de bloque + índice invertido de trigramas de una entidad.
+
+    Los trigramas de cada registro se ordenan de menos a más frecuente (orden
+    fijado al construir; los que no existían entonces van primero) y solo se
+    indexa el prefijo: dos textos con Dice >= umbral comparten al menos
+    COMUNES trigramas de sus prefijos, así que las listas quedan cortas, los
+    trigramas comunes ("ez ", " ma") no se recorren y solo se verifican los
+    registros que aparecen COMUNES veces al contar.
+    """
+
+    def __init__(self, umbral=UMBRAL, frecuencias=None):
+        self.umbral = umbral
+        self.jaccard = umbral / (2 - umbral)    # Dice >= u  <=>  Jaccard >= u / (2 - u)
+        self.frecuencias = frecuencias or {}
+        self.registros = {}                 # id -> (texto, trigramas, clave, extra, prefijo)
+        self.bloques = defaultdict(set)     # clave -> {id}
+        self.extras = defaultdict(set)      # clave secundaria (ej. teléfono) -> {id}
+        self.postings = defaultdict(set)    # trigrama del prefijo -> {id}
+
+    @classmethod
+    def desde(cls, filas, umbral=UMBRAL):
+        """Índice a partir de [(id, texto, extra)] con el orden de trigramas por frecuencia"""
+        filas = [(id_registro, texto, extra, trigramas(plegar(texto))) for id_registro, texto, extra in filas]
+        frecuencias = defaultdict(int)
+        for *_, grams in filas:
+            for g in grams:
+                frecuencias[g] += 1
+        indice = cls(umbral, dict(frecuencias))
+        for id_registro, texto, extra, _ in filas:
+            indice.agregar(id_registro, texto, extra)
+        return indice
+
+    def _prefijo(self, grams):
+        ordenados = sorted(grams, key=lambda g: (self.frecuencias.get(g, 0), g))
+        return ordenados[:len(ordenados) - math.ceil(self.jaccard * len(ordenados) - 1e-9) + COMUNES]
+
+    def agregar(self, id_registro, texto, extra=None):
+        self.quitar(id_registro)
+        plegado = plegar(texto)
+        grams = trigramas(plegado)
+        clave = clave_bloque(plegado)
+        prefijo = self._prefijo(grams)
+        self.registros[id_registro] = (texto, grams, clave, extra, prefijo)
+        self.bloques[clave].add(id_registro)
+        if extra:
+            self.extras[extra].add(id_registro)
+        for g in prefijo:
+            self.postings[g].add(id_registro)
+
+    def quitar(self, id_registro):
+        anterior = self.registros.pop(id_registro, None)
+        if anterior is None:
+            return
+        _, _, clave, extra, prefijo = anterior
+        self.bloques[clave].discard(id_registro)
+        if extra:
+            self.extras[extra].discard(id_registro)
+        for g in prefijo:
+            self.postings[g].discard(id_registro)
+
+    def buscar(self, texto, extra=None, limite=MAX_SUGERENCIAS, excluir=None):
+        """[(similitud, id, texto)] ordenado de mayor a menor; 1.0 = misma clave de bloque o extra"""
+        plegado = plegar(texto)
+        grams = trigramas(plegado)
+        encontrados = {}
+        for id_registro in self.bloques.get(clave_bloque(plegado), ()):
+            encontrados[id_registro] = 1.0
+        if extra:
+            for id_registro in self.extras.get(extra, ()):
+                encontrados[id_registro] = 1.0
+
+        if grams:
+            n = len(grams)
+            minimo, maximo = self.jaccard * n, n / self.jaccard
+            requeridos = min(COMUNES, math.ceil(minimo - 1e-9))
+            postings = self.postings
+            conteo = Counter(chain.from_iterable(postings.get(g, ()) for g in self._prefijo(grams)))
+            registros, umbral = self.registros, self.umbral
+            for id_registro in [i for i, comunes in conteo.items() if comunes >= requeridos]:
+                if id_registro in encontrados:
+                    continue
+                otros = registros[id_registro][1]
+                # Filtro por longitud antes de intersecar
+                if not minimo <= len(otros) <= maximo:
+                    continue
+                similitud = 2 * len(grams & otros) / (n + len(otros))
+                if similitud >= umbral:
+                    encontrados[id_registro] = similitud
+
+        encontrados.pop(excluir, None)
+        mejores = sorted(encontrados.items(), key=lambda x: (-x[1], x[0]))[:limite]
+        return [(round(s, 3), i, self.registros[i][0]) for i, s in mejores]
+
+    def grupos(self):
+        """Grupos de ids posiblemente duplicados en todo el índice (union-find)"""
+        padre = {}
+
+        def raiz(x):
+            padre.setdefault(x, x)
+            while padre[x] != x:
+                padre[x] = padre[padre[x]]
+                x = padre[x]
+            return x
+
+        for id_registro, (texto, _, _, extra, _) in self.registros.items():
+            for _, otro, _ in self.buscar(texto, extra, limite=None, excluir=id_registro):
+                a, b = raiz(id_registro), raiz(otro)
+                if a != b:
+                    padre[max(a, b)] = min(a, b)
+
+        miembros = defaultdict(list)
+        for id_registro in padre:
+            miembros[raiz(id_registro)].append(id_registro)
+        return sorted((sorted(ids) for ids in miembros.values() if len(ids) > 1), key=lambda g: g[0])
+
+
+def _nombre_completo(nombres, apellidos):
+    return f'{nombres} {apellidos}'
+
+
+def _telefono(telefono):
+    digitos = ''.join(c for c in telefono or '' if c.isdigit())
+    return digitos[-8:] if len(digitos) >= 8 else None
+
+
+class DetectorDuplicados:
+    """
+    Índices por worker de Autores y Clientes con reconstrucción por TTL.
+
+    Pasado el TTL el índice se reconstruye en un hilo (como el filtro de
+    app/services/emails.py) y las búsquedas siguen usando el anterior hasta
+    que el nuevo se instala. Los cambios de este worker que llegan durante
+    la reconstrucción se anotan y se aplican al índice nuevo antes de
+    reemplazar la referencia. Solo la primera búsqueda de cada entidad en el
+    worker espera a que se construya.
+    """
+
+    def __init__(self, ttl=300, umbral=UMBRAL):
+        self.ttl = ttl
+        self.umbral = umbral
+        self._indices = {}      # entidad -> (construido, IndiceDuplicados)
+        self._pendientes = {}   # entidad -> cambios recibidos durante una reconstrucción en curso
+        self._lock = threading.Lock()
+        self._primera = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('DUPLICADOS_TTL', self.ttl)
+        self.umbral = app.config.get('DUPLICADOS_UMBRAL', self.umbral)
+        app.extensions['duplicados'] = self
+
+    @staticmethod
+    def construir(entidad, umbral=UMBRAL):
+        """Índice completo de la entidad ('autores' o 'clientes') leyendo solo las columnas necesarias"""
+        from sqlalchemy import select
+        from app import db
+        from models import Autores, Clientes
+
+        if entidad == 'autores':
+            consulta = select(Autores.id_autor, Autores.nombres, Autores.apellidos)
+            filas = ((id_autor, _nombre_completo(nombres, apellidos), None)
+                     for id_autor, nombres, apellidos in db.session.execute(consulta.execution_options(yield_per=5000)))
+        else:
+            consulta = select(Clientes.id_cliente, Clientes.nombres, Clientes.apellidos, Clientes.telefono)
+            filas = ((id_cliente, _nombre_completo(nombres, apellidos), _telefono(telefono))
+                     for id_cliente, nombres, apellidos, telefono in db.session.execute(consulta.execution_options(yield_per=5000)))
+        return IndiceDuplicados.desde(filas, umbral)
+
+    def _empezar(self, entidad):
+        """Lista donde anotar los cambios durante la reconstrucción; None si ya hay una en curso"""
+        with self._lock:
+            if entidad in self._pendientes:
+                return None
+            cambios = self._pendientes[entidad] = []
+            return cambios
+
+    def _instalar(self, entidad, cambios, indice):
+        """Aplicar los cambios anotados y reemplazar el índice (se descarta si se invalidó mientras tanto)"""
+        with self._lock:
+            if self._pendientes.get(entidad) is not cambios:
+                return
+            del self._pendientes[entidad]
+            for cambio in cambios:
+                cambio(indice)
+            self._indices[entidad] = (time.monotonic(), indice)
+
+    def _cancelar(self, entidad, cambios):
+        with self._lock:
+            if self._pendientes.get(entidad) is cambios:
+                del self._pendientes[entidad]
+
+    def _reconstruir_en_segundo_plano(self, entidad):
+        from flask import current_app
+
+        cambios = self._empezar(entidad)
+        if cambios is None:
+            return
+        app = current_app._get_current_object()
+
+        def tarea():
+            try:
+                with app.app_context():
+                    indice = self.construir(entidad, self.umbral)
+                self._instalar(entidad, cambios, indice)
+            except Exception as e:
+                self._cancelar(entidad, cambios)
+                print(f'Error al reconstruir el índice de duplicados de {entidad}: {e}')
+
+        threading.Thread(target=tarea, daemon=True, name=f'duplicados-{entidad}').start()
+
+    def _indice(self, entidad):
+        actual = self._indices.get(entidad)
+        if actual is not None:
+            if time.monotonic() - actual[0] > self.ttl:
+                self._reconstruir_en_segundo_plano(entidad)
+            return actual[1]
+
+        # Primera vez en este worker: no hay un índice anterior para usar mientras tanto
+        with self._primera:
+            actual = self._indices.get(entidad)
+            if actual is not None:
+                return actual[1]
+            cambios = self._empezar(entidad)
+            try:
+                indice = self.construir(entidad, self.umbral)
+            except Exception:
+                if cambios is not None:
+                    self._cancelar(entidad, cambios)
+                raise
+            if cambios is not None:
+                self._instalar(entidad, cambios, indice)
+            return indice
+
+    def _cambiar(self, entidad, cambio):
+        """Aplicar `cambio(indice)` al índice actual y anotarlo si hay una reconstrucción en curso"""
+        with self._lock:
+            if entidad in self._indices:
+                cambio(self._indices[entidad][1])
+            if entidad in self._pendientes:
+                self._pendientes[entidad].append(cambio)
+
+    def autores_similares(self, nombres, apellidos, excluir=None):
+        """[(similitud, id_autor, nombre)] de autores parecidos"""
+        indice = self._indice('autores')
+        with self._lock:
+            return indice.buscar(_nombre_completo(nombres, apellidos), excluir=excluir)
+
+    def clientes_similares(self, nombres, apellidos, telefono=None, excluir=None):
+        """[(similitud, id_cliente, nombre)] de clientes parecidos o con el mismo teléfono"""
+        indice = self._indice('clientes')
+        with self._lock:
+            return indice.buscar(_nombre_completo(nombres, apellidos), _telefono(telefono), excluir=excluir)
+
+    def registrar_autor(self, id_autor, nombres, apellidos):
+        nombre = _nombre_completo(nombres, apellidos)
+        self._cambiar('autores', lambda indice: indice.agregar(id_autor, nombre))
+
+    def registrar_cliente(self, id_cliente, nombres, apellidos, telefono=None):
+        nombre, extra = _nombre_completo(nombres, apellidos), _telefono(telefono)
+        self._cambiar('clientes', lambda indice: indice.agregar(id_cliente, nombre, extra))
+
+    def quitar(self, entidad, id_registro):
+        self._cambiar(entidad, lambda indice: indice.quitar(id_registro))
+
+    def invalidar(self, entidad):
+        """
+        Dar el índice por vencido (p. ej. tras una importación masiva): el
+        siguiente uso lo reconstruye en segundo plano. Una reconstrucción
+        que ya estaba en curso leyó datos anteriores y se descarta.
+        """
+        with self._lock:
+            self._pendientes.pop(entidad, None)
+            if entidad in self._indices:
+                self._indices[entidad] = (float('-inf'), self._indices[entidad][1])
+
+
+duplicados = DetectorDuplicados()
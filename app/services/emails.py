@@ -0,0 +1,166 @@
+"""
+Búsqueda de clientes por email.
+
+Todas las consultas usan Clientes.email_normalizado (columna calculada
+LOWER(LTRIM(RTRIM(email))) con índice único) en lugar de
+func.lower(Clientes.email), que obliga a recorrer la tabla.
+
+Para "¿este email ya está registrado?" cada worker mantiene además un
+filtro Bloom con los emails existentes: si el filtro dice que no está, no
+se consulta la base. Un falso positivo solo cuesta la consulta de siempre.
+Un email registrado por otro worker después de construir el filtro lo
+rechaza el índice único al hacer commit (IntegrityError); el filtro se
+reconstruye en segundo plano cada EMAIL_BLOOM_TTL segundos; lo que este
+worker registra mientras tanto se copia al filtro nuevo antes de usarlo.
+"""
+import hashlib
+import math
+import threading
+import time
+
+
+def normalizar_email(email):
+    """Forma canónica del email (la misma que calcula email_normalizado)"""
+    return (email or '').strip().lower()
+
+
+def buscar_cliente_por_email(email):
+    """Cliente con ese email (sin distinguir mayúsculas) o None"""
+    from app import db
+    from models import Clientes
+
+    return db.session.query(Clientes).filter(
+        Clientes.email_normalizado == normalizar_email(email)
+    ).first()
+
+
+class FiltroBloom:
+    """Conjunto probabilístico: sin falsos negativos, falsos positivos ~tasa"""
+
+    __slots__ = ('bits', 'm', 'k', 'cantidad', 'capacidad')
+
+    def __init__(self, capacidad, tasa=0.01):
+        capacidad = max(int(capacidad), 1000)
+        self.m = max(8, int(-capacidad * math.log(tasa) / (math.log(2) ** 2)))
+        self.k = max(1, round(self.m / capacidad * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.cantidad = 0
+        self.capacidad = capacidad
+
+    def _posiciones(self, valor):
+        # Doble hashing: k posiciones a partir de dos hashes de 64 bits
+        digest = hashlib.blake2b(valor.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def agregar(self, valor):
+        for p in self._posiciones(valor):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.cantidad += 1
+
+    def __contains__(self, valor):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._posiciones(valor))
+
+
+class EmailsRegistrados:
+    """Filtro Bloom por worker de Clientes.email_normalizado"""
+
+    def __init__(self, tasa=0.01, ttl=600):
+        self.tasa = tasa
+        self.ttl = ttl
+        self._filtro = None
+        self._construido = 0.0
+        self._reconstruyendo = False
+        self._recientes = None
+        self._lock = threading.Lock()
+        self.consultas = 0
+        self.evitadas = 0
+
+    def init_app(self, app):
+        self.tasa = app.config.get('EMAIL_BLOOM_TASA', self.tasa)
+        self.ttl = app.config.get('EMAIL_BLOOM_TTL', self.ttl)
+        app.extensions['emails_registrados'] = self
+
+    def _construir(self):
+        from sqlalchemy import func, select
+        from app import db
+        from models import Clientes
+
+        total = db.session.scalar(select(func.count()).select_from(Clientes)) or 0
+        # Holgura para los registros que llegan antes de la siguiente reconstrucción
+        filtro = FiltroBloom(total * 2, self.tasa)
+        for email in db.session.scalars(
+            select(Clientes.email_normalizado).execution_options(yield_per=5000)
+        ):
+            filtro.agregar(email)
+        return filtro
+
+    def _filtro_actual(self):
+        if self._filtro is None:
+            with self._lock:
+                if self._filtro is None:
+                    self._filtro = self._construir()
+                    self._construido = time.monotonic()
+        elif (time.monotonic() - self._construido > self.ttl
+              or self._filtro.cantidad > self._filtro.capacidad) and not self._reconstruyendo:
+            self._reconstruir_en_segundo_plano()
+        return self._filtro
+
+    def _reconstruir_en_segundo_plano(self):
+        from flask import current_app
+
+        with self._lock:
+            if self._reconstruyendo:
+                return
+            self._reconstruyendo = True
+            # Emails agregados después de la lectura de la tabla
+            self._recientes = []
+        app = current_app._get_current_object()
+
+        def tarea():
+            try:
+                with app.app_context():
+                    filtro = self._construir()
+                with self._lock:
+                    for email in self._recientes:
+                        filtro.agregar(email)
+                    self._filtro, self._construido = filtro, time.monotonic()
+            except Exception as e:
+                print(f'Error al reconstruir el filtro de emails: {e}')
+            finally:
+                with self._lock:
+                    self._recientes = None
+                    self._reconstruyendo = False
+
+        threading.Thread(target=tarea, daemon=True, name='emails-bloom').start()
+
+    def puede_existir(self, email):
+        """False = seguro que no está registrado; True = hay que consultar"""
+        return normalizar_email(email) in self._filtro_actual()
+
+    def existe(self, email):
+        """¿Hay un cliente con este email? Consulta la base solo si el filtro no lo descarta"""
+        from sqlalchemy import exists, select
+        from app import db
+        from models import Clientes
+
+        email = normalizar_email(email)
+        if email not in self._filtro_actual():
+            self.evitadas += 1
+            return False
+        self.consultas += 1
+        return db.session.scalar(select(exists().where(Clientes.email_normalizado == email)))
+
+    def agregar(self, email):
+        """Registrar un email recién insertado en este worker"""
+        email = normalizar_email(email)
+        with self._lock:
+            if self._filtro is not None:
+                self._filtro.agregar(email)
+            if self._recientes is not None:
+                self._recientes.append(email)
+
+
+emails_registrados = EmailsRegistrados()
@@ -0,0 +1,90 @@
+"""
+Exportación en streaming (CSV o NDJSON) de una consulta.
+
+Las filas se leen por lotes con yield_per (cursor del servidor) y se
+escriben a medida que llegan desde un generador, así la memoria del
+worker se mantiene constante sin importar el tamaño de la tabla y el
+primer byte (la cabecera) sale antes de terminar la consulta.
+"""
+import csv
+import datetime
+import decimal
+import io
+import json
+
+from flask import Response, stream_with_context
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    if isinstance(valor, decimal.Decimal):
+        return str(valor)
+    return valor
+
+
+# Tamaño aproximado de cada fragmento enviado al cliente
+TAMANO_FRAGMENTO = 64 * 1024
+
+
+def _filas_csv(filas, claves):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # BOM para que Excel detecte UTF-8 (tildes y eñes)
+    buffer.write('\ufeff')
+    writer.writerow(claves)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    for fila in filas:
+        if buffer.tell() >= TAMANO_FRAGMENTO:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        writer.writerow(['' if v is None else v for v in fila])
+    yield buffer.getvalue()
+
+
+def _filas_ndjson(filas, claves):
+    partes, tamano, primera = [], 0, True
+    for fila in filas:
+        linea = json.dumps({k: _valor_json(v) for k, v in zip(claves, fila)}, ensure_ascii=False)
+        partes.append(linea)
+        tamano += len(linea)
+        # La primera línea sale sola para que el cliente reciba datos de inmediato
+        if primera or tamano >= TAMANO_FRAGMENTO:
+            primera = False
+            yield '\n'.join(partes) + '\n'
+            partes, tamano = [], 0
+    if partes:
+        yield '\n'.join(partes) + '\n'
+
+
+def exportar_consulta(consulta, nombre, formato='csv', lote=1000):
+    """
+    Response en streaming con las filas de `consulta` (Query de columnas).
+    nombre: nombre base del archivo descargado.
+    """
+    if formato not in FORMATOS:
+        formato = 'csv'
+    claves = [c['name'] for c in consulta.column_descriptions]
+    filas = consulta.yield_per(lote)
+    generador = _filas_csv(filas, claves) if formato == 'csv' else _filas_ndjson(filas, claves)
+
+    fecha = datetime.date.today().strftime('%Y%m%d')
+    return Response(
+        stream_with_context(generador),
+        mimetype=FORMATOS[formato],
+        headers={
+            'Content-Disposition': f'attachment; filename="{nombre}_{fecha}.{formato}"',
+            # Evitar que un proxy acumule la respuesta completa antes de enviarla
+            'X-Accel-Buffering': 'no',
+        },
+    )
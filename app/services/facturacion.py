@@ -0,0 +1,304 @@
+"""
+Numeración de facturas por sucursal.
+
+Leer y actualizar Cai_Sucursales.ultimo_numero en cada venta pone a todas
+las cajas de la sucursal en fila detrás de una sola fila. En su lugar cada
+worker reserva un bloque de FACTURA_BLOQUE números del CAI vigente en una
+transacción corta (UPDATE de ultimo_numero, nunca más allá de rango_final,
+e INSERT en Facturas_Bloques con el worker como titular) y los entrega
+desde memoria, del menor al mayor.
+
+Sin huecos:
+- si la venta falla, el número vuelve a la cola del worker (devolver);
+- el titular renueva sus bloques cada FACTURA_LEASE / 3 segundos y los
+  libera al terminar el proceso;
+- un bloque cuyo titular dejó de renovar (proceso caído) lo adopta el
+  siguiente worker que necesite números: sus números sin Venta
+  (UX_Venta_numero_factura) vuelven a entregarse antes de reservar más.
+- la renovación es un compare-and-set por bloque (titular = este worker):
+  si un bloque ya no es suyo (otro lo adoptó porque este se demoró más que
+  el lease) el worker lo olvida antes de entregar otro número. Un número
+  que ya estaba en una venta en curso choca con el índice único y la venta
+  lo descarta (descartar) en lugar de devolverlo.
+Un bloque se cierra cuando todas sus ventas se confirmaron. Los números de
+un CAI vencido no se entregan; se pueden listar con numeros_sin_usar.
+"""
+import atexit
+import heapq
+import os
+import secrets
+import socket
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from app.services.ids import siguiente_id
+
+BLOQUE = 10
+LEASE = 900
+
+DatosCai = namedtuple('DatosCai', 'id_cai id_sucursal cai rtn_empresa prefijo rango_inicial rango_final '
+                                  'fecha_autorizacion fecha_limite')
+
+
+class SinNumerosDisponibles(Exception):
+    """La sucursal no tiene un CAI vigente con números disponibles"""
+
+
+class NumeroFactura(namedtuple('NumeroFactura', 'numero id_bloque cai')):
+    __slots__ = ()
+
+    @property
+    def texto(self):
+        return formatear_factura(self.cai.prefijo, self.numero)
+
+
+def formatear_factura(prefijo, numero):
+    return f'{prefijo}-{numero:08d}'
+
+
+def _numero_de_texto(texto):
+    return int(texto.rsplit('-', 1)[1])
+
+
+def numeros_usados(conexion, cai, desde, hasta):
+    """Números entre desde y hasta que ya tienen Venta"""
+    from models import Venta
+
+    filas = conexion.execute(
+        select(Venta.numero_factura).where(Venta.numero_factura.between(formatear_factura(cai.prefijo, desde),
+                                                                         formatear_factura(cai.prefijo, hasta)))
+    ).scalars()
+    return {_numero_de_texto(texto) for texto in filas}
+
+
+def _datos(fila):
+    return DatosCai(fila.id_cai, fila.id_sucursal, fila.cai, fila.rtn_empresa, fila.prefijo, fila.rango_inicial,
+                    fila.rango_final, fila.fecha_autorizacion, fila.fecha_limite)
+
+
+class NumeradorFacturas:
+
+    def __init__(self, bloque=BLOQUE, lease=LEASE):
+        self.bloque = bloque
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._reiniciar()
+        self.reservas = 0
+        self.adopciones = 0
+        self.perdidos = 0
+        self._app = None
+        atexit.register(self.liberar)
+
+    def init_app(self, app):
+        self.bloque = app.config.get('FACTURA_BLOQUE', self.bloque)
+        self.lease = app.config.get('FACTURA_LEASE', self.lease)
+        self._app = app
+        app.extensions['numeros_factura'] = self
+
+    def _reiniciar(self):
+        self._pid = os.getpid()
+        self.titular = f'{socket.gethostname()[:60]}:{self._pid}:{secrets.token_hex(4)}'
+        self._libres = {}       # id_sucursal -> heap [(numero, id_bloque)]
+        self._cais = {}         # id_cai -> DatosCai
+        self._bloques = {}      # id_bloque -> [id_cai, id_sucursal, números sin confirmar]
+        self._por_cerrar = []
+        self._renovado = time.monotonic()
+
+    # -- transacciones propias (nunca dentro de la transacción de una venta) --
+
+    def _mantenimiento(self, conn):
+        """Renovar los bloques propios y cerrar los ya confirmados"""
+        from models import FacturasBloques as B
+
+        if self._por_cerrar:
+            conn.execute(update(B).where(B.id_bloque.in_(self._por_cerrar), B.titular == self.titular)
+                         .values(cerrado=True, titular=None))
+            self._por_cerrar = []
+        if self._bloques:
+            propios = conn.execute(
+                update(B).where(B.id_bloque.in_(list(self._bloques)), B.titular == self.titular,
+                                B.cerrado.is_(False))
+                .values(fecha_renovacion=datetime.now()).returning(B.id_bloque)
+            ).scalars().all()
+            for id_bloque in self._bloques.keys() - set(propios):
+                # Lo adoptó otro worker: sus números ya no son de este
+                self._olvidar(id_bloque)
+        self._renovado = time.monotonic()
+
+    def _olvidar(self, id_bloque):
+        """Quitar el bloque y sus números libres de la memoria del worker"""
+        id_sucursal = self._bloques.pop(id_bloque)[1]
+        heap = self._libres.get(id_sucursal)
+        if heap:
+            heap[:] = [item for item in heap if item[1] != id_bloque]
+            heapq.heapify(heap)
+        self.perdidos += 1
+
+    def _registrar_bloque(self, id_bloque, cai, numeros):
+        heap = self._libres.setdefault(cai.id_sucursal, [])
+        for numero in numeros:
+            heapq.heappush(heap, (numero, id_bloque))
+        self._cais[cai.id_cai] = cai
+        self._bloques[id_bloque] = [cai.id_cai, cai.id_sucursal, len(numeros)]
+
+    def _adoptar(self, conn, id_sucursal, hoy):
+        """Tomar un bloque abandonado de la sucursal; devuelve True si aportó números"""
+        from models import CaiSucursales as Cai, FacturasBloques as B
+
+        vencido = datetime.now() - timedelta(seconds=self.lease)
+        libre = and_(B.cerrado.is_(False), or_(B.titular.is_(None), B.fecha_renovacion < vencido))
+        candidatos = conn.execute(
+            select(B.id_bloque, B.desde, B.hasta, *Cai.__table__.c)
+            .join(Cai, Cai.id_cai == B.id_cai)
+            .where(libre, Cai.id_sucursal == id_sucursal, Cai.activo.is_(True), Cai.fecha_limite >= hoy)
+            .order_by(B.desde).limit(20)
+        ).all()
+        for fila in candidatos:
+            tomado = conn.execute(update(B).where(B.id_bloque == fila.id_bloque, libre)
+                                  .values(titular=self.titular, fecha_renovacion=datetime.now())).rowcount
+            if not tomado:
+                continue
+            cai = _datos(fila)
+            usados = numeros_usados(conn, cai, fila.desde, fila.hasta)
+            numeros = [n for n in range(fila.desde, fila.hasta + 1) if n not in usados]
+            if not numeros:
+                conn.execute(update(B).where(B.id_bloque == fila.id_bloque).values(cerrado=True, titular=None))
+                continue
+            self._registrar_bloque(fila.id_bloque, cai, numeros)
+            self.adopciones += 1
+            return True
+        return False
+
+    def _reservar(self, conn, id_sucursal, hoy, id_bloque):
+        """Reservar un bloque nuevo del primer CAI vigente con números; devuelve True si lo consiguió"""
+        from models import CaiSucursales as Cai, FacturasBloques as B
+
+        cais = conn.execute(
+            select(Cai.__table__)
+            .where(Cai.id_sucursal == id_sucursal, Cai.activo.is_(True), Cai.fecha_limite >= hoy,
+                   Cai.ultimo_numero < Cai.rango_final)
+            .order_by(Cai.rango_inicial)
+        ).all()
+        for fila in cais:
+            ultimo = fila.ultimo_numero
+            while ultimo < fila.rango_final:
+                hasta = min(ultimo + self.bloque, fila.rango_final)
+                # Compare-and-set: si otro worker reservó antes, releer y repetir
+                if conn.execute(update(Cai).where(Cai.id_cai == fila.id_cai, Cai.ultimo_numero == ultimo)
+                                .values(ultimo_numero=hasta)).rowcount:
+                    ahora = datetime.now()
+                    conn.execute(B.__table__.insert().values(
+                        id_bloque=id_bloque, id_cai=fila.id_cai, desde=ultimo + 1, hasta=hasta,
+                        titular=self.titular, fecha_reserva=ahora, fecha_renovacion=ahora, cerrado=False))
+                    self._registrar_bloque(id_bloque, _datos(fila), range(ultimo + 1, hasta + 1))
+                    self.reservas += 1
+                    return True
+                ultimo = conn.execute(select(Cai.ultimo_numero).where(Cai.id_cai == fila.id_cai)).scalar()
+        return False
+
+    def _abastecer(self, id_sucursal, hoy):
+        from app import db
+        from models import FacturasBloques
+
+        id_bloque = siguiente_id(FacturasBloques)
+        with db.engine.begin() as conn:
+            self._mantenimiento(conn)
+            if self._adoptar(conn, id_sucursal, hoy) or self._reservar(conn, id_sucursal, hoy, id_bloque):
+                return
+        raise SinNumerosDisponibles(f'La sucursal {id_sucursal} no tiene un CAI vigente con números disponibles')
+
+    # -- API --
+
+    def tomar(self, id_sucursal, hoy=None):
+        """Siguiente número de factura de la sucursal (NumeroFactura); llamar fuera de la transacción de la venta"""
+        from app import db
+
+        hoy = hoy or date.today()
+        with self._lock:
+            if self._pid != os.getpid():
+                # Tras un fork los bloques son del padre
+                self._reiniciar()
+            if self._bloques and time.monotonic() - self._renovado > self.lease / 3:
+                with db.engine.begin() as conn:
+                    self._mantenimiento(conn)
+            while True:
+                heap = self._libres.get(id_sucursal)
+                while heap:
+                    numero, id_bloque = heapq.heappop(heap)
+                    cai = self._cais[self._bloques[id_bloque][0]]
+                    if cai.fecha_limite >= hoy:
+                        return NumeroFactura(numero, id_bloque, cai)
+                    # CAI vencido: el número ya no se puede emitir
+                    self._confirmado(id_bloque)
+                self._abastecer(id_sucursal, hoy)
+
+    def devolver(self, numero):
+        """La venta no se confirmó: el número se entrega de nuevo (antes que los mayores)"""
+        with self._lock:
+            if numero.id_bloque in self._bloques:
+                heapq.heappush(self._libres.setdefault(numero.cai.id_sucursal, []), (numero.numero, numero.id_bloque))
+
+    def descartar(self, numero):
+        """
+        El número ya tiene Venta (UX_Venta_numero_factura): su bloque pasó a
+        otro worker. No se devuelve y el resto del bloque se olvida; si el
+        bloque sigue a nombre de este worker, vencido el lease lo adopta otro.
+        """
+        with self._lock:
+            if numero.id_bloque in self._bloques:
+                self._olvidar(numero.id_bloque)
+
+    def confirmar(self, numero):
+        """La venta con este número se confirmó"""
+        with self._lock:
+            if numero.id_bloque in self._bloques:
+                self._confirmado(numero.id_bloque)
+
+    def _confirmado(self, id_bloque):
+        bloque = self._bloques[id_bloque]
+        bloque[2] -= 1
+        if bloque[2] == 0:
+            del self._bloques[id_bloque]
+            self._por_cerrar.append(id_bloque)
+
+    def liberar(self):
+        """Soltar los bloques propios (al terminar el proceso) para que otro worker los adopte"""
+        from models import FacturasBloques as B
+
+        with self._lock:
+            if self._app is None or self._pid != os.getpid() or not (self._bloques or self._por_cerrar):
+                return
+            try:
+                from app import db
+                with self._app.app_context(), db.engine.begin() as conn:
+                    self._mantenimiento(conn)
+                    conn.execute(update(B).where(B.titular == self.titular).values(titular=None))
+            except Exception:
+                # Sin conexión al salir: el lease vencerá y otro worker los adoptará
+                return
+            self._reiniciar()
+
+
+numeros_factura = NumeradorFacturas()
+
+
+def numeros_sin_usar(id_sucursal=None):
+    """[(DatosCai, id_bloque, titular, [números sin Venta])] de los bloques abiertos"""
+    from app import db
+    from models import CaiSucursales as Cai, FacturasBloques as B
+
+    consulta = (select(B.id_bloque, B.desde, B.hasta, B.titular, *Cai.__table__.c).join(Cai, Cai.id_cai == B.id_cai)
+                .where(B.cerrado.is_(False)).order_by(Cai.id_sucursal, B.desde))
+    if id_sucursal is not None:
+        consulta = consulta.where(Cai.id_sucursal == id_sucursal)
+    resultado = []
+    for fila in db.session.execute(consulta).all():
+        cai = _datos(fila)
+        usados = numeros_usados(db.session, cai, fila.desde, fila.hasta)
+        resultado.append((cai, fila.id_bloque, fila.titular,
+                          [n for n in range(fila.desde, fila.hasta + 1) if n not in usados]))
+    return resultado
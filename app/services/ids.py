@@ -0,0 +1,86 @@
+"""
+Asignador de IDs hi/lo.
+
+Reemplaza el patrón SELECT MAX(pk) + 1, que entrega el mismo ID a dos
+workers concurrentes. Cada worker reserva un bloque de IDs en la tabla
+Secuencias con un único UPDATE ... RETURNING (OUTPUT en MSSQL) y los
+entrega desde memoria. Los IDs no usados de un bloque se pierden (huecos),
+nunca se repiten.
+"""
+import os
+import threading
+
+from sqlalchemy import func, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+
+
+class IdAllocator:
+
+    def __init__(self, bloque=20):
+        self.bloque = bloque
+        self._rangos = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self.reservas = 0
+
+    def init_app(self, app):
+        self.bloque = app.config.get('ID_BLOQUE', self.bloque)
+        app.extensions['id_allocator'] = self
+
+    def _reservar(self, modelo, nombre, cantidad=None):
+        """Reservar un bloque en una transacción propia; devuelve (primero, limite)"""
+        from app import db
+        from models import Secuencias
+
+        cantidad = cantidad or self.bloque
+        for _ in range(2):
+            try:
+                with db.engine.begin() as conn:
+                    fila = conn.execute(
+                        update(Secuencias)
+                        .where(Secuencias.nombre == nombre)
+                        .values(siguiente=Secuencias.siguiente + cantidad)
+                        .returning(Secuencias.siguiente)
+                    ).first()
+                    if fila is not None:
+                        self.reservas += 1
+                        limite = fila[0]
+                        return limite - cantidad, limite
+
+                    # Primera vez: sembrar la secuencia a partir del MAX actual de la tabla
+                    pk = inspect(modelo).primary_key[0]
+                    ultimo = conn.execute(select(func.max(pk))).scalar() or 0
+                    conn.execute(insert(Secuencias).values(nombre=nombre, siguiente=ultimo + 1))
+            except IntegrityError:
+                # Otro worker la sembró al mismo tiempo; reintentar el UPDATE
+                continue
+        raise RuntimeError(f'No se pudo reservar un bloque de IDs para {nombre}')
+
+    def siguiente(self, modelo):
+        """Siguiente ID libre para el modelo"""
+        nombre = modelo.__tablename__
+        with self._lock:
+            if self._pid != os.getpid():
+                # Tras un fork los bloques del padre no son de este proceso
+                self._rangos.clear()
+                self._pid = os.getpid()
+            rango = self._rangos.get(nombre)
+            if rango is None or rango[0] >= rango[1]:
+                rango = self._rangos[nombre] = list(self._reservar(modelo, nombre))
+            nuevo_id = rango[0]
+            rango[0] += 1
+            return nuevo_id
+
+    def reservar_rango(self, modelo, cantidad):
+        """Reservar `cantidad` IDs consecutivos de una vez (cargas masivas)"""
+        if cantidad <= 0:
+            return range(0)
+        primero, limite = self._reservar(modelo, modelo.__tablename__, cantidad)
+        return range(primero, limite)
+
+
+id_allocator = IdAllocator()
+
+
+def siguiente_id(modelo):
+    return id_allocator.siguiente(modelo)
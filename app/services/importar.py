@@ -0,0 +1,717 @@
+"""
+Importación masiva desde CSV (Autores, Clientes) y carga del catálogo de
+Libros desde CSV o JSON.
+
+El archivo se lee en streaming y se procesa por lotes. Cada lote:
+1. Se valida con los mismos esquemas de los formularios (validar_lote)
+2. Busca duplicados en la base con una sola consulta IN
+3. Reserva todos los IDs de una vez en Secuencias
+4. (Clientes) hashea las contraseñas temporales repartidas en el pool
+5. Inserta con un solo executemany (fast_executemany en pyodbc) y commit
+
+Una fila con error no detiene la carga: queda en el reporte con su número
+de línea y los motivos.
+"""
+import csv
+import itertools
+import json
+import re
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import bindparam, event, func, insert, select, update
+
+from app.services.conteos import conteos_uso
+from app.services.duplicados import duplicados
+from app.services.validacion import ESQUEMA_AUTOR, ESQUEMA_CLIENTE
+
+TAMANO_LOTE = 500
+
+
+class ReporteImportacion:
+    """Resultado por fila de una importación"""
+
+    def __init__(self, entidad):
+        self.entidad = entidad
+        self.procesadas = 0
+        self.insertadas = 0
+        self.actualizadas = 0
+        self.relacionados = {}  # entidades creadas de paso, ej. {'autores': 3}
+        self.errores = []   # (línea, [mensajes])
+        self.creados = []   # (línea, id, descripción, contraseña temporal o None)
+        self.segundos = 0.0
+        self.limite_alcanzado = None  # línea donde se cortó por max_filas
+
+    def error(self, linea, *mensajes):
+        self.errores.append((linea, list(mensajes)))
+
+    @property
+    def filas_por_segundo(self):
+        return round(self.procesadas / self.segundos, 1) if self.segundos else 0.0
+
+    def a_dict(self):
+        return {
+            'entidad': self.entidad,
+            'procesadas': self.procesadas,
+            'insertadas': self.insertadas,
+            'actualizadas': self.actualizadas,
+            'relacionados': dict(self.relacionados),
+            'con_error': len(self.errores),
+            'segundos': round(self.segundos, 2),
+            'filas_por_segundo': self.filas_por_segundo,
+            'limite_alcanzado': self.limite_alcanzado,
+            'errores': [{'linea': linea, 'errores': mensajes} for linea, mensajes in self.errores],
+        }
+
+
+class ArchivoInvalido(Exception):
+    """El CSV no se puede procesar (encabezados faltantes, vacío)"""
+    pass
+
+
+# --- Infraestructura común -------------------------------------------------
+
+def _fast_executemany(conn, cursor, statement, parameters, context, executemany):
+    # Solo para los INSERT de importación, que lo piden por execution_options
+    if executemany and context is not None and context.execution_options.get('fast_executemany'):
+        cursor.fast_executemany = True
+
+
+def _preparar_engine(engine):
+    if engine.dialect.driver == 'pyodbc' and not event.contains(engine, 'before_cursor_execute', _fast_executemany):
+        event.listen(engine, 'before_cursor_execute', _fast_executemany)
+
+
+def _leer_csv(archivo, requeridas):
+    """Filas del CSV como (línea, dict) con encabezados en minúsculas"""
+    lector = csv.DictReader(archivo)
+    if not lector.fieldnames:
+        raise ArchivoInvalido('El archivo está vacío')
+    lector.fieldnames = [(c or '').strip().lower() for c in lector.fieldnames]
+    faltantes = [c for c in requeridas if c not in lector.fieldnames]
+    if faltantes:
+        raise ArchivoInvalido('Faltan columnas: ' + ', '.join(faltantes))
+    for fila in lector:
+        yield lector.line_num, {k: (v or '').strip() for k, v in fila.items() if k}
+
+
+def _leer_json(archivo):
+    """Filas de un arreglo JSON o de NDJSON (un objeto por línea) como (número, dict)"""
+    inicio = archivo.read(1)
+    while inicio and inicio.isspace():
+        inicio = archivo.read(1)
+    if not inicio:
+        raise ArchivoInvalido('El archivo está vacío')
+    try:
+        if inicio == '[':
+            # Arreglo: se carga completo (para feeds grandes usar NDJSON)
+            objetos = enumerate(json.loads(inicio + archivo.read()), start=1)
+        else:
+            objetos = ((n, json.loads(linea)) for n, linea in
+                       enumerate(itertools.chain([inicio + archivo.readline()], archivo), start=1)
+                       if linea.strip())
+        for numero, objeto in objetos:
+            if not isinstance(objeto, dict):
+                raise ArchivoInvalido(f'El elemento {numero} no es un objeto JSON')
+            yield numero, {str(k).strip().lower(): v.strip() if isinstance(v, str) else v
+                           for k, v in objeto.items()}
+    except json.JSONDecodeError as e:
+        raise ArchivoInvalido(f'JSON inválido: {e}')
+
+
+def _lotes(filas, tamano_lote, reporte, max_filas=None):
+    """Agrupar las filas leídas en listas de (línea, fila) de tamano_lote"""
+    lote, leidas = [], 0
+    for linea, datos in filas:
+        if not any(v not in ('', None) for v in datos.values()):
+            continue  # Líneas en blanco
+        leidas += 1
+        if max_filas and leidas > max_filas:
+            reporte.limite_alcanzado = linea
+            break
+        lote.append((linea, datos))
+        if len(lote) >= tamano_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _ejecutar(sentencias, lineas, reporte):
+    """
+    Ejecutar [(sentencia, filas)] como executemany en una sola transacción;
+    si algo falla, todas las líneas del lote quedan con error.
+    """
+    from app import db
+
+    try:
+        for sentencia, filas in sentencias:
+            if filas:
+                db.session.execute(sentencia.execution_options(fast_executemany=True), filas)
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        motivo = str(getattr(e, 'orig', None) or e)  # Sin el SQL ni los parámetros del lote
+        for linea in lineas:
+            reporte.error(linea, f'Error al guardar el lote: {motivo}')
+        return False
+
+
+def _insertar(modelo, filas, lineas, reporte):
+    """executemany del lote en una transacción; si falla, todo el lote queda con error"""
+    if _ejecutar([(insert(modelo.__table__), filas)], lineas, reporte):
+        reporte.insertadas += len(filas)
+        return True
+    return False
+
+
+# --- Autores ---------------------------------------------------------------
+
+COLUMNAS_AUTORES = ('nombres', 'apellidos', 'nacionalidad', 'fecha_nacimiento')
+
+
+def importar_autores(archivo, tamano_lote=TAMANO_LOTE, max_filas=None):
+    """
+    Importar autores desde un CSV (texto) con columnas nombres, apellidos,
+    nacionalidad, fecha_nacimiento (AAAA-MM-DD) y opcionales descripcion,
+    observaciones. Devuelve un ReporteImportacion; con max_filas se deja de
+    leer al superar esa cantidad (reporte.limite_alcanzado).
+    """
+    from app import db
+    from app.services.ids import id_allocator
+    from models import Autores
+
+    _preparar_engine(db.engine)
+    reporte = ReporteImportacion('autores')
+    inicio = time.perf_counter()
+    vistos = set()
+
+    for lote in _lotes(_leer_csv(archivo, COLUMNAS_AUTORES), tamano_lote, reporte, max_filas):
+        reporte.procesadas += len(lote)
+        validas = []
+        for (linea, fila), errores in zip(lote, ESQUEMA_AUTOR.validar_lote(fila for _, fila in lote)):
+            if errores:
+                reporte.error(linea, *errores)
+                continue
+            clave = (fila['nombres'].lower(), fila['apellidos'].lower())
+            if clave in vistos:
+                reporte.error(linea, 'Autor repetido dentro del archivo')
+                continue
+            vistos.add(clave)
+            validas.append((linea, fila, clave))
+
+        if not validas:
+            continue
+
+        # Duplicados contra la base: una consulta por lote
+        existentes = {tuple(fila) for fila in db.session.query(
+            func.lower(Autores.nombres), func.lower(Autores.apellidos)
+        ).filter(
+            func.lower(Autores.nombres).in_({clave[0] for _, _, clave in validas})
+        )}
+
+        nuevas = []
+        for linea, fila, clave in validas:
+            if clave in existentes:
+                reporte.error(linea, f'Ya existe un autor con el nombre {fila["nombres"]} {fila["apellidos"]}')
+            else:
+                nuevas.append((linea, fila))
+        if not nuevas:
+            continue
+
+        ids = id_allocator.reservar_rango(Autores, len(nuevas))
+        filas = [{
+            'id_autor': id_autor,
+            'nombres': fila['nombres'].title(),
+            'apellidos': fila['apellidos'].title(),
+            'nacionalidad': fila['nacionalidad'].title(),
+            'fecha_nacimiento': datetime.strptime(fila['fecha_nacimiento'], '%Y-%m-%d').date(),
+            'descripcion': fila.get('descripcion') or None,
+            'observaciones': fila.get('observaciones') or None,
+        } for id_autor, (linea, fila) in zip(ids, nuevas)]
+
+        if _insertar(Autores, filas, [linea for linea, _ in nuevas], reporte):
+            reporte.creados.extend(
+                (linea, f['id_autor'], f'{f["nombres"]} {f["apellidos"]}', None)
+                for (linea, _), f in zip(nuevas, filas)
+            )
+
+    if reporte.insertadas:
+        duplicados.invalidar('autores')
+    reporte.errores.sort()
+    reporte.segundos = time.perf_counter() - inicio
+    return reporte
+
+
+# --- Clientes --------------------------------------------------------------
+
+COLUMNAS_CLIENTES = ('nombres', 'apellidos', 'email')
+
+
+def importar_clientes(archivo, tamano_lote=TAMANO_LOTE, hasher=None, max_filas=None):
+    """
+    Importar clientes desde un CSV (texto) con columnas nombres, apellidos,
+    email y opcionales telefono, direccion, observaciones, tipo_usuario,
+    id_estado. Cada cliente recibe una contraseña temporal que queda en
+    reporte.creados para entregarla al usuario. Si el servicio de
+    contraseñas está ocupado, las filas de ese lote quedan con error y se
+    sigue con el siguiente (nunca se pierde el reporte de lo ya guardado).
+    hasher: PasswordHasher a usar (el CLI puede pasar uno con más procesos).
+    """
+    from app import db
+    from app.services.catalogos import catalogos
+    from app.services.emails import emails_registrados, normalizar_email
+    from app.services.ids import id_allocator
+    from app.services.passwords import PasswordServiceBusy, password_service, generar_password_temporal, _get_pepper
+    from models import Clientes
+
+    _preparar_engine(db.engine)
+    hasher = hasher or password_service
+    pepper = _get_pepper()
+    estados = catalogos.dict('EstadoUsuarios')
+    reporte = ReporteImportacion('clientes')
+    inicio = time.perf_counter()
+    vistos = set()
+
+    for lote in _lotes(_leer_csv(archivo, COLUMNAS_CLIENTES), tamano_lote, reporte, max_filas):
+        reporte.procesadas += len(lote)
+        validas = []
+        for linea, fila in lote:
+            fila['email'] = normalizar_email(fila.get('email'))
+        for (linea, fila), errores in zip(lote, ESQUEMA_CLIENTE.validar_lote(fila for _, fila in lote)):
+            tipo = fila.get('tipo_usuario') or 'cliente'
+            if tipo not in ('cliente', 'admin'):
+                errores.append('tipo_usuario debe ser "cliente" o "admin"')
+            try:
+                id_estado = int(fila.get('id_estado') or 1)
+                if id_estado not in estados:
+                    errores.append(f'El estado {id_estado} no existe')
+            except ValueError:
+                errores.append('id_estado debe ser un número')
+            if errores:
+                reporte.error(linea, *errores)
+                continue
+            if fila['email'] in vistos:
+                reporte.error(linea, 'Email repetido dentro del archivo')
+                continue
+            vistos.add(fila['email'])
+            fila['tipo_usuario'], fila['id_estado'] = tipo, id_estado
+            validas.append((linea, fila))
+
+        if not validas:
+            continue
+
+        # Duplicados contra la base: una consulta por lote, solo con los
+        # emails que el filtro Bloom no descarta
+        posibles = [fila['email'] for _, fila in validas if emails_registrados.puede_existir(fila['email'])]
+        existentes = set(db.session.scalars(
+            select(Clientes.email_normalizado).where(Clientes.email_normalizado.in_(posibles))
+        )) if posibles else set()
+        nuevas = []
+        for linea, fila in validas:
+            if fila['email'] in existentes:
+                reporte.error(linea, 'Este email ya está registrado')
+            else:
+                nuevas.append((linea, fila))
+        if not nuevas:
+            continue
+
+        temporales = [generar_password_temporal() for _ in nuevas]
+        try:
+            hashes = hasher.hash_lote(temporales, pepper)
+        except PasswordServiceBusy:
+            # Los lotes anteriores ya se guardaron: el reporte debe llegar
+            # con sus contraseñas, así que solo este lote queda con error
+            for linea, _ in nuevas:
+                reporte.error(linea, 'El servicio de contraseñas está ocupado; vuelve a importar esta fila')
+            continue
+        ids = id_allocator.reservar_rango(Clientes, len(nuevas))
+        ahora = datetime.now()
+        filas = [{
+            'id_cliente': id_cliente,
+            'nombres': fila['nombres'].title(),
+            'apellidos': fila['apellidos'].title(),
+            'email': fila['email'],
+            'password_hash': password_hash,
+            'telefono': fila.get('telefono') or 'No especificado',
+            'direccion': fila.get('direccion') or 'No especificada',
+            'tipo_usuario': fila['tipo_usuario'],
+            'fecha_registro': ahora,
+            'ot': 0,
+            'id_estado': fila['id_estado'],
+            'observaciones': fila.get('observaciones') or None,
+        } for id_cliente, password_hash, (linea, fila) in zip(ids, hashes, nuevas)]
+
+        if _insertar(Clientes, filas, [linea for linea, _ in nuevas], reporte):
+            for f in filas:
+                emails_registrados.agregar(f['email'])
+            reporte.creados.extend(
+                (linea, f['id_cliente'], f['email'], temporal)
+                for (linea, _), f, temporal in zip(nuevas, filas, temporales)
+            )
+
+    if reporte.insertadas:
+        duplicados.invalidar('clientes')
+        conteos_uso.invalidar('EstadoUsuarios')
+    reporte.errores.sort()
+    reporte.segundos = time.perf_counter() - inicio
+    return reporte
+
+
+# --- Catálogo de Libros ----------------------------------------------------
+
+COLUMNAS_LIBROS = ('isbn', 'titulo', 'formato', 'num_pag', 'precio_venta')
+SEPARADOR_LISTA = ';'
+
+
+def normalizar_isbn(valor):
+    """ISBN-10 o ISBN-13 sin guiones ni espacios; None si el dígito verificador no cuadra"""
+    isbn = re.sub(r'[\s-]', '', str(valor or '')).upper()
+    if re.fullmatch(r'\d{13}', isbn):
+        suma = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(isbn[:12]))
+        return isbn if (10 - suma % 10) % 10 == int(isbn[12]) else None
+    if re.fullmatch(r'\d{9}[\dX]', isbn):
+        suma = sum((10 - i) * (10 if d == 'X' else int(d)) for i, d in enumerate(isbn))
+        return isbn if suma % 11 == 0 else None
+    return None
+
+
+def _lista(valor):
+    """Celda multivalor: lista JSON o texto separado por ';'"""
+    if isinstance(valor, list):
+        return [v for v in valor if v not in ('', None)]
+    return [v.strip() for v in str(valor or '').split(SEPARADOR_LISTA) if v.strip()]
+
+
+def _nombre_autor(valor):
+    """'Apellidos, Nombres' | 'Nombres Apellidos' | {'nombres', 'apellidos', ...} -> dict"""
+    if isinstance(valor, dict):
+        datos = {k: str(v).strip() for k, v in valor.items() if v not in ('', None)}
+    elif ',' in valor:
+        apellidos, nombres = valor.split(',', 1)
+        datos = {'nombres': nombres.strip(), 'apellidos': apellidos.strip()}
+    else:
+        partes = valor.split(None, 1)
+        datos = {'nombres': partes[0], 'apellidos': partes[1] if len(partes) > 1 else ''}
+    if not datos.get('nombres') or not datos.get('apellidos'):
+        return None
+    datos['nombres'] = ' '.join(datos['nombres'].split()).title()
+    datos['apellidos'] = ' '.join(datos['apellidos'].split()).title()
+    return datos
+
+
+def _decimal(valor, campo, errores, obligatorio=True):
+    if valor in ('', None):
+        if obligatorio:
+            errores.append(f'{campo} es obligatorio')
+        return Decimal('0')
+    try:
+        numero = Decimal(str(valor).replace(',', ''))
+    except InvalidOperation:
+        errores.append(f'{campo} debe ser un número')
+        return None
+    if not numero.is_finite():
+        # Decimal acepta NaN, sNaN e Infinity; compararlos o redondearlos falla
+        errores.append(f'{campo} debe ser un número')
+        return None
+    if numero < 0 or numero >= Decimal('1000000'):
+        errores.append(f'{campo} debe estar entre 0 y 999,999.99')
+        return None
+    return numero.quantize(Decimal('0.01'))
+
+
+def _entero(valor, campo, errores, minimo=0, defecto=None):
+    if valor in ('', None) and defecto is not None:
+        return defecto
+    try:
+        numero = int(str(valor))
+    except ValueError:
+        errores.append(f'{campo} debe ser un número entero')
+        return None
+    if numero < minimo:
+        errores.append(f'{campo} debe ser mayor o igual a {minimo}')
+    return numero
+
+
+class _Mapas:
+    """
+    Búsqueda en memoria de autores, categorías, editoriales y países por
+    nombre (en minúsculas). Se carga una vez por importación; lo creado en un
+    lote se agrega al mapa y se quita si ese lote hace rollback.
+    """
+
+    def __init__(self, pais_defecto=None):
+        from app import db
+        from models import Autores, Categorias, Editoriales, Pais
+
+        self.autores = {(n.lower(), a.lower()): i for i, n, a in db.session.execute(
+            select(Autores.id_autor, Autores.nombres, Autores.apellidos))}
+        self.categorias = {n.lower(): i for i, n in db.session.execute(
+            select(Categorias.id_categoria, Categorias.nombre))}
+        self.editoriales = {n.lower(): i for i, n in db.session.execute(
+            select(Editoriales.id_editorial, Editoriales.nombre))}
+        self.paises = {}
+        for i, nombre, iso in db.session.execute(select(Pais.id_pais, Pais.nombre_pais, Pais.codigo_iso)):
+            self.paises[nombre.strip().lower()] = i
+            self.paises[iso.strip().lower()] = i
+        self.pais_defecto = None
+        if pais_defecto:
+            self.pais_defecto = self.paises.get(pais_defecto.strip().lower())
+            if self.pais_defecto is None:
+                raise ArchivoInvalido(f'El país {pais_defecto} no existe')
+        # Pendientes del lote en curso: {mapa: {clave: fila a insertar}}
+        self.nuevos = {'autores': {}, 'categorias': {}, 'editoriales': {}}
+
+    def descartar_lote(self):
+        for nombre, pendientes in self.nuevos.items():
+            mapa = getattr(self, nombre)
+            for clave in pendientes:
+                mapa.pop(clave, None)
+            pendientes.clear()
+
+    def confirmar_lote(self, reporte):
+        for nombre, pendientes in self.nuevos.items():
+            if pendientes:
+                reporte.relacionados[nombre] = reporte.relacionados.get(nombre, 0) + len(pendientes)
+            pendientes.clear()
+
+
+def _resolver_libro(fila, mapas, errores):
+    """Claves de autores, categorías y editoriales de la fila; registra las que hay que crear"""
+    claves = {'autores': [], 'categorias': [], 'editoriales': []}
+    pendientes = {'autores': {}, 'categorias': {}, 'editoriales': {}}
+
+    for valor in _lista(fila.get('autores')):
+        datos = _nombre_autor(valor)
+        if datos is None:
+            errores.append(f'Autor inválido: {valor} (usar "Apellidos, Nombres")')
+            continue
+        clave = (datos['nombres'].lower(), datos['apellidos'].lower())
+        if clave not in mapas.autores:
+            pendientes['autores'][clave] = datos
+        claves['autores'].append(clave)
+
+    for nombre in _lista(fila.get('categorias')):
+        nombre = ' '.join(str(nombre).split())
+        if len(nombre) > 100:
+            errores.append(f'Categoría demasiado larga: {nombre[:30]}...')
+            continue
+        clave = nombre.lower()
+        if clave not in mapas.categorias:
+            pendientes['categorias'][clave] = {'nombre': nombre}
+        claves['categorias'].append(clave)
+
+    pais = fila.get('editorial_pais')
+    for nombre in _lista(fila.get('editoriales') or fila.get('editorial')):
+        nombre = ' '.join(str(nombre).split())
+        if len(nombre) > 150:
+            errores.append(f'Editorial demasiado larga: {nombre[:30]}...')
+            continue
+        clave = nombre.lower()
+        if clave not in mapas.editoriales:
+            id_pais = mapas.paises.get(str(pais).strip().lower()) if pais else mapas.pais_defecto
+            if id_pais is None:
+                errores.append(f'El país {pais} no existe' if pais else
+                               f'La editorial {nombre} no existe; indica editorial_pais para crearla')
+                continue
+            pendientes['editoriales'][clave] = {'nombre': nombre, 'id_pais': id_pais}
+        claves['editoriales'].append(clave)
+
+    if not errores:
+        # Solo las filas válidas agregan entidades nuevas al lote
+        for nombre, nuevos in pendientes.items():
+            mapa = getattr(mapas, nombre)
+            for clave, datos in nuevos.items():
+                mapa[clave] = None
+                mapas.nuevos[nombre][clave] = datos
+    return claves
+
+
+def importar_libros(archivo, formato='csv', tamano_lote=TAMANO_LOTE, pais_defecto=None, max_filas=None):
+    """
+    Cargar el catálogo de Libros desde CSV o JSON/NDJSON, con el ISBN como clave.
+
+    Columnas: isbn, titulo, formato, num_pag, precio_venta y opcionales
+    precio_prestamo, stock_fisico, stock_digital, descripcion, portada,
+    observaciones, autores ("Apellidos, Nombres" separados por ';'),
+    categorias, editorial(es) y editorial_pais.
+
+    - Un ISBN nuevo se inserta; uno existente se actualiza (sin tocar el stock).
+    - Autores, categorías y editoriales se buscan por nombre en mapas en
+      memoria y se crean si no existen (las editoriales necesitan país:
+      editorial_pais o pais_defecto).
+    - Los vínculos Libro_Autores / Libro_Categoria / Libro_Editoriales que
+      falten se agregan; los existentes no se borran.
+    Cada lote va en su propia transacción con un executemany por tabla.
+    """
+    from app import db
+    from app.services.ids import id_allocator
+    from models import (Autores, Categorias, Editoriales, Libros,
+                        LibroAutores, LibroCategoria, LibroEditoriales)
+
+    if formato == 'csv':
+        filas = _leer_csv(archivo, COLUMNAS_LIBROS)
+    elif formato == 'json':
+        filas = _leer_json(archivo)
+    else:
+        raise ArchivoInvalido(f'Formato no soportado: {formato}')
+
+    _preparar_engine(db.engine)
+    reporte = ReporteImportacion('libros')
+    inicio = time.perf_counter()
+    mapas = _Mapas(pais_defecto)
+    vistos = set()
+    libros = Libros.__table__
+    actualizar = update(libros).where(libros.c.id_libro == bindparam('b_id_libro'))
+
+    for lote in _lotes(filas, tamano_lote, reporte, max_filas):
+        reporte.procesadas += len(lote)
+        validas = []
+        for linea, fila in lote:
+            errores = [f'{c} es obligatorio' for c in COLUMNAS_LIBROS if fila.get(c) in ('', None)]
+            isbn = normalizar_isbn(fila.get('isbn'))
+            if fila.get('isbn') and isbn is None:
+                errores.append(f'ISBN inválido: {fila.get("isbn")}')
+            titulo = ' '.join(str(fila.get('titulo') or '').split())
+            if len(titulo) > 255:
+                errores.append('El título no puede exceder 255 caracteres')
+            formato_libro = str(fila.get('formato') or '').strip()
+            if len(formato_libro) > 50:
+                errores.append('El formato no puede exceder 50 caracteres')
+            portada = str(fila.get('portada') or '').strip() or None
+            if portada and len(portada) > 255:
+                errores.append('La portada no puede exceder 255 caracteres')
+            datos = {
+                'isbn': isbn,
+                'titulo': titulo,
+                'formato': formato_libro,
+                'num_pag': _entero(fila.get('num_pag'), 'num_pag', errores, minimo=1),
+                'precio_venta': _decimal(fila.get('precio_venta'), 'precio_venta', errores),
+                'precio_prestamo': _decimal(fila.get('precio_prestamo'), 'precio_prestamo', errores, obligatorio=False),
+                'descripcion': fila.get('descripcion') or None,
+                'observaciones': fila.get('observaciones') or None,
+                'portada': portada,
+            }
+            stock = {
+                'stock_fisico': _entero(fila.get('stock_fisico'), 'stock_fisico', errores, defecto=0),
+                'stock_digital': _entero(fila.get('stock_digital'), 'stock_digital', errores, defecto=0),
+            }
+            if errores:
+                reporte.error(linea, *errores)
+                continue
+            if isbn in vistos:
+                reporte.error(linea, f'ISBN {isbn} repetido dentro del archivo')
+                continue
+            claves_libro = _resolver_libro(fila, mapas, errores)
+            if errores:
+                reporte.error(linea, *errores)
+                continue
+            vistos.add(isbn)
+            validas.append((linea, datos, stock, claves_libro))
+
+        if not validas:
+            mapas.descartar_lote()
+            continue
+
+        # Libros existentes del lote: una consulta IN por ISBN
+        existentes = {}
+        for id_libro, isbn in db.session.execute(
+            select(Libros.id_libro, Libros.isbn)
+            .where(Libros.isbn.in_([datos['isbn'] for _, datos, _, _ in validas]))
+            .order_by(Libros.id_libro)
+        ):
+            existentes.setdefault(isbn, id_libro)
+
+        # Vínculos que ya tienen los libros existentes
+        vinculos = {'autores': set(), 'categorias': set(), 'editoriales': set()}
+        if existentes:
+            ids_existentes = list(existentes.values())
+            for nombre, modelo, columna in (('autores', LibroAutores, LibroAutores.id_autor),
+                                            ('categorias', LibroCategoria, LibroCategoria.id_categoria),
+                                            ('editoriales', LibroEditoriales, LibroEditoriales.id_editorial)):
+                vinculos[nombre] = set(db.session.execute(
+                    select(modelo.id_libro, columna).where(modelo.id_libro.in_(ids_existentes))
+                ).tuples())
+
+        # Reservar todos los IDs antes de escribir
+        nuevos = mapas.nuevos
+        for nombre, modelo in (('autores', Autores), ('categorias', Categorias), ('editoriales', Editoriales)):
+            for clave, id_nuevo in zip(nuevos[nombre], id_allocator.reservar_rango(modelo, len(nuevos[nombre]))):
+                getattr(mapas, nombre)[clave] = id_nuevo
+        isbn_nuevos = [datos['isbn'] for _, datos, _, _ in validas if datos['isbn'] not in existentes]
+        existentes.update(zip(isbn_nuevos, id_allocator.reservar_rango(Libros, len(isbn_nuevos))))
+        isbn_nuevos = set(isbn_nuevos)
+
+        filas_libros, filas_actualizar, creados = [], [], []
+        links = {'autores': [], 'categorias': [], 'editoriales': []}
+        for linea, datos, stock, claves_libro in validas:
+            id_libro = existentes[datos['isbn']]
+            if datos['isbn'] in isbn_nuevos:
+                filas_libros.append({'id_libro': id_libro, **datos, **stock, 'disp_venta': 1, 'disp_prestamo': 1})
+                creados.append((linea, id_libro, f'{datos["isbn"]} {datos["titulo"]}', None))
+            else:
+                filas_actualizar.append({'b_id_libro': id_libro, **datos})
+            for nombre, claves in claves_libro.items():
+                for clave in dict.fromkeys(claves):
+                    par = (id_libro, getattr(mapas, nombre)[clave])
+                    if par not in vinculos[nombre]:
+                        vinculos[nombre].add(par)
+                        links[nombre].append(par)
+
+        id_links = {nombre: iter(id_allocator.reservar_rango(modelo, len(links[nombre])))
+                    for nombre, modelo in (('autores', LibroAutores), ('categorias', LibroCategoria),
+                                           ('editoriales', LibroEditoriales))}
+        sentencias = [
+            (insert(Autores.__table__), [
+                {'id_autor': mapas.autores[clave], 'nombres': d['nombres'], 'apellidos': d['apellidos'],
+                 'nacionalidad': (d.get('nacionalidad') or 'No especificada').title(),
+                 'fecha_nacimiento': _fecha_autor(d.get('fecha_nacimiento')),
+                 'observaciones': 'Creado por la carga del catálogo de libros'}
+                for clave, d in nuevos['autores'].items()]),
+            (insert(Categorias.__table__), [
+                {'id_categoria': mapas.categorias[clave], 'nombre': d['nombre'],
+                 'descripcion': 'Creada por la carga del catálogo de libros'}
+                for clave, d in nuevos['categorias'].items()]),
+            (insert(Editoriales.__table__), [
+                {'id_editorial': mapas.editoriales[clave], 'nombre': d['nombre'], 'id_pais': d['id_pais'],
+                 'telefono': 'No especificado', 'email': 'No especificado'}
+                for clave, d in nuevos['editoriales'].items()]),
+            (insert(libros), filas_libros),
+            (actualizar, filas_actualizar),
+            (insert(LibroAutores.__table__), [
+                {'id_libro_autor': next(id_links['autores']), 'id_libro': l, 'id_autor': a}
+                for l, a in links['autores']]),
+            (insert(LibroCategoria.__table__), [
+                {'id_libro_categoria': next(id_links['categorias']), 'id_libro': l, 'id_categoria': c}
+                for l, c in links['categorias']]),
+            (insert(LibroEditoriales.__table__), [
+                {'id_libros_editoriales': next(id_links['editoriales']), 'id_libro': l, 'id_editorial': e}
+                for l, e in links['editoriales']]),
+        ]
+        if _ejecutar(sentencias, [linea for linea, *_ in validas], reporte):
+            mapas.confirmar_lote(reporte)
+            reporte.insertadas += len(filas_libros)
+            reporte.actualizadas += len(filas_actualizar)
+            reporte.creados.extend(creados)
+        else:
+            mapas.descartar_lote()
+            for datos in (datos for _, datos, _, _ in validas):
+                vistos.discard(datos['isbn'])
+
+    if reporte.relacionados.get('autores'):
+        duplicados.invalidar('autores')
+    if reporte.insertadas or reporte.actualizadas:
+        conteos_uso.invalidar('Categorias')
+    reporte.errores.sort()
+    reporte.segundos = time.perf_counter() - inicio
+    return reporte
+
+
+def _fecha_autor(valor):
+    """Fecha de nacimiento de un autor creado desde el catálogo (1900-01-01 si no viene)"""
+    try:
+        return datetime.strptime(str(valor), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return date(1900, 1, 1)
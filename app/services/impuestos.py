@@ -0,0 +1,226 @@
+"""
+Subtotal, descuento, ISV e importe exonerado de Venta en centavos enteros.
+
+Por venta (todo en centavos, tasas en puntos básicos):
+
+    S   = Σ precio_unitario × cantidad          (S15, S18, S0 por clase de libro)
+    D   = min(descuento, S)
+    D15 = red(D × S15 / S);  D18 = red(D × (S15 + S18) / S) - D15
+    B15 = S15 - D15;  B18 = S18 - D18
+    isv_15 = red(B15 × tasa_15 / 10000);  isv_18 = red(B18 × tasa_18 / 10000)
+    exonerada: isv = 0 e importe_exonerado = B15 + B18
+    total = S - D + isv_15 + isv_18
+
+red() redondea la mitad hacia arriba, igual que Decimal.quantize(ROUND_HALF_UP)
+sobre DECIMAL(10,2); el descuento se reparte entre las clases de forma
+acumulada para que D15 + D18 nunca supere D.
+
+calcular_lote trabaja por columnas (array de enteros de 64 bits): importes,
+sumas por venta (accumulate + diferencias en los límites de cada venta) y
+fórmulas se aplican con map sobre columnas enteras, sin crear un Decimal ni
+ejecutar un bucle de Python por línea o por venta. calcular_decimal es la misma regla con
+Decimal y sirve de referencia (flask medir-impuestos compara ambos).
+"""
+from array import array
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import accumulate, repeat
+from operator import add, eq, floordiv, mul, ne, sub
+
+TASA_15 = 1500
+TASA_18 = 1800
+CLASE_15, CLASE_18, CLASE_EXENTO = 0, 1, 2
+
+TotalesVenta = namedtuple('TotalesVenta', 'subtotal descuento isv_15 isv_18 importe_exonerado total')
+
+
+class ReglasImpuestos(namedtuple('ReglasImpuestos', 'tasa_15 tasa_18 libros_18 libros_exentos')):
+    """Tasas en puntos básicos y libros que no pagan la tasa general"""
+    __slots__ = ()
+
+    def clase(self, id_libro):
+        if id_libro in self.libros_exentos:
+            return CLASE_EXENTO
+        if id_libro in self.libros_18:
+            return CLASE_18
+        return CLASE_15
+
+    def clases(self, libros):
+        """array con la clase de cada libro de la columna `libros`"""
+        excepciones = dict.fromkeys(self.libros_18, CLASE_18)
+        excepciones.update(dict.fromkeys(self.libros_exentos, CLASE_EXENTO))
+        return array('b', map(excepciones.get, libros, repeat(CLASE_15)))
+
+
+def _ids(valor):
+    return frozenset(int(i) for i in str(valor or '').replace(' ', '').split(',') if i)
+
+
+def reglas_vigentes():
+    """Reglas de la configuración (ISV_TASA_15, ISV_TASA_18, ISV_LIBROS_18, ISV_LIBROS_EXENTOS)"""
+    from flask import current_app
+
+    config = current_app.config
+    return ReglasImpuestos(
+        int(config.get('ISV_TASA_15', TASA_15)), int(config.get('ISV_TASA_18', TASA_18)),
+        _ids(config.get('ISV_LIBROS_18')), _ids(config.get('ISV_LIBROS_EXENTOS')),
+    )
+
+
+def red(numerador, denominador):
+    """round(numerador / denominador) con la mitad hacia arriba, para enteros >= 0"""
+    return (2 * numerador + denominador) // (2 * denominador)
+
+
+def a_centavos(valor):
+    return int((Decimal(str(valor)) * 100).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+def a_decimal(centavos):
+    return Decimal(centavos).scaleb(-2)
+
+
+def _totales(s15, s18, s0, descuento, exonerado, reglas):
+    s = s15 + s18 + s0
+    d = min(descuento, s)
+    d15 = red(d * s15, s) if s else 0
+    d18 = (red(d * (s15 + s18), s) if s else 0) - d15
+    b15, b18 = s15 - d15, s18 - d18
+    if exonerado:
+        return TotalesVenta(s, d, 0, 0, b15 + b18, s - d)
+    isv_15 = red(b15 * reglas.tasa_15, 10000)
+    isv_18 = red(b18 * reglas.tasa_18, 10000)
+    return TotalesVenta(s, d, isv_15, isv_18, 0, s - d + isv_15 + isv_18)
+
+
+def calcular_venta(lineas, reglas, descuento=0, exonerado=False):
+    """Totales en centavos de una venta; lineas: [(id_libro, cantidad, precio en centavos)]"""
+    sumas = [0, 0, 0]
+    for id_libro, cantidad, precio in lineas:
+        sumas[reglas.clase(id_libro)] += cantidad * precio
+    return _totales(*sumas, descuento, exonerado, reglas)
+
+
+def _red(numeradores, denominadores):
+    """red() elemento a elemento"""
+    numeradores, denominadores = list(numeradores), list(denominadores)
+    return list(map(floordiv, map(add, map(add, numeradores, numeradores), denominadores),
+                    map(add, denominadores, denominadores)))
+
+
+def calcular_lote(lineas_por_venta, clases, cantidades, precios, descuentos, exoneradas, reglas):
+    """
+    Totales de muchas ventas a la vez, por columnas.
+    lineas_por_venta[i]: cantidad de líneas de la venta i (las líneas van
+    agrupadas por venta en el mismo orden); clases, cantidades y precios (en
+    centavos) por línea; descuentos (centavos) y exoneradas (0/1) por venta.
+    Devuelve TotalesVenta cuyos campos son listas, una posición por venta.
+    Todas las operaciones son map/accumulate sobre columnas: ningún bucle
+    de Python por línea ni por venta.
+    """
+    ventas = len(lineas_por_venta)
+    importes = array('q', map(mul, cantidades, precios))
+    fines = list(accumulate(lineas_por_venta))
+    inicios = [0] + fines[:-1]
+    sumas = []
+    for clase in (CLASE_15, CLASE_18, CLASE_EXENTO):
+        # Importe de cada línea en la columna de su clase (0 en las otras)
+        columna = map(mul, importes, map(eq, clases, repeat(clase)))
+        acumulado = array('q', accumulate(columna, initial=0))
+        sumas.append(list(map(sub, map(acumulado.__getitem__, fines), map(acumulado.__getitem__, inicios)))
+                     if ventas else [])
+    s15, s18, s0 = sumas
+
+    s = list(map(add, map(add, s15, s18), s0))
+    divisor = list(map(max, s, repeat(1)))          # S = 0 implica S15 = S18 = 0
+    d = list(map(min, descuentos, s))
+    d15 = _red(map(mul, d, s15), divisor)
+    d18 = list(map(sub, _red(map(mul, d, map(add, s15, s18)), divisor), d15))
+    b15 = list(map(sub, s15, d15))
+    b18 = list(map(sub, s18, d18))
+    pagan = list(map(sub, repeat(1), map(int, exoneradas)))
+    isv_15 = list(map(mul, _red(map(mul, b15, repeat(reglas.tasa_15)), repeat(10000, ventas)), pagan))
+    isv_18 = list(map(mul, _red(map(mul, b18, repeat(reglas.tasa_18)), repeat(10000, ventas)), pagan))
+    exonerado = list(map(mul, map(add, b15, b18), map(sub, repeat(1), pagan)))
+    neto = list(map(sub, s, d))
+    total = list(map(add, map(add, neto, isv_15), isv_18))
+    return TotalesVenta(s, d, isv_15, isv_18, exonerado, total)
+
+
+def calcular_decimal(lineas, reglas, descuento=Decimal('0.00'), exonerado=False):
+    """Referencia con Decimal (lineas: [(id_libro, cantidad, precio Decimal)]); devuelve TotalesVenta en Decimal"""
+    centavo = Decimal('0.01')
+    sumas = [Decimal('0.00')] * 3
+    for id_libro, cantidad, precio in lineas:
+        sumas[reglas.clase(id_libro)] += precio * cantidad
+    s15, s18, s0 = sumas
+    s = s15 + s18 + s0
+    d = min(descuento, s)
+    d15 = (d * s15 / s).quantize(centavo, ROUND_HALF_UP) if s else Decimal('0.00')
+    d18 = ((d * (s15 + s18) / s).quantize(centavo, ROUND_HALF_UP) if s else Decimal('0.00')) - d15
+    b15, b18 = s15 - d15, s18 - d18
+    if exonerado:
+        return TotalesVenta(s, d, Decimal('0.00'), Decimal('0.00'), b15 + b18, s - d)
+    isv_15 = (b15 * reglas.tasa_15 / 10000).quantize(centavo, ROUND_HALF_UP)
+    isv_18 = (b18 * reglas.tasa_18 / 10000).quantize(centavo, ROUND_HALF_UP)
+    return TotalesVenta(s, d, isv_15, isv_18, Decimal('0.00'), s - d + isv_15 + isv_18)
+
+
+def recalcular_ventas(desde, hasta, reglas=None, tamano_lote=20000, aplicar=True):
+    """
+    Recalcular los totales de las ventas con fecha_venta en [desde, hasta)
+    a partir de Detalle_Venta, de a `tamano_lote` ventas por transacción.
+    Se conservan el descuento y la marca de exoneración de cada venta.
+    Devuelve (ventas, líneas, ventas cuyo total cambió).
+    """
+    from sqlalchemy import BigInteger, bindparam, cast, func, select, update
+    from app import db
+    from models import DetalleVenta, Venta
+
+    reglas = reglas or reglas_vigentes()
+    centavos = lambda columna: cast(func.round(columna * 100, 0), BigInteger)
+    ultimo, ventas, lineas, cambiadas = None, 0, 0, 0
+    while True:
+        consulta = (
+            select(Venta.id_venta, centavos(Venta.descuento), Venta.exonerado, centavos(Venta.total))
+            .where(Venta.fecha_venta >= desde, Venta.fecha_venta < hasta)
+            .order_by(Venta.id_venta).limit(tamano_lote)
+        )
+        if ultimo is not None:
+            consulta = consulta.where(Venta.id_venta > ultimo)
+        cabeceras = db.session.execute(consulta).all()
+        if not cabeceras:
+            break
+        primero, ultimo = cabeceras[0][0], cabeceras[-1][0]
+        detalle = db.session.execute(
+            select(DetalleVenta.id_venta, DetalleVenta.id_libro, DetalleVenta.cantidad,
+                   centavos(DetalleVenta.precio_unitario))
+            .join(Venta, Venta.id_venta == DetalleVenta.id_venta)
+            .where(DetalleVenta.id_venta.between(primero, ultimo),
+                   Venta.fecha_venta >= desde, Venta.fecha_venta < hasta)
+            .order_by(DetalleVenta.id_venta)
+        ).all()
+
+        por_venta = dict.fromkeys((c[0] for c in cabeceras), 0)
+        for fila in detalle:
+            por_venta[fila[0]] += 1
+        totales = calcular_lote(
+            list(por_venta.values()),
+            reglas.clases(f[1] for f in detalle),
+            array('q', (f[2] for f in detalle)),
+            array('q', (f[3] for f in detalle)),
+            [c[1] for c in cabeceras], [c[2] for c in cabeceras], reglas,
+        )
+        cambiadas += sum(map(ne, totales.total, (c[3] for c in cabeceras)))
+        if aplicar:
+            tabla = Venta.__table__
+            db.session.execute(
+                update(tabla).where(tabla.c.id_venta == bindparam('id'))
+                .values({campo: bindparam(campo) for campo in TotalesVenta._fields}),
+                [{'id': c[0], **{campo: a_decimal(valor) for campo, valor in zip(TotalesVenta._fields, fila)}}
+                 for c, fila in zip(cabeceras, zip(*totales))],
+            )
+            db.session.commit()
+        ventas += len(cabeceras)
+        lineas += len(detalle)
+    return ventas, lineas, cambiadas
@@ -0,0 +1,202 @@
+"""
+Libro mayor de inventario.
+
+Inventarios guarda cada movimiento con stock_anterior/stock_nuevo por
+(libro, sucursal, formato) y Stock_Actual el saldo vigente de cada clave.
+Un movimiento hace, en la transacción del que llama:
+
+1. UPDATE Stock_Actual SET stock = stock + cantidad ... RETURNING stock
+   (OUTPUT en MSSQL). El UPDATE bloquea la fila hasta el commit, así que
+   dos escritores de la misma clave se serializan y nunca calculan el
+   mismo stock_anterior; claves distintas no se esperan entre sí.
+   Si la clave no existe se inserta en un SAVEPOINT; si otro la insertó
+   primero (IntegrityError) se repite el UPDATE.
+2. Libros.stock_fisico / stock_digital += cantidad (total del libro).
+3. INSERT del movimiento en Inventarios con anterior = nuevo - cantidad.
+
+Leer el stock es una búsqueda por PK en Stock_Actual, sin recorrer el
+libro mayor. Nada aquí hace commit: una venta puede registrar varios
+movimientos y confirmarlos juntos (registrar_movimientos ordena las claves
+para que dos transacciones no se bloqueen en orden inverso).
+"""
+import unicodedata
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.services.ids import siguiente_id
+
+FISICO = 'fisico'
+DIGITAL = 'digital'
+
+# Columna de Libros que acumula el total de cada formato
+_TOTALES_LIBRO = {FISICO: 'stock_fisico', DIGITAL: 'stock_digital'}
+
+Movimiento = namedtuple('Movimiento', 'id_inventario id_libro id_sucursal formato cantidad stock_anterior stock_nuevo')
+
+
+class StockInsuficiente(Exception):
+    """El movimiento dejaría el stock de la clave en negativo"""
+
+    def __init__(self, id_libro, id_sucursal, formato, disponible, cantidad):
+        self.id_libro = id_libro
+        self.id_sucursal = id_sucursal
+        self.formato = formato
+        self.disponible = disponible
+        self.cantidad = cantidad
+        super().__init__(f'Stock insuficiente del libro {id_libro} ({formato}) en la sucursal {id_sucursal}: '
+                         f'hay {disponible}, se piden {-cantidad}')
+
+
+def normalizar_formato(formato):
+    """'Físico ' -> 'fisico' (la misma clave para todas las variantes)"""
+    descompuesto = unicodedata.normalize('NFKD', (formato or '').strip().lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def _clave(StockActual, id_libro, id_sucursal, formato):
+    return and_(StockActual.id_libro == id_libro,
+                StockActual.id_sucursal == id_sucursal,
+                StockActual.formato == formato)
+
+
+def _aplicar_saldo(sesion, id_libro, id_sucursal, formato, cantidad, id_inventario, ahora, permitir_negativo):
+    """Sumar `cantidad` al saldo de la clave bloqueando su fila; devuelve el stock nuevo"""
+    from models import StockActual
+
+    clave = _clave(StockActual, id_libro, id_sucursal, formato)
+    condicion = clave if permitir_negativo or cantidad >= 0 else and_(clave, StockActual.stock + cantidad >= 0)
+    sentencia = (
+        update(StockActual).where(condicion)
+        .values(stock=StockActual.stock + cantidad, id_ultimo_movimiento=id_inventario, fecha_actualizacion=ahora)
+        .returning(StockActual.stock)
+        .execution_options(synchronize_session=False)
+    )
+    for _ in range(2):
+        nuevo = sesion.execute(sentencia).scalar()
+        if nuevo is not None:
+            return nuevo
+
+        disponible = sesion.execute(select(StockActual.stock).where(clave)).scalar()
+        if disponible is not None:
+            raise StockInsuficiente(id_libro, id_sucursal, formato, disponible, cantidad)
+        if cantidad < 0 and not permitir_negativo:
+            raise StockInsuficiente(id_libro, id_sucursal, formato, 0, cantidad)
+        try:
+            with sesion.begin_nested():
+                sesion.add(StockActual(id_libro=id_libro, id_sucursal=id_sucursal, formato=formato,
+                                       stock=cantidad, id_ultimo_movimiento=id_inventario,
+                                       fecha_actualizacion=ahora))
+            return cantidad
+        except IntegrityError:
+            # Otro escritor creó la clave al mismo tiempo: ya existe, repetir el UPDATE
+            continue
+    raise RuntimeError(f'No se pudo actualizar el stock de {id_libro}/{id_sucursal}/{formato}')
+
+
+def _movimiento(sesion, id_libro, id_sucursal, formato, cantidad, tipo_movimiento, id_empleado, motivo,
+                referencia, observaciones, permitir_negativo, id_inventario, actualizar_libro):
+    """Bloquear y actualizar el saldo y el total del libro; devuelve (Movimiento, fila de Inventarios)"""
+    from models import Libros
+
+    formato = normalizar_formato(formato)
+    cantidad = int(cantidad)
+    ahora = datetime.now()
+
+    stock_nuevo = _aplicar_saldo(sesion, id_libro, id_sucursal, formato, cantidad,
+                                 id_inventario, ahora, permitir_negativo)
+    stock_anterior = stock_nuevo - cantidad
+    # Fecha tomada con la fila ya bloqueada: en cada clave el orden por
+    # fecha_movimiento es el orden en que se encadenaron los saldos
+    ahora = datetime.now()
+
+    total = _TOTALES_LIBRO.get(formato) if actualizar_libro else None
+    if total:
+        columna = getattr(Libros, total)
+        sesion.execute(
+            update(Libros).where(Libros.id_libro == id_libro).values({columna: columna + cantidad})
+            .execution_options(synchronize_session=False)
+        )
+    fila = {
+        'id_inventario': id_inventario, 'id_libro': id_libro, 'id_sucursal': id_sucursal,
+        'tipo_movimiento': tipo_movimiento, 'cantidad': cantidad, 'stock_anterior': stock_anterior,
+        'stock_nuevo': stock_nuevo, 'formato': formato, 'fecha_movimiento': ahora, 'id_empleado': id_empleado,
+        'motivo': motivo, 'referencia': referencia, 'observaciones': observaciones,
+    }
+    return Movimiento(id_inventario, id_libro, id_sucursal, formato, cantidad, stock_anterior, stock_nuevo), fila
+
+
+def registrar_movimiento(id_libro, id_sucursal, formato, cantidad, tipo_movimiento, id_empleado, motivo,
+                         referencia=None, observaciones=None, permitir_negativo=False, sesion=None,
+                         id_inventario=None, actualizar_libro=True):
+    """
+    Agregar un movimiento (cantidad > 0 entrada, < 0 salida) al libro mayor
+    y actualizar Stock_Actual y el total de Libros. No hace commit.
+    Lanza StockInsuficiente si la salida deja la clave en negativo.
+    actualizar_libro=False deja Libros igual (ajustes de conciliación que
+    llevan el libro mayor al total que Libros ya tiene).
+    """
+    from app import db
+    from models import Inventarios
+
+    sesion = sesion or db.session
+    movimiento, fila = _movimiento(sesion, id_libro, id_sucursal, formato, cantidad, tipo_movimiento, id_empleado,
+                                   motivo, referencia, observaciones, permitir_negativo,
+                                   id_inventario or siguiente_id(Inventarios), actualizar_libro)
+    sesion.execute(insert(Inventarios), [fila])
+    return movimiento
+
+
+def registrar_movimientos(movimientos, id_empleado, sesion=None, ids=None):
+    """
+    Varios movimientos en la misma transacción (p. ej. las líneas de una
+    venta). Se aplican en orden de (libro, sucursal, formato) para que dos
+    transacciones con las mismas claves las bloqueen en el mismo orden, y
+    las filas de Inventarios se insertan juntas al final.
+    movimientos: dicts con los argumentos de registrar_movimiento.
+    ids: IDs de Inventarios ya reservados (uno por movimiento).
+    """
+    from app import db
+    from models import Inventarios
+
+    sesion = sesion or db.session
+    ordenados = sorted(movimientos, key=lambda m: (m['id_libro'], m['id_sucursal'],
+                                                   normalizar_formato(m['formato'])))
+    # Los IDs se piden antes de bloquear la primera fila: la reserva usa su
+    # propia transacción y no debe esperar a la nuestra
+    ids = list(ids) if ids is not None else [siguiente_id(Inventarios) for _ in ordenados]
+    resultado, filas = [], []
+    for id_inventario, m in zip(ids, ordenados):
+        m = {'referencia': None, 'observaciones': None, 'permitir_negativo': False, 'actualizar_libro': True, **m}
+        movimiento, fila = _movimiento(sesion, id_empleado=id_empleado, id_inventario=id_inventario, **m)
+        resultado.append(movimiento)
+        filas.append(fila)
+    if filas:
+        sesion.execute(insert(Inventarios), filas)
+    return resultado
+
+
+def stock(id_libro, id_sucursal, formato=FISICO, sesion=None):
+    """Stock vigente de la clave (búsqueda por PK; 0 si nunca tuvo movimientos)"""
+    from app import db
+    from models import StockActual
+
+    sesion = sesion or db.session
+    return sesion.execute(
+        select(StockActual.stock).where(_clave(StockActual, id_libro, id_sucursal, normalizar_formato(formato)))
+    ).scalar() or 0
+
+
+def stock_por_sucursal(id_libro, sesion=None):
+    """{(id_sucursal, formato): stock} del libro"""
+    from app import db
+    from models import StockActual
+
+    sesion = sesion or db.session
+    filas = sesion.execute(
+        select(StockActual.id_sucursal, StockActual.formato, StockActual.stock)
+        .where(StockActual.id_libro == id_libro)
+    )
+    return {(id_sucursal, formato): cantidad for id_sucursal, formato, cantidad in filas}
@@ -0,0 +1,142 @@
+"""
+Límite de intentos fallidos de login por cuenta (email normalizado) y por IP.
+
+Se consulta antes de cualquier query o bcrypt, así un ataque de
+credential stuffing no consume CPU de los usuarios reales. El backend por
+defecto vive en memoria del worker (ventana deslizante + LRU acotado);
+con LOGIN_THROTTLE_REDIS_URL los límites se comparten entre todos los
+workers pre-forkeados.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+
+class MemoryThrottleBackend:
+    """Ventana deslizante en memoria con desalojo LRU (memoria acotada)"""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, key, window, now):
+        intentos = self._keys.get(key)
+        if intentos is None:
+            return None
+        while intentos and intentos[0] <= now - window:
+            intentos.popleft()
+        if not intentos:
+            del self._keys[key]
+            return None
+        self._keys.move_to_end(key)
+        return intentos
+
+    def retry_after(self, key, limit, window):
+        """Segundos hasta que la clave vuelva a estar bajo el límite (0 = permitido)"""
+        now = time.monotonic()
+        with self._lock:
+            intentos = self._prune(key, window, now)
+            if intentos is None or len(intentos) < limit:
+                return 0
+            return max(1, int(intentos[-limit] + window - now) + 1)
+
+    def hit(self, key, limit, window):
+        now = time.monotonic()
+        with self._lock:
+            intentos = self._prune(key, window, now)
+            if intentos is None:
+                # maxlen = limit: nunca se guardan más marcas de las necesarias
+                intentos = self._keys[key] = deque(maxlen=limit)
+            intentos.append(now)
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+
+    def reset(self, key):
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class RedisThrottleBackend:
+    """Ventana deslizante en Redis (sorted set por clave), compartida entre workers"""
+
+    def __init__(self, url, prefix='login_throttle:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('LOGIN_THROTTLE_REDIS_URL requiere el paquete "redis"')
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def retry_after(self, key, limit, window):
+        now = time.time()
+        k = self.prefix + key
+        pipe = self._redis.pipeline()
+        pipe.zremrangebyscore(k, 0, now - window)
+        pipe.zrevrange(k, limit - 1, limit - 1, withscores=True)
+        _, marca = pipe.execute()
+        if not marca:
+            return 0
+        return max(1, int(marca[0][1] + window - now) + 1)
+
+    def hit(self, key, limit, window):
+        now = time.time()
+        k = self.prefix + key
+        pipe = self._redis.pipeline()
+        pipe.zadd(k, {f'{now}:{uuid.uuid4().hex[:8]}': now})
+        pipe.zremrangebyrank(k, 0, -(limit + 1))
+        pipe.expire(k, int(window) + 1)
+        pipe.execute()
+
+    def reset(self, key):
+        self._redis.delete(self.prefix + key)
+
+
+class LoginThrottle:
+    """Combina el límite por cuenta y por IP"""
+
+    def __init__(self, max_por_email=5, max_por_ip=20, ventana=900, backend=None):
+        self.max_por_email = max_por_email
+        self.max_por_ip = max_por_ip
+        self.ventana = ventana
+        self.backend = backend if backend is not None else MemoryThrottleBackend()
+
+    def init_app(self, app):
+        self.max_por_email = app.config.get('LOGIN_MAX_INTENTOS_EMAIL', self.max_por_email)
+        self.max_por_ip = app.config.get('LOGIN_MAX_INTENTOS_IP', self.max_por_ip)
+        self.ventana = app.config.get('LOGIN_THROTTLE_VENTANA', self.ventana)
+        redis_url = app.config.get('LOGIN_THROTTLE_REDIS_URL')
+        if redis_url:
+            self.backend = RedisThrottleBackend(redis_url)
+        else:
+            self.backend = MemoryThrottleBackend(app.config.get('LOGIN_THROTTLE_MAX_CLAVES', 10000))
+        app.extensions['login_throttle'] = self
+
+    @staticmethod
+    def _claves(email, ip):
+        return 'email:' + (email or '').strip().lower(), 'ip:' + (ip or '')
+
+    def bloqueado(self, email, ip):
+        """Segundos de espera si el email o la IP superan el límite, 0 si no"""
+        clave_email, clave_ip = self._claves(email, ip)
+        return max(
+            self.backend.retry_after(clave_email, self.max_por_email, self.ventana),
+            self.backend.retry_after(clave_ip, self.max_por_ip, self.ventana),
+        )
+
+    def registrar_fallo(self, email, ip):
+        clave_email, clave_ip = self._claves(email, ip)
+        self.backend.hit(clave_email, self.max_por_email, self.ventana)
+        self.backend.hit(clave_ip, self.max_por_ip, self.ventana)
+
+    def registrar_exito(self, email, ip):
+        # Solo se limpia la cuenta; la IP sigue contando intentos sobre otras cuentas
+        clave_email, _ = self._claves(email, ip)
+        self.backend.reset(clave_email)
+
+
+login_throttle = LoginThrottle()
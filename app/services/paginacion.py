@@ -0,0 +1,215 @@
+"""
+Paginación keyset (por cursor) y ordenamiento reutilizable para los listados.
+
+Cada blueprint declara sus órdenes posibles con ordenar(); la última
+columna debe hacer única la clave (normalmente la PK) y ninguna puede ser
+NULL. El costo de cada página es constante: WHERE (clave) > (cursor)
+ORDER BY clave LIMIT n+1, sin OFFSET ni COUNT sobre la tabla.
+
+Uso en una vista:
+    pagina = paginar(consulta, ORDENES, request.args, defecto='nombre')
+    return render_template('x/listar.html', items=pagina.items, pagina=pagina)
+"""
+import base64
+import datetime
+import decimal
+import json
+import threading
+import time
+
+from flask import request, url_for
+from sqlalchemy import and_, or_, func, select, text
+
+POR_PAGINA_OPCIONES = (10, 25, 50, 100)
+POR_PAGINA_DEFECTO = 25
+
+
+class Orden:
+    """Clave de orden: columnas en la misma dirección"""
+
+    __slots__ = ('columnas', 'desc')
+
+    def __init__(self, columnas, desc=False):
+        self.columnas = columnas
+        self.desc = desc
+
+    def claves(self):
+        return [c.key for c in self.columnas]
+
+    def order_by(self, invertido=False):
+        descendente = self.desc != invertido
+        return [c.desc() if descendente else c.asc() for c in self.columnas]
+
+    def despues_de(self, valores, invertido=False):
+        """(c1, c2, ...) > (v1, v2, ...) expandido, válido en cualquier motor"""
+        descendente = self.desc != invertido
+        condiciones = []
+        for i, columna in enumerate(self.columnas):
+            comparacion = columna < valores[i] if descendente else columna > valores[i]
+            iguales = [c == v for c, v in zip(self.columnas[:i], valores[:i])]
+            condiciones.append(and_(*iguales, comparacion))
+        return or_(*condiciones)
+
+
+def ordenar(*columnas, desc=False):
+    return Orden(list(columnas), desc)
+
+
+# --- Cursor opaco ----------------------------------------------------------
+
+def _serializar(valor):
+    if isinstance(valor, datetime.datetime):
+        return {'dt': valor.isoformat()}
+    if isinstance(valor, datetime.date):
+        return {'d': valor.isoformat()}
+    if isinstance(valor, decimal.Decimal):
+        return {'n': str(valor)}
+    return valor
+
+
+def _deserializar(valor):
+    if isinstance(valor, dict):
+        if 'dt' in valor:
+            return datetime.datetime.fromisoformat(valor['dt'])
+        if 'd' in valor:
+            return datetime.date.fromisoformat(valor['d'])
+        if 'n' in valor:
+            return decimal.Decimal(valor['n'])
+    return valor
+
+
+def codificar_cursor(orden, direccion, valores):
+    datos = json.dumps([orden, direccion, [_serializar(v) for v in valores]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (orden, direccion, valores) o None si el cursor no es válido"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        orden, direccion, valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if direccion not in ('n', 'p'):
+            return None
+        return orden, direccion, [_deserializar(v) for v in valores]
+    except (ValueError, TypeError):
+        return None
+
+
+# --- Conteo aproximado -----------------------------------------------------
+
+_conteos = {}
+_conteos_lock = threading.Lock()
+
+
+def total_aproximado(modelo, ttl=60):
+    """
+    Filas aproximadas de la tabla. En MSSQL se lee sys.partitions (sin
+    escanear la tabla); en otros motores COUNT(*) cacheado por ttl segundos.
+    """
+    from app import db
+
+    tabla = modelo.__tablename__
+    ahora = time.monotonic()
+    with _conteos_lock:
+        cacheado = _conteos.get(tabla)
+        if cacheado and cacheado[0] > ahora:
+            return cacheado[1]
+
+    if db.engine.dialect.name == 'mssql':
+        total = db.session.execute(text(
+            'SELECT SUM(p.rows) FROM sys.partitions p '
+            'WHERE p.object_id = OBJECT_ID(:tabla) AND p.index_id IN (0, 1)'
+        ), {'tabla': tabla}).scalar()
+    else:
+        total = db.session.execute(select(func.count()).select_from(modelo.__table__)).scalar()
+    total = int(total or 0)
+
+    with _conteos_lock:
+        _conteos[tabla] = (ahora + ttl, total)
+    return total
+
+
+# --- Página ----------------------------------------------------------------
+
+class Pagina:
+
+    opciones = POR_PAGINA_OPCIONES
+
+    def __init__(self, items, orden, por_pagina, siguiente, anterior, total=None):
+        self.items = items
+        self.orden = orden
+        self.por_pagina = por_pagina
+        self.siguiente = siguiente
+        self.anterior = anterior
+        self.total = total
+
+    @property
+    def es_primera(self):
+        return self.anterior is None
+
+    def url(self, endpoint=None, **cambios):
+        """
+        URL de la vista actual (u otro endpoint, ej. exportar) conservando
+        los filtros y aplicando cambios
+        """
+        args = request.args.to_dict()
+        args.pop('cursor', None)
+        args.update({k: v for k, v in cambios.items() if v is not None})
+        args.update(request.view_args or {})
+        return url_for(endpoint or request.endpoint, **args)
+
+
+def leer_por_pagina(args):
+    try:
+        por_pagina = int(args.get('por_pagina', POR_PAGINA_DEFECTO))
+    except ValueError:
+        return POR_PAGINA_DEFECTO
+    return por_pagina if por_pagina in POR_PAGINA_OPCIONES else POR_PAGINA_DEFECTO
+
+
+def nombre_de_orden(ordenes, args, defecto):
+    """Orden pedido en args si está declarado, si no el de defecto"""
+    nombre = args.get('orden', defecto)
+    return nombre if nombre in ordenes else defecto
+
+
+def paginar(consulta, ordenes, args, defecto, contar=None):
+    """
+    Ejecutar una página keyset de `consulta` (Query ya filtrada).
+
+    ordenes: {nombre: Orden}; args: request.args (orden, cursor, por_pagina);
+    contar: modelo para incluir total_aproximado() en la página (opcional).
+    """
+    nombre_orden = nombre_de_orden(ordenes, args, defecto)
+    orden = ordenes[nombre_orden]
+    por_pagina = leer_por_pagina(args)
+
+    posicion = decodificar_cursor(args.get('cursor', '')) if args.get('cursor') else None
+    if posicion and (posicion[0] != nombre_orden or len(posicion[2]) != len(orden.columnas)):
+        posicion = None  # Cursor de otro orden: volver a la primera página
+
+    hacia_atras = bool(posicion) and posicion[1] == 'p'
+    if posicion:
+        consulta = consulta.filter(orden.despues_de(posicion[2], invertido=hacia_atras))
+    filas = consulta.order_by(*orden.order_by(invertido=hacia_atras)).limit(por_pagina + 1).all()
+
+    hay_mas = len(filas) > por_pagina
+    items = filas[:por_pagina]
+    if hacia_atras:
+        items.reverse()
+
+    claves = orden.claves()
+
+    def cursor(item, direccion):
+        return codificar_cursor(nombre_orden, direccion, [getattr(item, k) for k in claves])
+
+    siguiente = anterior = None
+    if items:
+        # Hacia adelante la fila extra indica página siguiente; hacia atrás, anterior
+        if hay_mas or hacia_atras:
+            siguiente = cursor(items[-1], 'n')
+        if (hay_mas and hacia_atras) or (posicion and not hacia_atras):
+            anterior = cursor(items[0], 'p')
+
+    total = total_aproximado(contar) if contar is not None else None
+    return Pagina(items, nombre_orden, por_pagina, siguiente, anterior, total)
@@ -0,0 +1,412 @@
+"""
+Servicio de hash de contraseñas.
+
+El pipeline HMAC(pepper + sal) + bcrypt es costoso (~250 ms con rounds=12),
+así que se ejecuta en un pool de procesos dedicado para no bloquear los
+workers WSGI. La cola es acotada: si está llena se rechaza la petición de
+inmediato con PasswordServiceBusy en lugar de acumular esperas.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import string
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from bcrypt import hashpw, gensalt, checkpw
+
+
+class PasswordServiceBusy(Exception):
+    """La cola de hashing está llena o la operación tardó demasiado"""
+    pass
+
+
+def _hmac_password(password, pepper, random_salt_hex):
+    """HMAC-SHA256 de la contraseña con pepper + sal aleatoria"""
+    return hmac.new(
+        (pepper + random_salt_hex).encode('utf-8'),
+        password.encode('utf-8'),
+        hashlib.sha256
+    ).digest()
+
+
+# Formato versionado: $hb1$<sal_hex>$<hash bcrypt>
+# El costo queda dentro del propio hash bcrypt ($2b$<rounds>$...)
+PREFIJO_V1 = '$hb1$'
+
+
+def formato_hash(stored_hash):
+    """Identificar el formato de un hash almacenado por su prefijo"""
+    if not stored_hash:
+        return None
+    if stored_hash.startswith(PREFIJO_V1):
+        return 'v1'
+    if stored_hash.startswith(('pbkdf2:', 'scrypt:')):
+        return 'werkzeug'
+    # Formato original: 64 hex de sal + bcrypt codificado en hex
+    if len(stored_hash) > 64:
+        try:
+            bytes.fromhex(stored_hash)
+            return 'legacy'
+        except ValueError:
+            return None
+    return None
+
+
+def _costo_bcrypt(bcrypt_hash):
+    """Extraer los rounds de un hash bcrypt ($2b$12$...)"""
+    try:
+        return int(bcrypt_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def _hash_password_sync(password, pepper, rounds):
+    """
+    Hash de contraseña completamente aleatorio y único:
+    1. Genera una sal aleatoria única de 32 bytes
+    2. HMAC con pepper + sal
+    3. Bcrypt
+    4. Almacena: prefijo de versión + sal (hex) + hash bcrypt
+    """
+    random_salt_hex = secrets.token_hex(32)
+    hmac_hash = _hmac_password(password, pepper, random_salt_hex)
+    bcrypt_hash = hashpw(hmac_hash, gensalt(rounds=rounds))
+    return PREFIJO_V1 + random_salt_hex + '$' + bcrypt_hash.decode('ascii')
+
+
+def _verify_v1(password, stored_hash, pepper):
+    random_salt_hex, bcrypt_hash = stored_hash[len(PREFIJO_V1):].split('$', 1)
+    hmac_hash = _hmac_password(password, pepper, random_salt_hex)
+    return checkpw(hmac_hash, bcrypt_hash.encode('ascii'))
+
+
+def _verify_legacy(password, stored_hash, pepper):
+    random_salt_hex = stored_hash[:64]
+    bcrypt_hash = bytes.fromhex(stored_hash[64:])
+    hmac_hash = _hmac_password(password, pepper, random_salt_hex)
+    return checkpw(hmac_hash, bcrypt_hash)
+
+
+def _verify_werkzeug(password, stored_hash, pepper):
+    # Hashes creados con generate_password_hash (create_user.py antiguo), sin pepper
+    from werkzeug.security import check_password_hash
+    return check_password_hash(stored_hash, password)
+
+
+_VERIFICADORES = {
+    'v1': _verify_v1,
+    'legacy': _verify_legacy,
+    'werkzeug': _verify_werkzeug,
+}
+
+
+def _verify_password_sync(password, stored_hash, pepper):
+    """Verificar contraseña despachando según el prefijo del hash almacenado"""
+    verificador = _VERIFICADORES.get(formato_hash(stored_hash))
+    if verificador is None:
+        return False
+    return verificador(password, stored_hash, pepper)
+
+
+def necesita_rehash(stored_hash, rounds):
+    """True si el hash no está en el formato actual o usa otro costo"""
+    if formato_hash(stored_hash) != 'v1':
+        return True
+    bcrypt_hash = stored_hash[len(PREFIJO_V1):].split('$', 1)[-1]
+    return _costo_bcrypt(bcrypt_hash) != rounds
+
+
+def calibrar_costo(objetivo_ms=250, costo_min=10, costo_max=16, repeticiones=3):
+    """
+    Medir bcrypt en este host y devolver (costo recomendado, tiempos por costo).
+    El costo recomendado es el mayor cuyo tiempo medio no supera objetivo_ms.
+    """
+    hmac_hash = _hmac_password('calibracion', 'pepper', secrets.token_hex(32))
+    tiempos = {}
+    recomendado = costo_min
+    for costo in range(costo_min, costo_max + 1):
+        muestras = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            hashpw(hmac_hash, gensalt(rounds=costo))
+            muestras.append((time.perf_counter() - inicio) * 1000)
+        tiempos[costo] = sum(muestras) / len(muestras)
+        if tiempos[costo] <= objetivo_ms:
+            recomendado = costo
+        else:
+            # Cada costo duplica el tiempo: no tiene sentido seguir midiendo
+            break
+    return recomendado, tiempos
+
+
+class PasswordHasher:
+    """
+    Ejecuta hash/verify en un ProcessPoolExecutor con admisión acotada.
+
+    max_pending limita las operaciones en vuelo (ejecutándose + en cola);
+    con workers=0 todo se ejecuta en el hilo actual (scripts, pruebas).
+    """
+
+    def __init__(self, workers=2, max_pending=16, timeout=10.0, rounds=12):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.rounds = rounds
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+        # Métricas
+        self._pending = 0
+        self._max_pending_seen = 0
+        self._completed = 0
+        self._cancelled = 0
+        self._failed = 0
+        self._rejected = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._rehashed = 0
+
+        # Re-hash en segundo plano tras un login exitoso (un solo hilo)
+        self._rehash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rehash')
+
+    def init_app(self, app):
+        """Configurar el servicio desde app.config"""
+        self.workers = app.config.get('PASSWORD_POOL_WORKERS', self.workers)
+        self.max_pending = app.config.get('PASSWORD_POOL_MAX_PENDING', self.max_pending)
+        self.timeout = app.config.get('PASSWORD_POOL_TIMEOUT', self.timeout)
+        self.rounds = app.config.get('BCRYPT_ROUNDS', self.rounds)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        app.extensions['password_service'] = self
+
+    def _get_executor(self):
+        # El pool no sobrevive a un fork: cada worker pre-forkeado crea el suyo
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _tomar_lugar(self, espera=None):
+        """
+        Reservar un lugar de max_pending. Sin `espera` se rechaza de
+        inmediato si no hay lugar; con `espera` (segundos) se aguarda.
+        """
+        if espera:
+            tomado = self._slots.acquire(timeout=espera)
+        else:
+            tomado = self._slots.acquire(blocking=False)
+        if not tomado:
+            with self._lock:
+                self._rejected += 1
+            raise PasswordServiceBusy('Demasiadas operaciones de contraseña en cola')
+
+        with self._lock:
+            self._pending += 1
+            self._max_pending_seen = max(self._max_pending_seen, self._pending)
+        return time.perf_counter()
+
+    def _liberar_lugar(self, inicio, resultado='completed'):
+        """resultado: 'completed', 'cancelled' (no llegó a ejecutarse) o 'failed' (lanzó una excepción)"""
+        duracion = time.perf_counter() - inicio
+        with self._lock:
+            self._pending -= 1
+            if resultado == 'completed':
+                # La latencia solo cuenta operaciones terminadas
+                self._completed += 1
+                self._latency_total += duracion
+                self._latency_max = max(self._latency_max, duracion)
+            elif resultado == 'cancelled':
+                self._cancelled += 1
+            else:
+                self._failed += 1
+        self._slots.release()
+
+    @staticmethod
+    def _resultado(future):
+        if future.cancelled():
+            return 'cancelled'
+        return 'failed' if future.exception() is not None else 'completed'
+
+    def _enviar(self, fn, *args, espera=None):
+        """
+        Enviar fn al pool ocupando un lugar. El lugar se libera en el
+        done-callback del future, es decir cuando el trabajo termina de
+        verdad (o se cancela antes de empezar), no cuando el llamador deja
+        de esperarlo.
+        """
+        inicio = self._tomar_lugar(espera)
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._liberar_lugar(inicio, 'failed')
+            raise
+        future.add_done_callback(lambda f: self._liberar_lugar(inicio, self._resultado(f)))
+        return future
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            inicio = self._tomar_lugar()
+            try:
+                resultado = fn(*args)
+            except BaseException:
+                self._liberar_lugar(inicio, 'failed')
+                raise
+            self._liberar_lugar(inicio)
+            return resultado
+
+        future = self._enviar(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # cancel() solo sirve si aún no empezó; si ya corre, sigue
+            # ocupando su lugar hasta terminar
+            future.cancel()
+            with self._lock:
+                self._rejected += 1
+            raise PasswordServiceBusy('La operación de contraseña excedió el tiempo límite')
+
+    def hash(self, password, pepper):
+        return self._run(_hash_password_sync, password, pepper, self.rounds)
+
+    def hash_lote(self, passwords, pepper):
+        """
+        Hashear muchas contraseñas repartidas en el pool (importaciones).
+        Se envían de a `workers` para que los logins no queden detrás de
+        todo el lote en la cola del pool. Cada contraseña ocupa un lugar de
+        max_pending como cualquier otra operación; el lote espera hasta
+        `timeout` por un lugar en vez de rechazarse al primer intento.
+        """
+        if self.workers <= 0:
+            hashes = []
+            for p in passwords:
+                inicio = self._tomar_lugar(self.timeout)
+                try:
+                    hashes.append(_hash_password_sync(p, pepper, self.rounds))
+                except BaseException:
+                    self._liberar_lugar(inicio, 'failed')
+                    raise
+                self._liberar_lugar(inicio)
+            return hashes
+
+        # Nunca más que max_pending a la vez: el lote esperaría sus propios lugares
+        tamano = max(1, min(self.workers, self.max_pending))
+        hashes = []
+        for i in range(0, len(passwords), tamano):
+            futuros = []
+            try:
+                for p in passwords[i:i + tamano]:
+                    futuros.append(self._enviar(_hash_password_sync, p, pepper, self.rounds, espera=self.timeout))
+                hashes.extend(f.result(timeout=self.timeout) for f in futuros)
+            except (PasswordServiceBusy, FutureTimeoutError) as error:
+                for f in futuros:
+                    f.cancel()
+                if isinstance(error, PasswordServiceBusy):
+                    raise
+                with self._lock:
+                    self._rejected += 1
+                raise PasswordServiceBusy('El hash del lote excedió el tiempo límite') from error
+        return hashes
+
+    def verify(self, password, stored_hash, pepper):
+        return self._run(_verify_password_sync, password, stored_hash, pepper)
+
+    def necesita_rehash(self, stored_hash):
+        return necesita_rehash(stored_hash, self.rounds)
+
+    def programar_rehash(self, app, id_cliente, password, stored_hash):
+        """
+        Re-hashear en segundo plano un hash antiguo o con otro costo.
+        El UPDATE solo aplica si el hash no cambió mientras tanto.
+        """
+        pepper = app.config.get('PEPPER_SECRET', '')
+        self._rehash_executor.submit(self._rehash, app, id_cliente, password, stored_hash, pepper)
+
+    def _rehash(self, app, id_cliente, password, stored_hash, pepper):
+        from sqlalchemy import update
+        from app import db
+        from models import Clientes
+
+        try:
+            nuevo_hash = self.hash(password, pepper)
+        except PasswordServiceBusy:
+            return  # Se intentará de nuevo en el próximo login
+        with app.app_context():
+            try:
+                resultado = db.session.execute(
+                    update(Clientes)
+                    .where(Clientes.id_cliente == id_cliente, Clientes.password_hash == stored_hash)
+                    .values(password_hash=nuevo_hash)
+                )
+                db.session.commit()
+                if resultado.rowcount:
+                    with self._lock:
+                        self._rehashed += 1
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error re-hasheando contraseña: {str(e)}")
+
+    def metrics(self):
+        """Snapshot de profundidad de cola y latencia (por proceso)"""
+        with self._lock:
+            promedio = self._latency_total / self._completed if self._completed else 0.0
+            return {
+                'queue_depth': self._pending,
+                'queue_depth_max': self._max_pending_seen,
+                'queue_capacity': self.max_pending,
+                'completed': self._completed,
+                'cancelled': self._cancelled,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'latency_avg_ms': round(promedio * 1000, 2),
+                'latency_max_ms': round(self._latency_max * 1000, 2),
+                'rehashed': self._rehashed,
+            }
+
+    def shutdown(self):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+
+password_service = PasswordHasher()
+
+
+def _get_pepper():
+    """Obtener pepper desde configuración"""
+    try:
+        from flask import current_app
+        return current_app.config.get('PEPPER_SECRET', '')
+    except RuntimeError:
+        from config import Config
+        return Config.PEPPER_SECRET
+
+
+def generar_password_temporal(longitud=10):
+    """Contraseña temporal aleatoria con mayúsculas, minúsculas, dígitos y símbolos"""
+    chars = string.ascii_letters + string.digits + '!@#$%'
+    return ''.join(secrets.choice(chars) for _ in range(longitud))
+
+
+def hash_password(password):
+    """Hash de contraseña (HMAC + bcrypt) ejecutado en el pool de procesos"""
+    return password_service.hash(password, _get_pepper())
+
+
+def verify_password(password, stored_hash):
+    """
+    Verificar contraseña contra el hash almacenado.
+    PasswordServiceBusy se propaga para que la vista responda "intenta de nuevo".
+    """
+    try:
+        return password_service.verify(password, stored_hash, _get_pepper())
+    except PasswordServiceBusy:
+        raise
+    except Exception as e:
+        print(f"Error verificando contraseña: {str(e)}")
+        return False
@@ -0,0 +1,230 @@
+"""
+Resúmenes de ventas para los reportes.
+
+Resumen_Ventas_Dia (día × sucursal × empleado × método de pago) y
+Resumen_Ventas_Libro (día × libro) se mantienen en la misma transacción
+que la venta o la anulación que los cambia: sumar_venta hace
+UPDATE ... SET col = col + delta por fila afectada (una por libro y una
+por venta) y, si la fila no existe, la inserta en un SAVEPOINT (como
+Stock_Actual en app/services/inventario.py). Los reportes leen estas
+tablas en lugar de sumar Venta y Detalle_Venta.
+
+Orden de bloqueo: las filas de libro en orden de id_libro y después la
+del día. procesar_venta ya bloqueó esos libros (Libros y Stock_Actual)
+en el mismo orden, así que las filas de libro no agregan esperas nuevas;
+la del día es distinta por empleado (caja).
+
+El día es la fecha de fecha_venta y la sucursal la de Facturas_Sar; las
+ventas sin Facturas_Sar no se resumen. Una venta anulada deja de sumar
+importes y unidades y cuenta en `anuladas` de su día original.
+
+`flask reconstruir-resumenes` recalcula un rango de días desde las
+tablas de hechos, un proceso por tramo de días y una transacción por día
+(DELETE + INSERT ... SELECT). Conviene ejecutarlo sobre días cerrados o
+sin ventas en curso.
+"""
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from sqlalchemy import Date, and_, case, create_engine, delete, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import NullPool
+
+IMPORTES = ('subtotal', 'descuento', 'isv_15', 'isv_18', 'importe_exonerado', 'total')
+
+ResultadoReconstruccion = namedtuple('ResultadoReconstruccion', 'dias ventas filas_dia filas_libro segundos')
+
+
+def _sumar(sesion, modelo, clave, deltas):
+    """Sumar `deltas` a la fila `clave` de `modelo`, creándola si no existe"""
+    tabla = modelo.__table__
+    condicion = and_(*(tabla.c[columna] == valor for columna, valor in clave.items()))
+    sentencia = update(tabla).where(condicion).values({c: tabla.c[c] + d for c, d in deltas.items()})
+    for _ in range(2):
+        if sesion.execute(sentencia).rowcount:
+            return
+        try:
+            with sesion.begin_nested():
+                sesion.execute(insert(tabla).values(**clave, **deltas))
+            return
+        except IntegrityError:
+            # Otra transacción creó la fila al mismo tiempo: repetir el UPDATE
+            continue
+    raise RuntimeError(f'No se pudo actualizar {tabla.name} {clave}')
+
+
+def sumar_venta(sesion, fecha, id_sucursal, id_empleado, id_metodo_pago, importes, lineas, signo=1):
+    """
+    Aplicar una venta a los resúmenes de `fecha` (date), sin commit.
+    importes: {campo de IMPORTES: Decimal}; lineas: [(id_libro, cantidad, subtotal)].
+    signo=-1 la descuenta (anulación).
+    """
+    from models import ResumenVentasDia, ResumenVentasLibro
+
+    por_libro = {}
+    for id_libro, cantidad, subtotal in lineas:
+        unidades, importe = por_libro.get(id_libro, (0, Decimal(0)))
+        por_libro[id_libro] = (unidades + cantidad, importe + subtotal)
+    for id_libro, (unidades, importe) in sorted(por_libro.items()):
+        _sumar(sesion, ResumenVentasLibro, {'fecha': fecha, 'id_libro': id_libro},
+               {'ventas': signo, 'unidades': signo * unidades, 'importe': signo * importe})
+
+    deltas = {campo: signo * importes[campo] for campo in IMPORTES}
+    _sumar(sesion, ResumenVentasDia,
+           {'fecha': fecha, 'id_sucursal': id_sucursal, 'id_empleado': id_empleado,
+            'id_metodo_pago': id_metodo_pago},
+           {'ventas': signo, 'anuladas': 1 if signo < 0 else 0,
+            'unidades': signo * sum(unidades for unidades, _ in por_libro.values()), **deltas})
+
+
+def descontar_venta(sesion, id_venta, id_sucursal):
+    """Quitar de los resúmenes una venta ya registrada (al anularla), sin commit"""
+    from models import DetalleVenta, Venta
+
+    venta = sesion.execute(
+        select(Venta.fecha_venta, Venta.id_empleado, Venta.id_metodo_pago, *(getattr(Venta, c) for c in IMPORTES))
+        .where(Venta.id_venta == id_venta)
+    ).one()
+    lineas = sesion.execute(
+        select(DetalleVenta.id_libro, DetalleVenta.cantidad, DetalleVenta.subtotal)
+        .where(DetalleVenta.id_venta == id_venta)
+    ).all()
+    sumar_venta(sesion, venta.fecha_venta.date(), id_sucursal, venta.id_empleado, venta.id_metodo_pago,
+                {c: getattr(venta, c) for c in IMPORTES}, lineas, signo=-1)
+
+
+# -- reconstrucción --
+
+def reconstruir_dia(conexion, dia):
+    """Reemplazar los resúmenes de `dia` por los calculados desde Venta, Detalle_Venta y Facturas_Sar"""
+    from models import DetalleVenta, FacturasSar, ResumenVentasDia, ResumenVentasLibro, Venta
+
+    del_dia = and_(Venta.fecha_venta >= dia, Venta.fecha_venta < dia + timedelta(days=1))
+    fecha = literal(dia, Date)
+    conexion.execute(delete(ResumenVentasDia).where(ResumenVentasDia.fecha == dia))
+    conexion.execute(delete(ResumenVentasLibro).where(ResumenVentasLibro.fecha == dia))
+
+    # Una fila por venta del día; las sumas se hacen afuera (SQL Server no suma subconsultas)
+    ventas = (
+        select(FacturasSar.id_sucursal, Venta.id_empleado, Venta.id_metodo_pago, FacturasSar.anulada,
+               select(func.sum(DetalleVenta.cantidad)).where(DetalleVenta.id_venta == Venta.id_venta)
+               .scalar_subquery().label('unidades'),
+               *(getattr(Venta, c) for c in IMPORTES))
+        .join(FacturasSar, FacturasSar.id_venta == Venta.id_venta)
+        .where(del_dia)
+        .subquery()
+    )
+    vigente = ventas.c.anulada == 0
+    por_venta = (
+        select(fecha, ventas.c.id_sucursal, ventas.c.id_empleado, ventas.c.id_metodo_pago,
+               func.sum(case((vigente, 1), else_=0)), func.sum(case((vigente, 0), else_=1)),
+               func.sum(case((vigente, func.coalesce(ventas.c.unidades, 0)), else_=0)),
+               *(func.sum(case((vigente, ventas.c[c]), else_=0)) for c in IMPORTES))
+        .group_by(ventas.c.id_sucursal, ventas.c.id_empleado, ventas.c.id_metodo_pago)
+    )
+    filas_dia = conexion.execute(insert(ResumenVentasDia).from_select(
+        ['fecha', 'id_sucursal', 'id_empleado', 'id_metodo_pago', 'ventas', 'anuladas', 'unidades', *IMPORTES],
+        por_venta)).rowcount
+
+    por_libro = (
+        select(fecha, DetalleVenta.id_libro, func.count(func.distinct(DetalleVenta.id_venta)),
+               func.sum(DetalleVenta.cantidad), func.sum(DetalleVenta.subtotal))
+        .join(Venta, Venta.id_venta == DetalleVenta.id_venta)
+        .join(FacturasSar, FacturasSar.id_venta == Venta.id_venta)
+        .where(del_dia, FacturasSar.anulada == 0)
+        .group_by(DetalleVenta.id_libro)
+    )
+    filas_libro = conexion.execute(insert(ResumenVentasLibro).from_select(
+        ['fecha', 'id_libro', 'ventas', 'unidades', 'importe'], por_libro)).rowcount
+    total = conexion.execute(select(func.count()).select_from(Venta).where(del_dia)).scalar()
+    return total, filas_dia, filas_libro
+
+
+def reconstruir_dias(url, opciones_engine, dias):
+    """Reconstruir `dias` (se ejecuta en un proceso del pool), una transacción por día"""
+    engine = create_engine(url, poolclass=NullPool, **opciones_engine)
+    totales = [0, 0, 0]
+    try:
+        for dia in dias:
+            with engine.begin() as conn:
+                for i, n in enumerate(reconstruir_dia(conn, dia)):
+                    totales[i] += n
+    finally:
+        engine.dispose()
+    return totales
+
+
+def reconstruir(desde, hasta, procesos=None):
+    """
+    Recalcular los resúmenes de los días desde..hasta (date, ambos
+    incluidos), repartidos en tramos contiguos entre `procesos` procesos.
+    """
+    from flask import current_app
+    from app import db
+
+    inicio = time.perf_counter()
+    dias = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+    url = db.engine.url.render_as_string(hide_password=False)
+    opciones = current_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    opciones = {k: v for k, v in opciones.items() if k not in ('pool_size', 'max_overflow', 'pool_recycle', 'pool_timeout')}
+    # Las conexiones del proceso principal no deben heredarse al hacer fork
+    db.session.close()
+    db.engine.dispose()
+
+    totales = [0, 0, 0]
+    if dias:
+        procesos = max(1, min(procesos or 1, len(dias)))
+        tamano = -(-len(dias) // procesos)
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            futuros = [pool.submit(reconstruir_dias, url, opciones, dias[i:i + tamano])
+                       for i in range(0, len(dias), tamano)]
+            for futuro in futuros:
+                for i, n in enumerate(futuro.result()):
+                    totales[i] += n
+    return ResultadoReconstruccion(len(dias), *totales, time.perf_counter() - inicio)
+
+
+# -- consultas de los reportes --
+
+DIMENSIONES = ('fecha', 'id_sucursal', 'id_empleado', 'id_metodo_pago')
+
+
+def resumen_ventas(desde, hasta, agrupar='fecha', id_sucursal=None, sesion=None):
+    """Filas de Resumen_Ventas_Dia entre desde y hasta (incluidos) sumadas por `agrupar`"""
+    from app import db
+    from models import ResumenVentasDia as R
+
+    if agrupar not in DIMENSIONES:
+        raise ValueError(f'No se puede agrupar por {agrupar}')
+    dimension = getattr(R, agrupar)
+    consulta = (
+        select(dimension.label('clave'), func.sum(R.ventas).label('ventas'), func.sum(R.anuladas).label('anuladas'),
+               func.sum(R.unidades).label('unidades'), *(func.sum(getattr(R, c)).label(c) for c in IMPORTES))
+        .where(R.fecha >= desde, R.fecha <= hasta)
+        .group_by(dimension).order_by(dimension)
+    )
+    if id_sucursal is not None:
+        consulta = consulta.where(R.id_sucursal == id_sucursal)
+    return (sesion or db.session).execute(consulta).all()
+
+
+def libros_mas_vendidos(desde, hasta, limite=50, sesion=None):
+    """[(id_libro, titulo, ventas, unidades, importe)] entre desde y hasta, por unidades"""
+    from app import db
+    from models import Libros, ResumenVentasLibro as R
+
+    unidades = func.sum(R.unidades).label('unidades')
+    por_libro = (
+        select(R.id_libro, func.sum(R.ventas).label('ventas'), unidades, func.sum(R.importe).label('importe'))
+        .where(R.fecha >= desde, R.fecha <= hasta)
+        .group_by(R.id_libro).order_by(unidades.desc(), R.id_libro).limit(limite)
+        .subquery()
+    )
+    return (sesion or db.session).execute(
+        select(por_libro.c.id_libro, Libros.titulo, por_libro.c.ventas, por_libro.c.unidades, por_libro.c.importe)
+        .join(Libros, Libros.id_libro == por_libro.c.id_libro)
+        .order_by(por_libro.c.unidades.desc(), por_libro.c.id_libro)
+    ).all()
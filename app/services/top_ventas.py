@@ -0,0 +1,144 @@
+"""
+Libros más vendidos por categoría y por sucursal.
+
+La base agrupa las unidades por (grupo, libro) y el resultado se recorre
+como flujo (yield_per), sin ordenar: por cada grupo se guarda un heap
+mínimo de a lo sumo N libros y cada fila nueva solo entra si supera al
+peor del heap. La memoria es O(grupos × N), no depende de cuántos libros
+se vendieron.
+
+- Por categoría: Resumen_Ventas_Libro (app/services/resumenes.py) del
+  período unido a Libro_Categoria; un libro cuenta en cada categoría suya.
+- Por sucursal: Detalle_Venta del período con la sucursal de Facturas_Sar,
+  sin ventas anuladas (el resumen por libro no guarda la sucursal).
+
+Empates: más unidades primero y después el menor id_libro. Cada worker
+guarda los resultados por (dimensión, período, N): TOP_VENTAS_TTL segundos
+si el período incluye hoy y TOP_VENTAS_TTL_CERRADO si ya terminó (solo
+cambia si se anula una venta o se reconstruyen los resúmenes).
+"""
+import heapq
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+
+DIMENSIONES = ('categoria', 'sucursal')
+TAMANO_LOTE = 5000
+MAX_RESULTADOS = 64
+
+LibroTop = namedtuple('LibroTop', 'id_libro titulo unidades importe')
+TopVentas = namedtuple('TopVentas', 'dimension desde hasta n grupos generado')
+
+
+def top_por_grupo(filas, n):
+    """
+    filas: iterable de (grupo, id_libro, unidades, importe), un libro a lo
+    sumo una vez por grupo. Devuelve {grupo: [(id_libro, unidades, importe)]}
+    con los n de más unidades de cada grupo, de mayor a menor.
+    """
+    if n <= 0:
+        return {}
+    heaps = {}
+    for grupo, id_libro, unidades, importe in filas:
+        heap = heaps.get(grupo)
+        if heap is None:
+            heap = heaps[grupo] = []
+        # El menor del heap es el peor: menos unidades o, a igual unidades, mayor id_libro
+        item = (unidades, -id_libro, importe)
+        if len(heap) < n:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+    return {grupo: [(-id_negado, unidades, importe) for unidades, id_negado, importe in sorted(heap, reverse=True)]
+            for grupo, heap in heaps.items()}
+
+
+def _consulta(dimension, desde, hasta):
+    """SELECT grupo, id_libro, unidades, importe agrupado por (grupo, libro) para desde..hasta (incluidos)"""
+    from models import DetalleVenta, FacturasSar, LibroCategoria, ResumenVentasLibro as R, Venta
+
+    if dimension == 'categoria':
+        return (
+            select(LibroCategoria.id_categoria, R.id_libro, func.sum(R.unidades), func.sum(R.importe))
+            .join(LibroCategoria, LibroCategoria.id_libro == R.id_libro)
+            .where(R.fecha >= desde, R.fecha <= hasta)
+            .group_by(LibroCategoria.id_categoria, R.id_libro)
+        )
+    return (
+        select(FacturasSar.id_sucursal, DetalleVenta.id_libro, func.sum(DetalleVenta.cantidad),
+               func.sum(DetalleVenta.subtotal))
+        .join(Venta, Venta.id_venta == DetalleVenta.id_venta)
+        .join(FacturasSar, FacturasSar.id_venta == Venta.id_venta)
+        .where(Venta.fecha_venta >= desde, Venta.fecha_venta < hasta + timedelta(days=1), FacturasSar.anulada == 0)
+        .group_by(FacturasSar.id_sucursal, DetalleVenta.id_libro)
+    )
+
+
+def _titulos(sesion, ids):
+    from models import Libros
+
+    ids = sorted(ids)
+    titulos = {}
+    # De a 1000: SQL Server admite unos 2100 parámetros por sentencia
+    for i in range(0, len(ids), 1000):
+        titulos.update(sesion.execute(
+            select(Libros.id_libro, Libros.titulo).where(Libros.id_libro.in_(ids[i:i + 1000]))).all())
+    return titulos
+
+
+def calcular_top(dimension, desde, hasta, n, sesion=None):
+    """TopVentas de `dimension` ('categoria' o 'sucursal') entre desde y hasta, sin cache"""
+    from app import db
+
+    if dimension not in DIMENSIONES:
+        raise ValueError(f'Dimensión desconocida: {dimension}')
+    sesion = sesion or db.session
+    filas = sesion.execute(_consulta(dimension, desde, hasta).execution_options(yield_per=TAMANO_LOTE))
+    por_grupo = top_por_grupo(filas, n)
+    titulos = _titulos(sesion, {id_libro for libros in por_grupo.values() for id_libro, _, _ in libros})
+    grupos = {grupo: [LibroTop(id_libro, titulos.get(id_libro), unidades, importe)
+                      for id_libro, unidades, importe in libros]
+              for grupo, libros in sorted(por_grupo.items())}
+    return TopVentas(dimension, desde, hasta, n, grupos, datetime.now())
+
+
+class CacheTopVentas:
+
+    def __init__(self, ttl=300, ttl_cerrado=3600, maximo=MAX_RESULTADOS):
+        self.ttl = ttl
+        self.ttl_cerrado = ttl_cerrado
+        self.maximo = maximo
+        self._resultados = OrderedDict()    # (dimensión, desde, hasta, n) -> (TopVentas, leído)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('TOP_VENTAS_TTL', self.ttl)
+        self.ttl_cerrado = app.config.get('TOP_VENTAS_TTL_CERRADO', self.ttl_cerrado)
+        app.extensions['top_ventas'] = self
+
+    def get(self, dimension, desde, hasta, n):
+        """TopVentas del período, recalculado pasado el TTL"""
+        clave = (dimension, desde, hasta, n)
+        ttl = self.ttl if hasta >= date.today() else self.ttl_cerrado
+        with self._lock:
+            guardado = self._resultados.get(clave)
+            if guardado is not None and time.monotonic() - guardado[1] <= ttl:
+                self._resultados.move_to_end(clave)
+                return guardado[0]
+        resultado = calcular_top(dimension, desde, hasta, n)
+        with self._lock:
+            self._resultados[clave] = (resultado, time.monotonic())
+            self._resultados.move_to_end(clave)
+            while len(self._resultados) > self.maximo:
+                self._resultados.popitem(last=False)
+        return resultado
+
+    def invalidar(self):
+        with self._lock:
+            self._resultados.clear()
+
+
+top_ventas = CacheTopVentas()
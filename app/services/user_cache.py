@@ -0,0 +1,145 @@
+"""
+Cache por worker del usuario autenticado.
+
+load_user se ejecuta en cada petición; en lugar de cargar Clientes y luego
+Estado_Usuarios (dos round trips), se guarda un snapshot compacto con TTL.
+Las vistas que modifican el cliente o su estado invalidan la entrada e
+incrementan la versión 'Clientes' en Versiones_Catalogo; los demás workers
+vacían su cache al ver el cambio (misma lectura perezosa que los catálogos),
+así que un usuario desactivado deja de entrar en todos los workers en a lo
+sumo CATALOGOS_INTERVALO segundos y no al vencer el TTL.
+"""
+import threading
+import time
+
+from flask_login import UserMixin
+
+from app.services.catalogos import catalogos
+
+# Fila de Versiones_Catalogo compartida por todos los workers
+TABLA_VERSION = 'Clientes'
+
+
+class UsuarioSesion(UserMixin):
+    """Snapshot mínimo del cliente para current_user"""
+
+    __slots__ = ('id_cliente', 'nombres', 'apellidos', 'tipo_usuario', 'id_estado', 'permite_login')
+
+    def __init__(self, id_cliente, nombres, apellidos, tipo_usuario, id_estado, permite_login):
+        self.id_cliente = id_cliente
+        self.nombres = nombres
+        self.apellidos = apellidos
+        self.tipo_usuario = tipo_usuario
+        self.id_estado = id_estado
+        self.permite_login = permite_login
+
+    def get_id(self):
+        return str(self.id_cliente)
+
+    @property
+    def is_active(self):
+        return bool(self.permite_login)
+
+
+class UserCache:
+    """Cache TTL acotado de UsuarioSesion por id_cliente"""
+
+    def __init__(self, ttl=60, max_entries=5000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+        self.max_entries = app.config.get('USER_CACHE_MAX', self.max_entries)
+        app.extensions['user_cache'] = self
+
+    def get(self, id_cliente, loader):
+        """Devolver el snapshot cacheado o cargarlo con loader(id_cliente)"""
+        now = time.monotonic()
+        version = catalogos.version(TABLA_VERSION)
+        with self._lock:
+            if version != self._version:
+                # Otro worker modificó un cliente o un estado
+                self._entries.clear()
+                self._version = version
+            entrada = self._entries.get(id_cliente)
+            if entrada is not None and entrada[0] > now:
+                self.hits += 1
+                return entrada[1]
+            self.misses += 1
+
+        usuario = loader(id_cliente)
+        if usuario is None:
+            return None
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._purgar(now)
+            self._entries[id_cliente] = (now + self.ttl, usuario)
+        return usuario
+
+    def _purgar(self, now):
+        # Primero las entradas vencidas; si no alcanza, las más próximas a vencer
+        vencidas = [k for k, (expira, _) in self._entries.items() if expira <= now]
+        for k in vencidas:
+            del self._entries[k]
+        if len(self._entries) >= self.max_entries:
+            orden = sorted(self._entries, key=lambda k: self._entries[k][0])
+            for k in orden[:len(orden) // 4 or 1]:
+                del self._entries[k]
+
+    def invalidar(self, id_cliente):
+        with self._lock:
+            self._entries.pop(id_cliente, None)
+        catalogos.incrementar(TABLA_VERSION)
+
+    def invalidar_estado(self, id_estado):
+        """Invalidar todos los usuarios con un estado (ej. cambió permite_login)"""
+        with self._lock:
+            for k in [k for k, (_, u) in self._entries.items() if u.id_estado == id_estado]:
+                del self._entries[k]
+        catalogos.incrementar(TABLA_VERSION)
+
+    def limpiar(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'entries': len(self._entries),
+            }
+
+
+user_cache = UserCache()
+
+
+def cargar_usuario_sesion(id_cliente):
+    """Una sola consulta con las columnas necesarias de Clientes y Estado_Usuarios"""
+    from app import db
+    from models import Clientes, EstadoUsuarios
+
+    fila = db.session.query(
+        Clientes.id_cliente,
+        Clientes.nombres,
+        Clientes.apellidos,
+        Clientes.tipo_usuario,
+        Clientes.id_estado,
+        EstadoUsuarios.permite_login,
+    ).outerjoin(
+        EstadoUsuarios, EstadoUsuarios.id_estado == Clientes.id_estado
+    ).filter(Clientes.id_cliente == id_cliente).first()
+
+    if fila is None:
+        return None
+    return UsuarioSesion(*fila)
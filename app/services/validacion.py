@@ -0,0 +1,317 @@
+"""
+Validaciones de formularios compartidas.
+
+Las reglas que antes estaban copiadas en cada blueprint viven aquí una sola
+vez, con las expresiones regulares compiladas al importar el módulo. Cada
+validador devuelve (valido, error) como siempre; los límites que cambian
+entre formularios (p. ej. 20 caracteres en el registro público, 50 en
+administración) son parámetros.
+
+Los Esquema agrupan los validadores de un formulario y permiten validar
+miles de filas con validar_lote (importaciones masivas).
+"""
+from datetime import date, datetime
+from functools import partial
+
+import re
+
+SOLO_LETRAS = re.compile(r'[A-Za-zÁÉÍÓÚáéíóúÑñ\s]+')
+ALGUNA_LETRA = re.compile(r'[A-Za-zÁÉÍÓÚáéíóúÑñ]')
+REPETIDO = re.compile(r'(.)\1{2,}')
+REPETIDO_SIN_ESPACIOS = re.compile(r'([^\s])\1{2,}')
+EMAIL = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+NOMBRE_TIPO_DOCUMENTO = re.compile(r'[A-Za-z0-9ÁÉÍÓÚáéíóúÑñ\s\-\.]+')
+MAYUSCULA = re.compile(r'[A-Z]')
+MINUSCULA = re.compile(r'[a-z]')
+DIGITO = re.compile(r'[0-9]')
+ESPECIAL = re.compile(r'[!@#$%^&*()_+\-=\[\]{};\':"\\|,.<>\/?]')
+SEPARADORES_TELEFONO = str.maketrans('', '', ' -()')
+
+OK = (True, None)
+
+
+# --- Personas ----------------------------------------------------------------
+
+def validar_solo_letras(texto, campo, maximo=50):
+    """Validar que un campo solo contenga letras y espacios con reglas estrictas"""
+    if not texto or not texto.strip():
+        return False, f'{campo} es obligatorio'
+
+    texto_limpio = ' '.join(texto.split())
+    if not SOLO_LETRAS.fullmatch(texto_limpio):
+        return False, f'{campo} solo puede contener letras y espacios'
+    if '   ' in texto:
+        return False, f'{campo} no puede tener más de 2 espacios consecutivos'
+    if REPETIDO.search(texto_limpio):
+        return False, f'{campo} no puede tener la misma letra repetida más de 2 veces seguidas'
+    if len(texto_limpio) < 2:
+        return False, f'{campo} debe tener al menos 2 caracteres'
+    if len(texto_limpio) > maximo:
+        return False, f'{campo} no puede exceder {maximo} caracteres'
+    return OK
+
+
+def validar_email(email):
+    """Validar formato de email con reglas específicas"""
+    if not email or not email.strip():
+        return False, 'Email es obligatorio'
+
+    email = email.strip().lower()
+    if not EMAIL.fullmatch(email):
+        return False, 'Formato de email inválido'
+
+    local, _, dominio = email.partition('@')
+    if len(local) < 2:
+        return False, 'El email debe tener al menos 2 caracteres antes del @'
+    if len(dominio.split('.', 1)[0]) > 8:
+        return False, 'El dominio del email no puede tener más de 8 caracteres antes del punto'
+    if REPETIDO.search(email):
+        return False, 'El email no puede tener el mismo carácter repetido más de 2 veces seguidas'
+    if len(email) > 100:
+        return False, 'Email no puede exceder 100 caracteres'
+    return OK
+
+
+def validar_telefono(telefono):
+    """Validar formato de teléfono hondureño (+504 y debe empezar con 3, 7, 8 o 9)"""
+    if not telefono or telefono == 'No especificado':
+        return OK
+
+    telefono_limpio = telefono.translate(SEPARADORES_TELEFONO)
+    if telefono_limpio.startswith('+504'):
+        numero = telefono_limpio[4:]
+    elif telefono_limpio.startswith('504'):
+        numero = telefono_limpio[3:]
+    else:
+        numero = telefono_limpio
+
+    if not numero.isdigit():
+        return False, 'El teléfono solo puede contener números después del código de país'
+    if len(numero) != 8:
+        return False, 'El número de teléfono debe tener exactamente 8 dígitos'
+    if numero[0] not in '3789':
+        return False, 'El número de teléfono debe empezar con 3, 7, 8 o 9'
+    if not telefono_limpio.startswith('+504'):
+        return False, 'El teléfono debe incluir el código de país +504 (ej: +504 9999-9999)'
+    return OK
+
+
+def validar_password(password, confirmar=None):
+    """Validar contraseña con requisitos estrictos"""
+    if not password:
+        return False, 'Contraseña es obligatoria'
+    if len(password) < 8:
+        return False, 'Contraseña debe tener al menos 8 caracteres'
+    if len(password) > 100:
+        return False, 'Contraseña no puede exceder 100 caracteres'
+    if not MAYUSCULA.search(password):
+        return False, 'Contraseña debe contener al menos una letra mayúscula'
+    if not MINUSCULA.search(password):
+        return False, 'Contraseña debe contener al menos una letra minúscula'
+    if not DIGITO.search(password):
+        return False, 'Contraseña debe contener al menos un número'
+    if not ESPECIAL.search(password):
+        return False, 'Contraseña debe contener al menos un carácter especial'
+    if confirmar is not None and password != confirmar:
+        return False, 'Las contraseñas no coinciden'
+    return OK
+
+
+def validar_direccion(direccion):
+    """Validar dirección con límites de caracteres"""
+    if not direccion or direccion == 'No especificada':
+        return OK
+
+    direccion = direccion.strip()
+    if '   ' in direccion:
+        return False, 'La dirección no puede tener más de 2 espacios consecutivos'
+    if REPETIDO_SIN_ESPACIOS.search(direccion):
+        return False, 'La dirección no puede tener el mismo carácter repetido más de 2 veces seguidas'
+    if len(direccion) > 200:
+        return False, 'La dirección no puede exceder 200 caracteres'
+    if len(direccion) < 5:
+        return False, 'La dirección debe tener al menos 5 caracteres'
+    return OK
+
+
+def validar_observaciones(observaciones):
+    """Validar observaciones con límites"""
+    if not observaciones:
+        return OK
+
+    observaciones = observaciones.strip()
+    if '   ' in observaciones:
+        return False, 'Las observaciones no pueden tener más de 2 espacios consecutivos'
+    if len(observaciones) > 500:
+        return False, 'Las observaciones no pueden exceder 500 caracteres'
+    return OK
+
+
+# --- Autores -----------------------------------------------------------------
+
+def validar_nacionalidad(nacionalidad):
+    """Validar nacionalidad"""
+    if not nacionalidad or not nacionalidad.strip():
+        return False, 'Nacionalidad es obligatoria'
+    if not SOLO_LETRAS.fullmatch(nacionalidad):
+        return False, 'Nacionalidad solo puede contener letras'
+    if len(nacionalidad.strip()) < 3:
+        return False, 'Nacionalidad debe tener al menos 3 caracteres'
+    if len(nacionalidad.strip()) > 50:
+        return False, 'Nacionalidad no puede exceder 50 caracteres'
+    return OK
+
+
+def validar_fecha_nacimiento(fecha_str):
+    """Validar fecha de nacimiento (AAAA-MM-DD, no futura, máximo 150 años)"""
+    if not fecha_str:
+        return False, 'Fecha de nacimiento es obligatoria'
+    try:
+        fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
+    except ValueError:
+        return False, 'Formato de fecha inválido'
+
+    hoy = date.today()
+    if fecha > hoy:
+        return False, 'La fecha de nacimiento no puede ser futura'
+    if fecha.year < hoy.year - 150:
+        return False, 'Fecha de nacimiento inválida (muy antigua)'
+    return OK
+
+
+# --- Catálogos ---------------------------------------------------------------
+
+def validar_nombre_categoria(nombre):
+    """Validar nombre de categoría"""
+    if not nombre or not nombre.strip():
+        return False, 'El nombre es obligatorio'
+    if len(nombre.strip()) < 2:
+        return False, 'El nombre debe tener al menos 2 caracteres'
+    if len(nombre.strip()) > 50:
+        return False, 'El nombre no puede exceder 50 caracteres'
+    if not ALGUNA_LETRA.search(nombre):
+        return False, 'El nombre debe contener al menos algunas letras'
+    return OK
+
+
+def validar_descripcion_categoria(descripcion):
+    """Validar descripción de categoría"""
+    if descripcion and len(descripcion.strip()) > 200:
+        return False, 'La descripción no puede exceder 200 caracteres'
+    return OK
+
+
+def validar_id_tipo_documento(id_str):
+    """Validar ID del tipo de documento"""
+    if not id_str or not id_str.strip():
+        return False, 'El ID es obligatorio'
+    try:
+        id_num = int(id_str)
+    except ValueError:
+        return False, 'El ID debe ser un número entero'
+    if id_num <= 0:
+        return False, 'El ID debe ser un número positivo'
+    if id_num > 9999:
+        return False, 'El ID no puede exceder 9999'
+    return OK
+
+
+def validar_nombre_tipo_documento(nombre):
+    """Validar nombre del tipo de documento con reglas estrictas"""
+    if not nombre or not nombre.strip():
+        return False, 'El nombre es obligatorio'
+
+    nombre_limpio = ' '.join(nombre.split())
+    if len(nombre_limpio) < 2:
+        return False, 'El nombre debe tener al menos 2 caracteres'
+    if len(nombre_limpio) > 30:
+        return False, 'El nombre no puede exceder 30 caracteres'
+    if '   ' in nombre:
+        return False, 'El nombre no puede tener más de 2 espacios consecutivos'
+    if not NOMBRE_TIPO_DOCUMENTO.fullmatch(nombre_limpio):
+        return False, 'El nombre solo puede contener letras, números, espacios, guiones y puntos'
+    if REPETIDO_SIN_ESPACIOS.search(nombre_limpio):
+        return False, 'El nombre no puede tener el mismo carácter repetido más de 2 veces seguidas'
+    return OK
+
+
+def validar_descripcion_tipo_documento(descripcion):
+    """Validar descripción del tipo de documento con reglas estrictas"""
+    if not descripcion:
+        return OK
+
+    descripcion = descripcion.strip()
+    if '   ' in descripcion:
+        return False, 'La descripción no puede tener más de 2 espacios consecutivos'
+    if len(descripcion) > 100:
+        return False, 'La descripción no puede exceder 100 caracteres'
+    if 0 < len(descripcion) < 5:
+        return False, 'La descripción debe tener al menos 5 caracteres'
+    return OK
+
+
+# --- Esquemas ----------------------------------------------------------------
+
+class Esquema:
+    """
+    Validadores de un formulario: {campo: validador(valor) -> (valido, error)}.
+    validar() devuelve la lista de errores de una fila (vacía si es válida).
+    """
+
+    def __init__(self, **campos):
+        self.campos = tuple(campos.items())
+
+    def validar(self, datos):
+        errores = []
+        for campo, validador in self.campos:
+            valido, error = validador(datos.get(campo))
+            if not valido:
+                errores.append(error)
+        return errores
+
+    def validar_lote(self, filas):
+        """Errores de cada fila, en el mismo orden (lista vacía = fila válida)"""
+        campos = self.campos
+        resultado = []
+        for datos in filas:
+            errores = []
+            for campo, validador in campos:
+                valido, error = validador(datos.get(campo))
+                if not valido:
+                    errores.append(error)
+            resultado.append(errores)
+        return resultado
+
+
+ESQUEMA_REGISTRO = Esquema(
+    nombres=partial(validar_solo_letras, campo='Nombres', maximo=20),
+    apellidos=partial(validar_solo_letras, campo='Apellidos', maximo=20),
+    email=validar_email,
+    telefono=validar_telefono,
+)
+
+ESQUEMA_CLIENTE = Esquema(
+    nombres=partial(validar_solo_letras, campo='Nombres'),
+    apellidos=partial(validar_solo_letras, campo='Apellidos'),
+    email=validar_email,
+    telefono=validar_telefono,
+    direccion=validar_direccion,
+    observaciones=validar_observaciones,
+)
+
+ESQUEMA_AUTOR = Esquema(
+    nombres=partial(validar_solo_letras, campo='Nombres'),
+    apellidos=partial(validar_solo_letras, campo='Apellidos'),
+    nacionalidad=validar_nacionalidad,
+    fecha_nacimiento=validar_fecha_nacimiento,
+)
+
+ESQUEMA_CATEGORIA = Esquema(
+    nombre=validar_nombre_categoria,
+    descripcion=validar_descripcion_categoria,
+)
+
+ESQUEMA_TIPO_DOCUMENTO = Esquema(
+    nombre=validar_nombre_tipo_documento,
+    descripcion=validar_descripcion_tipo_documento,
+)
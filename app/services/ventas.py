@@ -0,0 +1,255 @@
+"""
+Registro de ventas.
+
+procesar_venta registra un carrito en una sola transacción:
+
+1. Precios y disponibilidad de los libros del carrito (una consulta).
+2. Salida de stock de cada línea con registrar_movimientos, en orden de
+   (libro, sucursal, formato): todas las ventas bloquean Stock_Actual y
+   Libros en el mismo orden, así que dos ventas con libros en común se
+   esperan pero no se interbloquean.
+3. INSERT de Venta, Detalle_Venta (todas las líneas en un executemany),
+   Inventarios y Facturas_Sar.
+4. Resúmenes de ventas del día (app/services/resumenes.py).
+
+Los IDs y después el número de factura (app/services/facturacion.py) se
+toman antes de empezar; ambos se reservan por bloques en transacciones
+propias, así que ninguna fila es compartida por todas las ventas de la
+sucursal. Si la venta no se confirma el número se devuelve para la
+siguiente (un ID sin usar solo deja un hueco).
+
+Si la base elige la transacción como víctima de un interbloqueo o de un
+conflicto de serialización, se deshace y se repite hasta VENTA_REINTENTOS
+veces con los mismos IDs y el mismo número. Si el número ya tiene Venta
+(el bloque lo adoptó otro worker) se descarta junto con su bloque y el
+reintento usa un número nuevo; devolverlo lo volvería a entregar.
+"""
+import random
+import time
+from collections import namedtuple
+from datetime import datetime
+from decimal import InvalidOperation
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from app.services.facturacion import SinNumerosDisponibles, formatear_factura, numeros_factura
+from app.services.ids import siguiente_id
+from app.services.impuestos import a_centavos, a_decimal, calcular_venta, reglas_vigentes
+from app.services.inventario import FISICO, normalizar_formato, registrar_movimientos
+from app.services.resumenes import descontar_venta, sumar_venta
+
+REINTENTOS = 3
+
+# SQLSTATE / mensajes de conflictos que se resuelven repitiendo la transacción
+# (1205: víctima de interbloqueo en SQL Server; SQLite: base bloqueada)
+_CONFLICTOS = ('40001', '1205', 'deadlock', 'database is locked')
+
+ResultadoVenta = namedtuple('ResultadoVenta', 'id_venta numero_factura totales movimientos intentos')
+
+
+class VentaRechazada(Exception):
+    """El carrito no se puede vender (vacío, libro inexistente o no disponible, descuento inválido, sin CAI vigente)"""
+
+
+def es_conflicto(error):
+    """¿El error de la base se resuelve repitiendo la transacción?"""
+    if not isinstance(error, DBAPIError) or error.connection_invalidated:
+        return False
+    original = getattr(error, 'orig', None)
+    codigos = [str(a) for a in getattr(original, 'args', ())[:1]]
+    texto = str(original).lower()
+    return any(c in codigos or c in texto for c in _CONFLICTOS)
+
+
+def es_numero_repetido(error):
+    """¿Falló el INSERT de Venta porque el número de factura ya existe (UX_Venta_numero_factura)?"""
+    return isinstance(error, IntegrityError) and 'numero_factura' in str(getattr(error, 'orig', error)).lower()
+
+
+def _lineas(carrito):
+    """[(id_libro, formato, cantidad)] sin repetidos, en orden de bloqueo"""
+    lineas = {}
+    for item in carrito:
+        if isinstance(item, dict):
+            id_libro, cantidad, formato = item['id_libro'], item['cantidad'], item.get('formato', FISICO)
+        else:
+            id_libro, cantidad = item
+            formato = FISICO
+        cantidad = int(cantidad)
+        if cantidad <= 0:
+            raise VentaRechazada(f'Cantidad inválida para el libro {id_libro}: {cantidad}')
+        clave = (int(id_libro), normalizar_formato(formato))
+        lineas[clave] = lineas.get(clave, 0) + cantidad
+    if not lineas:
+        raise VentaRechazada('El carrito está vacío')
+    return [(id_libro, formato, cantidad) for (id_libro, formato), cantidad in sorted(lineas.items())]
+
+
+def _descuento(descuento):
+    """Descuento en centavos; VentaRechazada si no es un importe mayor o igual a cero"""
+    try:
+        centavos = a_centavos(descuento or 0)
+    except (InvalidOperation, ValueError):
+        raise VentaRechazada(f'Descuento inválido: {descuento}') from None
+    if centavos < 0:
+        raise VentaRechazada(f'El descuento no puede ser negativo: {descuento}')
+    return centavos
+
+
+def _precios(sesion, lineas):
+    from models import Libros
+
+    ids = {id_libro for id_libro, _, _ in lineas}
+    filas = sesion.execute(
+        select(Libros.id_libro, Libros.precio_venta, Libros.disp_venta).where(Libros.id_libro.in_(ids))
+    ).all()
+    precios = {}
+    for id_libro, precio, disponible in filas:
+        if disponible == 0:
+            raise VentaRechazada(f'El libro {id_libro} no está disponible para la venta')
+        precios[id_libro] = a_centavos(precio)
+    faltantes = ids - precios.keys()
+    if faltantes:
+        raise VentaRechazada(f'Libros inexistentes: {", ".join(map(str, sorted(faltantes)))}')
+    return precios
+
+
+def _registrar(sesion, lineas, ids, numero, id_sucursal, id_empleado, id_cliente, id_metodo_pago, id_estado,
+               descuento, exoneracion):
+    """descuento: centavos, ya validado por _descuento"""
+    from models import DetalleVenta, FacturasSar, Venta
+
+    ahora = datetime.now()
+    precios = _precios(sesion, lineas)
+    referencia = f'venta:{ids["venta"]}'
+    movimientos = registrar_movimientos(
+        [{'id_libro': id_libro, 'id_sucursal': id_sucursal, 'formato': formato, 'cantidad': -cantidad,
+          'tipo_movimiento': 'venta', 'motivo': 'Venta', 'referencia': referencia}
+         for id_libro, formato, cantidad in lineas],
+        id_empleado, sesion=sesion, ids=ids['inventario'],
+    )
+
+    detalles = [
+        {'id_detalle': id_detalle, 'id_venta': ids['venta'], 'id_libro': id_libro, 'cantidad': cantidad,
+         'precio_unitario': a_decimal(precios[id_libro]), 'subtotal': a_decimal(precios[id_libro] * cantidad)}
+        for id_detalle, (id_libro, _, cantidad) in zip(ids['detalle'], lineas)
+    ]
+    totales = calcular_venta([(id_libro, cantidad, precios[id_libro]) for id_libro, _, cantidad in lineas],
+                             reglas_vigentes(), descuento, bool(exoneracion))
+    importes = {campo: a_decimal(valor) for campo, valor in totales._asdict().items()}
+
+    cai, numero_factura = numero.cai, numero.texto
+    sesion.execute(insert(Venta), [{
+        'id_venta': ids['venta'], 'id_cliente': id_cliente, 'id_empleado': id_empleado,
+        'id_metodo_pago': id_metodo_pago, 'id_estado': id_estado, 'fecha_venta': ahora, **importes,
+        'exonerado': 1 if exoneracion else 0, 'numero_factura': numero_factura,
+        'numero_reg_exoneracion': exoneracion or '', 'numero_reg_sag': '',
+    }])
+    sesion.execute(insert(DetalleVenta), detalles)
+    sesion.execute(insert(FacturasSar), [{
+        'id_parametro': ids['factura'], 'id_venta': ids['venta'], 'id_sucursal': id_sucursal, 'cai': cai.cai,
+        # rango_inicial es DATE en el esquema: se guarda la fecha de autorización del CAI
+        'rango_inicial': cai.fecha_autorizacion, 'fecha_emision': ahora.date(),
+        'rango_final': formatear_factura(cai.prefijo, cai.rango_final), 'rtn_empresa': cai.rtn_empresa,
+        'anulada': 0, 'ultima_factura': numero_factura,
+    }])
+    sumar_venta(sesion, ahora.date(), id_sucursal, id_empleado, id_metodo_pago, importes,
+                [(d['id_libro'], d['cantidad'], d['subtotal']) for d in detalles])
+    return ResultadoVenta(ids['venta'], numero_factura, importes, movimientos, 0)
+
+
+def _tomar_numero(id_sucursal):
+    try:
+        return numeros_factura.tomar(id_sucursal)
+    except SinNumerosDisponibles as error:
+        raise VentaRechazada(str(error)) from error
+
+
+def procesar_venta(carrito, id_sucursal, id_empleado, id_cliente, id_metodo_pago, id_estado=None, descuento=0,
+                   exoneracion=None, sesion=None, reintentos=None):
+    """
+    Registrar y confirmar la venta de `carrito` ([(id_libro, cantidad)] o
+    dicts con id_libro, cantidad y formato opcional). `descuento` es un
+    importe; `exoneracion`, el número de registro de exoneración del
+    cliente (la venta no paga ISV). Totales: app/services/impuestos.py.
+    Lanza VentaRechazada o StockInsuficiente sin dejar nada escrito.
+    """
+    from flask import current_app
+    from app import db
+    from models import DetalleVenta, FacturasSar, Inventarios, Venta
+
+    sesion = sesion or db.session
+    if id_estado is None:
+        id_estado = current_app.config.get('VENTA_ESTADO', 1)
+    if reintentos is None:
+        reintentos = current_app.config.get('VENTA_REINTENTOS', REINTENTOS)
+    lineas = _lineas(carrito)
+    descuento = _descuento(descuento)
+    # Los IDs antes que el número: si la reserva de IDs falla no queda un número tomado sin devolver
+    ids = {
+        'venta': siguiente_id(Venta),
+        'factura': siguiente_id(FacturasSar),
+        'detalle': [siguiente_id(DetalleVenta) for _ in lineas],
+        'inventario': [siguiente_id(Inventarios) for _ in lineas],
+    }
+    numero = _tomar_numero(id_sucursal)
+
+    for intento in range(1, reintentos + 2):
+        try:
+            resultado = _registrar(sesion, lineas, ids, numero, id_sucursal, id_empleado, id_cliente,
+                                   id_metodo_pago, id_estado, descuento, exoneracion)
+            sesion.commit()
+        except DBAPIError as error:
+            sesion.rollback()
+            if es_numero_repetido(error):
+                # Devolverlo lo entregaría otra vez: se descarta con su bloque
+                numeros_factura.descartar(numero)
+                if intento > reintentos:
+                    raise
+                numero = _tomar_numero(id_sucursal)
+                continue
+            if intento > reintentos or not es_conflicto(error):
+                numeros_factura.devolver(numero)
+                raise
+            # Espera creciente con variación para que los reintentos no choquen de nuevo
+            time.sleep(random.uniform(0, 0.02 * 2 ** intento))
+        except BaseException:
+            sesion.rollback()
+            numeros_factura.devolver(numero)
+            raise
+        else:
+            numeros_factura.confirmar(numero)
+            return resultado._replace(intentos=intento)
+
+
+def anular_venta(id_venta, sesion=None):
+    """
+    Marcar anulada la factura de la venta y descontarla de los resúmenes en
+    una transacción. Devuelve False si ya estaba anulada; LookupError si la
+    venta no tiene Facturas_Sar. El stock no se devuelve aquí.
+    """
+    from app import db
+    from models import FacturasSar
+
+    sesion = sesion or db.session
+    try:
+        # El UPDATE bloquea la factura: dos anulaciones simultáneas no descuentan dos veces
+        id_sucursal = sesion.execute(
+            update(FacturasSar).where(FacturasSar.id_venta == id_venta, FacturasSar.anulada == 0)
+            .values(anulada=1, fecha_anulacion=datetime.now())
+            .returning(FacturasSar.id_sucursal)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        if id_sucursal is None:
+            existe = sesion.execute(select(FacturasSar.id_parametro).where(FacturasSar.id_venta == id_venta)).first()
+            if existe is None:
+                raise LookupError(f'La venta {id_venta} no tiene factura')
+            sesion.rollback()
+            return False
+        descontar_venta(sesion, id_venta, id_sucursal)
+        sesion.commit()
+    except BaseException:
+        sesion.rollback()
+        raise
+    return True
@@ -17,4 +17,77 @@ class Config:
     # IMPORTANTE: Genera una clave única y NUNCA la cambies después de tener usuarios
     # Para generar una nueva: python -c "import secrets; print(secrets.token_hex(32))"
     PEPPER_SECRET = os.environ.get('PEPPER_SECRET') or '0ec68042c99439c9cb759e6150bc0306492a4362c4e4fba79a3ec932e41d9bfd'
-    # ⚠️ REEMPLAZA el valor por defecto con uno generado usando el comando de arriba
\ No newline at end of file
+    # ⚠️ REEMPLAZA el valor por defecto con uno generado usando el comando de arriba
+
+    # Pool de procesos para hash de contraseñas (bcrypt)
+    # PASSWORD_POOL_WORKERS = 0 ejecuta el hash en el hilo de la petición
+    PASSWORD_POOL_WORKERS = int(os.environ.get('PASSWORD_POOL_WORKERS', 2))
+    PASSWORD_POOL_MAX_PENDING = int(os.environ.get('PASSWORD_POOL_MAX_PENDING', 16))
+    PASSWORD_POOL_TIMEOUT = float(os.environ.get('PASSWORD_POOL_TIMEOUT', 10))
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+
+    # Límite de intentos fallidos de login (ventana deslizante, en segundos)
+    LOGIN_MAX_INTENTOS_EMAIL = int(os.environ.get('LOGIN_MAX_INTENTOS_EMAIL', 5))
+    LOGIN_MAX_INTENTOS_IP = int(os.environ.get('LOGIN_MAX_INTENTOS_IP', 20))
+    LOGIN_THROTTLE_VENTANA = int(os.environ.get('LOGIN_THROTTLE_VENTANA', 900))
+    LOGIN_THROTTLE_MAX_CLAVES = int(os.environ.get('LOGIN_THROTTLE_MAX_CLAVES', 10000))
+    # Backend compartido entre workers (opcional), ej: redis://localhost:6379/0
+    LOGIN_THROTTLE_REDIS_URL = os.environ.get('LOGIN_THROTTLE_REDIS_URL')
+
+    # Cache del usuario autenticado (por worker)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_MAX = int(os.environ.get('USER_CACHE_MAX', 5000))
+
+    # Segundos entre lecturas de Versiones_Catalogo (recarga perezosa de catálogos)
+    CATALOGOS_INTERVALO = float(os.environ.get('CATALOGOS_INTERVALO', 5))
+
+    # Cantidad de IDs que cada worker reserva por viaje a la tabla Secuencias
+    ID_BLOQUE = int(os.environ.get('ID_BLOQUE', 20))
+
+    # Filtro Bloom por worker de emails registrados (tasa de falsos positivos y
+    # segundos entre reconstrucciones desde Clientes.email_normalizado)
+    EMAIL_BLOOM_TASA = float(os.environ.get('EMAIL_BLOOM_TASA', 0.01))
+    EMAIL_BLOOM_TTL = int(os.environ.get('EMAIL_BLOOM_TTL', 600))
+
+    # Detección de posibles duplicados (Autores / Clientes): segundos entre
+    # reconstrucciones del índice en memoria y similitud mínima (0-1)
+    DUPLICADOS_TTL = int(os.environ.get('DUPLICADOS_TTL', 300))
+    DUPLICADOS_UMBRAL = float(os.environ.get('DUPLICADOS_UMBRAL', 0.75))
+
+    # Segundos que cada worker reutiliza los conteos de uso de los listados
+    # (libros por categoría, clientes por estado, documentos por tipo)
+    CONTEOS_TTL = int(os.environ.get('CONTEOS_TTL', 60))
+
+    # Cortes del libro mayor de inventario (flask cortes-inventario): horas entre
+    # cortes, segundos de margen para transacciones abiertas y días de
+    # movimientos que flask compactar-inventario deja en Inventarios
+    INVENTARIO_CORTE_HORAS = int(os.environ.get('INVENTARIO_CORTE_HORAS', 24))
+    INVENTARIO_CORTE_MARGEN = int(os.environ.get('INVENTARIO_CORTE_MARGEN', 300))
+    INVENTARIO_CONSERVAR_DIAS = int(os.environ.get('INVENTARIO_CONSERVAR_DIAS', 90))
+
+    # Ventas: Estado_Venta de las ventas nuevas y reintentos ante interbloqueos
+    VENTA_ESTADO = int(os.environ.get('VENTA_ESTADO', 1))
+    VENTA_REINTENTOS = int(os.environ.get('VENTA_REINTENTOS', 3))
+
+    # Números de factura que cada worker reserva del CAI por viaje y segundos
+    # sin renovar tras los que sus números sin usar pasan a otro worker
+    FACTURA_BLOQUE = int(os.environ.get('FACTURA_BLOQUE', 10))
+    FACTURA_LEASE = int(os.environ.get('FACTURA_LEASE', 900))
+
+    # ISV en puntos básicos (1500 = 15 %) y libros (IDs separados por coma) con
+    # tasa del 18 % o exentos; el resto paga la tasa general
+    ISV_TASA_15 = int(os.environ.get('ISV_TASA_15', 1500))
+    ISV_TASA_18 = int(os.environ.get('ISV_TASA_18', 1800))
+    ISV_LIBROS_18 = os.environ.get('ISV_LIBROS_18', '')
+    ISV_LIBROS_EXENTOS = os.environ.get('ISV_LIBROS_EXENTOS', '')
+
+    # Segundos que cada worker reutiliza los libros más vendidos de un período
+    # que incluye hoy y de uno ya cerrado (app/services/top_ventas.py)
+    TOP_VENTAS_TTL = int(os.environ.get('TOP_VENTAS_TTL', 300))
+    TOP_VENTAS_TTL_CERRADO = int(os.environ.get('TOP_VENTAS_TTL_CERRADO', 3600))
+
+    # Importación masiva por la web (filas máximas por archivo); para cargas
+    # mayores usar `flask importar-autores` / `flask importar-clientes`
+    IMPORTACION_MAX_FILAS_WEB = int(os.environ.get('IMPORTACION_MAX_FILAS_WEB', 5000))
+    # Clientes requiere un bcrypt por fila: límite menor para no exceder el timeout HTTP
+    IMPORTACION_MAX_CLIENTES_WEB = int(os.environ.get('IMPORTACION_MAX_CLIENTES_WEB', 500))
@@ -1,15 +1,14 @@
 from app import create_app, db
 from models import Clientes
-from werkzeug.security import generate_password_hash
+from app.services.passwords import hash_password
+from app.services.ids import siguiente_id
 from datetime import datetime
-from sqlalchemy import func
 
 app = create_app()
 
 with app.app_context():
-    # Obtener el último ID y sumar 1
-    ultimo_id = db.session.query(func.max(Clientes.id_cliente)).scalar()
-    nuevo_id = (ultimo_id or 0) + 1
+    # Reservar el siguiente ID desde la tabla Secuencias
+    nuevo_id = siguiente_id(Clientes)
     
     # Crear usuario admin
     nuevo_admin = Clientes(
@@ -17,7 +16,7 @@ with app.app_context():
         nombres="Admin",
         apellidos="Sistema",
         email="admin@biblioteca.com",
-        password_hash=generate_password_hash("admin123"),
+        password_hash=hash_password("admin123"),
         telefono="99999999",
         direccion="Oficina Principal",
         tipo_usuario="admin",  # Usuario administrador
@@ -2,7 +2,7 @@ from typing import Any, Optional
 import datetime
 import decimal
 from flask_login import UserMixin
-from sqlalchemy import Boolean, DECIMAL, Date, DateTime, ForeignKeyConstraint, Identity, Index, Integer, LargeBinary, PrimaryKeyConstraint, String, TEXT, Unicode, text
+from sqlalchemy import Boolean, Computed, DECIMAL, Date, DateTime, ForeignKeyConstraint, Identity, Index, Integer, LargeBinary, PrimaryKeyConstraint, String, TEXT, Unicode, text
 from sqlalchemy.dialects.mssql import MONEY, TINYINT
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -183,7 +183,8 @@ class Clientes(Base, UserMixin):
     __tablename__ = 'Clientes'
     __table_args__ = (
         ForeignKeyConstraint(['id_estado'], ['Estado_Usuarios.id_estado'], name='FK_Clientes_Estado_Usuarios'),
-        PrimaryKeyConstraint('id_cliente', name='PK_Usuarios')
+        PrimaryKeyConstraint('id_cliente', name='PK_Usuarios'),
+        Index('UX_Clientes_email_normalizado', 'email_normalizado', unique=True)
     )
 
     id_cliente: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
@@ -198,6 +199,8 @@ class Clientes(Base, UserMixin):
     ot: Mapped[int] = mapped_column(TINYINT, nullable=False)
     id_estado: Mapped[int] = mapped_column(Integer, nullable=False)
     observaciones: Mapped[Optional[str]] = mapped_column(TEXT(2147483647, 'Modern_Spanish_CI_AS'))
+    # Columna de soporte (flask crear-tablas-soporte): email en minúsculas y sin espacios, indexado
+    email_normalizado: Mapped[str] = mapped_column(String(100, 'Modern_Spanish_CI_AS'), Computed('lower(ltrim(rtrim(email)))', persisted=True))
 
     Estado_Usuarios: Mapped['EstadoUsuarios'] = relationship('EstadoUsuarios', back_populates='Clientes')
     Clientes_Documento: Mapped[list['ClientesDocumento']] = relationship('ClientesDocumento', back_populates='Clientes_')
@@ -669,3 +672,217 @@ class RespuestaTicket(Base):
     Clientes_: Mapped[Optional['Clientes']] = relationship('Clientes', back_populates='Respuesta_Ticket')
     Empleados_: Mapped[Optional['Empleados']] = relationship('Empleados', back_populates='Respuesta_Ticket')
     Tickets_: Mapped['Tickets'] = relationship('Tickets', back_populates='Respuesta_Ticket')
+
+
+# ---------------------------------------------------------------------------
+# Tablas de soporte de la aplicación (no generadas por sqlacodegen).
+# Se crean con: flask crear-tablas-soporte
+# ---------------------------------------------------------------------------
+
+class VersionesCatalogo(Base):
+    __tablename__ = 'Versiones_Catalogo'
+    __table_args__ = (
+        PrimaryKeyConstraint('tabla', name='PK_Versiones_Catalogo'),
+    )
+
+    tabla: Mapped[str] = mapped_column(String(100), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text('((0))'))
+
+
+class Secuencias(Base):
+    __tablename__ = 'Secuencias'
+    __table_args__ = (
+        PrimaryKeyConstraint('nombre', name='PK_Secuencias'),
+    )
+
+    nombre: Mapped[str] = mapped_column(String(100), primary_key=True)
+    siguiente: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+# Stock vigente por (libro, sucursal, formato); lo mantiene app/services/inventario.py
+class StockActual(Base):
+    __tablename__ = 'Stock_Actual'
+    __table_args__ = (
+        PrimaryKeyConstraint('id_libro', 'id_sucursal', 'formato', name='PK_Stock_Actual'),
+    )
+
+    id_libro: Mapped[int] = mapped_column(Integer, primary_key=True)
+    id_sucursal: Mapped[int] = mapped_column(Integer, primary_key=True)
+    formato: Mapped[str] = mapped_column(String(50), primary_key=True)
+    stock: Mapped[int] = mapped_column(Integer, nullable=False)
+    id_ultimo_movimiento: Mapped[Optional[int]] = mapped_column(Integer)
+    fecha_actualizacion: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+
+
+# Cortes periódicos del libro mayor (app/services/cortes.py). Cada corte guarda
+# el saldo de las claves que tuvieron movimientos desde el corte anterior
+class InventarioCortes(Base):
+    __tablename__ = 'Inventario_Cortes'
+    __table_args__ = (
+        PrimaryKeyConstraint('id_corte', name='PK_Inventario_Cortes'),
+        Index('UX_Inventario_Cortes_fecha', 'fecha_corte', unique=True),
+    )
+
+    id_corte: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    fecha_corte: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    fecha_creacion: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    movimientos: Mapped[int] = mapped_column(Integer, nullable=False)
+    claves: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Los movimientos hasta fecha_corte se están moviendo (o ya se movieron) a Inventarios_Archivo
+    archivado: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default=text('((0))'))
+
+
+class InventarioCorteStock(Base):
+    __tablename__ = 'Inventario_Corte_Stock'
+    __table_args__ = (
+        PrimaryKeyConstraint('id_sucursal', 'id_libro', 'formato', 'id_corte', name='PK_Inventario_Corte_Stock'),
+        Index('IX_Inventario_Corte_Stock_corte', 'id_corte'),
+    )
+
+    id_sucursal: Mapped[int] = mapped_column(Integer, primary_key=True)
+    id_libro: Mapped[int] = mapped_column(Integer, primary_key=True)
+    formato: Mapped[str] = mapped_column(String(50), primary_key=True)
+    id_corte: Mapped[int] = mapped_column(Integer, primary_key=True)
+    stock: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+# Movimientos de Inventarios anteriores a un corte archivado (flask compactar-inventario)
+class InventariosArchivo(Base):
+    __tablename__ = 'Inventarios_Archivo'
+    __table_args__ = (
+        PrimaryKeyConstraint('id_inventario', name='PK_Inventarios_Archivo'),
+        Index('IX_Inventarios_Archivo_clave', 'id_sucursal', 'id_libro', 'formato', 'fecha_movimiento'),
+    )
+
+    id_inventario: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    id_libro: Mapped[int] = mapped_column(Integer, nullable=False)
+    id_sucursal: Mapped[int] = mapped_column(Integer, nullable=False)
+    tipo_movimiento: Mapped[str] = mapped_column(String(200, 'Modern_Spanish_CI_AS'), nullable=False)
+    cantidad: Mapped[int] = mapped_column(Integer, nullable=False)
+    stock_anterior: Mapped[int] = mapped_column(Integer, nullable=False)
+    stock_nuevo: Mapped[int] = mapped_column(Integer, nullable=False)
+    formato: Mapped[str] = mapped_column(String(200, 'Modern_Spanish_CI_AS'), nullable=False)
+    fecha_movimiento: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    id_empleado: Mapped[int] = mapped_column(Integer, nullable=False)
+    motivo: Mapped[str] = mapped_column(TEXT(2147483647, 'Modern_Spanish_CI_AS'), nullable=False)
+    observaciones: Mapped[Optional[str]] = mapped_column(TEXT(2147483647, 'Modern_Spanish_CI_AS'))
+    referencia: Mapped[Optional[str]] = mapped_column(String(100, 'Modern_Spanish_CI_AS'))
+    id_corte: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+# Rangos de facturación autorizados por el SAR (CAI) por sucursal. Los
+# números se reservan por bloques (Facturas_Bloques) y los entrega
+# app/services/facturacion.py; ultimo_numero es el último reservado
+class CaiSucursales(Base):
+    __tablename__ = 'Cai_Sucursales'
+    __table_args__ = (
+        PrimaryKeyConstraint('id_cai', name='PK_Cai_Sucursales'),
+        Index('IX_Cai_Sucursales_sucursal', 'id_sucursal', 'activo'),
+    )
+
+    id_cai: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    id_sucursal: Mapped[int] = mapped_column(Integer, nullable=False)
+    cai: Mapped[str] = mapped_column(String(50), nullable=False)
+    rtn_empresa: Mapped[str] = mapped_column(String(20), nullable=False)
+    # Establecimiento-punto de emisión-tipo de documento, ej. 001-001-01
+    prefijo: Mapped[str] = mapped_column(String(20), nullable=False)
+    rango_inicial: Mapped[int] = mapped_column(Integer, nullable=False)
+    rango_final: Mapped[int] = mapped_column(Integer, nullable=False)
+    ultimo_numero: Mapped[int] = mapped_column(Integer, nullable=False)
+    fecha_autorizacion: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    fecha_limite: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    activo: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default=text('((1))'))
+
+
+# Bloque de números de un CAI reservado por un worker (titular). Los números
+# sin Venta de un bloque cuyo titular ya no renueva se reasignan
+class FacturasBloques(Base):
+    __tablename__ = 'Facturas_Bloques'
+    __table_args__ = (
+        PrimaryKeyConstraint('id_bloque', name='PK_Facturas_Bloques'),
+        Index('IX_Facturas_Bloques_cai', 'id_cai', 'cerrado'),
+    )
+
+    id_bloque: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    id_cai: Mapped[int] = mapped_column(Integer, nullable=False)
+    desde: Mapped[int] = mapped_column(Integer, nullable=False)
+    hasta: Mapped[int] = mapped_column(Integer, nullable=False)
+    titular: Mapped[Optional[str]] = mapped_column(String(100))
+    fecha_reserva: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    fecha_renovacion: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    # Todos sus números tienen Venta
+    cerrado: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default=text('((0))'))
+
+
+# Ventas agregadas por día (app/services/resumenes.py). Se actualizan en la
+# transacción de cada venta y de cada anulación; flask reconstruir-resumenes
+# las recalcula desde Venta, Detalle_Venta y Facturas_Sar
+class ResumenVentasDia(Base):
+    __tablename__ = 'Resumen_Ventas_Dia'
+    __table_args__ = (
+        PrimaryKeyConstraint('fecha', 'id_sucursal', 'id_empleado', 'id_metodo_pago', name='PK_Resumen_Ventas_Dia'),
+    )
+
+    fecha: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    id_sucursal: Mapped[int] = mapped_column(Integer, primary_key=True)
+    id_empleado: Mapped[int] = mapped_column(Integer, primary_key=True)
+    id_metodo_pago: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Ventas no anuladas (los importes son solo de estas) y anuladas
+    ventas: Mapped[int] = mapped_column(Integer, nullable=False)
+    anuladas: Mapped[int] = mapped_column(Integer, nullable=False)
+    unidades: Mapped[int] = mapped_column(Integer, nullable=False)
+    subtotal: Mapped[decimal.Decimal] = mapped_column(DECIMAL(14, 2), nullable=False)
+    descuento: Mapped[decimal.Decimal] = mapped_column(DECIMAL(14, 2), nullable=False)
+    isv_15: Mapped[decimal.Decimal] = mapped_column(DECIMAL(14, 2), nullable=False)
+    isv_18: Mapped[decimal.Decimal] = mapped_column(DECIMAL(14, 2), nullable=False)
+    importe_exonerado: Mapped[decimal.Decimal] = mapped_column(DECIMAL(14, 2), nullable=False)
+    total: Mapped[decimal.Decimal] = mapped_column(DECIMAL(14, 2), nullable=False)
+
+
+class ResumenVentasLibro(Base):
+    __tablename__ = 'Resumen_Ventas_Libro'
+    __table_args__ = (
+        PrimaryKeyConstraint('fecha', 'id_libro', name='PK_Resumen_Ventas_Libro'),
+    )
+
+    fecha: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    id_libro: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Ventas no anuladas que incluyen el libro, unidades e importe (subtotal de las líneas)
+    ventas: Mapped[int] = mapped_column(Integer, nullable=False)
+    unidades: Mapped[int] = mapped_column(Integer, nullable=False)
+    importe: Mapped[decimal.Decimal] = mapped_column(DECIMAL(14, 2), nullable=False)
+
+
+TABLAS_SOPORTE = [
+    VersionesCatalogo.__table__,
+    Secuencias.__table__,
+    StockActual.__table__,
+    InventarioCortes.__table__,
+    InventarioCorteStock.__table__,
+    InventariosArchivo.__table__,
+    CaiSucursales.__table__,
+    FacturasBloques.__table__,
+    ResumenVentasDia.__table__,
+    ResumenVentasLibro.__table__,
+]
+
+# Columnas de soporte agregadas a tablas existentes, con sus índices
+COLUMNAS_SOPORTE = [
+    (Clientes.__table__.c.email_normalizado, 'UX_Clientes_email_normalizado'),
+]
+
+# Índices de soporte sobre tablas existentes
+INDICES_SOPORTE = [
+    # Recorrido ordenado del libro mayor por sucursal (flask conciliar-inventario)
+    Index('IX_Inventarios_conciliacion', Inventarios.id_sucursal, Inventarios.id_libro, Inventarios.formato,
+          Inventarios.fecha_movimiento, Inventarios.id_inventario),
+    # Movimientos entre dos cortes y compactación (app/services/cortes.py)
+    Index('IX_Inventarios_fecha', Inventarios.fecha_movimiento),
+    # Un número de factura por venta; lo consulta la recuperación de bloques (app/services/facturacion.py)
+    Index('UX_Venta_numero_factura', Venta.numero_factura, unique=True),
+    # Ventas de un día (flask reconstruir-resumenes)
+    Index('IX_Venta_fecha_venta', Venta.fecha_venta),
+    # Autor con el mismo nombre al crear o editar (app/routes/autores.py)
+    Index('IX_Autores_nombre', Autores.apellidos, Autores.nombres),
+]
+
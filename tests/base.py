@@ -0,0 +1,79 @@
+"""
+App de pruebas sobre un archivo SQLite.
+
+La usan conftest.py y los procesos hijos de las pruebas de concurrencia,
+que arman su propia app con el mismo archivo. Las tablas se crean desde
+la copia de la metadata de app/services/banco_pruebas.py (tipos de SQLite,
+sin collations); la metadata de models.py queda intacta.
+"""
+import decimal
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, insert
+
+
+def _pragmas(conexion, registro):
+    # WAL: varios procesos comparten el archivo
+    conexion.execute('PRAGMA journal_mode=WAL')
+    conexion.execute('PRAGMA busy_timeout=60000')
+
+
+def crear_app(ruta_db, **config):
+    """App con la base en el archivo `ruta_db`; `config` sobrescribe valores de Config"""
+    from app import create_app, db
+    from config import Config
+
+    sqlite3.register_adapter(decimal.Decimal, str)
+    valores = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{ruta_db}',
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 60}},
+        'PASSWORD_POOL_WORKERS': 0,
+        'WTF_CSRF_ENABLED': False,
+        'TESTING': True,
+        'BCRYPT_ROUNDS': 4,
+        **config,
+    }
+    app = create_app(type('ConfigPruebas', (Config,), valores))
+    with app.app_context():
+        event.listen(db.engine, 'connect', _pragmas)
+    return app
+
+
+def crear_tablas(app):
+    from app import db
+    from app.services.banco_pruebas import esquema_sqlite
+
+    with app.app_context():
+        esquema_sqlite().create_all(db.engine)
+
+
+def sembrar_tienda(app, sucursales=2, libros=20, stock=10 ** 6, rango_final=10 ** 6):
+    """Sucursales 1..n con un CAI vigente cada una y libros 1..m con stock físico en todas"""
+    from app import db
+    from models import CaiSucursales, Libros, StockActual, Sucursales
+
+    hoy = date.today()
+    with app.app_context():
+        db.session.execute(insert(Sucursales), [
+            dict(id_sucursal=s, nombre=f'Sucursal {s}', direccion='-', telefono='-', email='-', ciudad='-',
+                 departamento='-', codigo_postal='-', activo=1)
+            for s in range(1, sucursales + 1)
+        ])
+        db.session.execute(insert(Libros), [
+            dict(id_libro=l, isbn=str(l), titulo=f'Libro {l}', formato='Físico', num_pag=100,
+                 stock_fisico=stock * sucursales, stock_digital=0, precio_venta=100 + l % 37,
+                 precio_prestamo=1, disp_venta=1)
+            for l in range(1, libros + 1)
+        ])
+        db.session.execute(insert(StockActual), [
+            dict(id_libro=l, id_sucursal=s, formato='fisico', stock=stock, fecha_actualizacion=datetime.now())
+            for l in range(1, libros + 1) for s in range(1, sucursales + 1)
+        ])
+        db.session.execute(insert(CaiSucursales), [
+            dict(id_cai=s, id_sucursal=s, cai=f'CAI-{s}', rtn_empresa='08011999000001', prefijo=f'{s:03d}-001-01',
+                 rango_inicial=1, rango_final=rango_final, ultimo_numero=0, fecha_autorizacion=hoy,
+                 fecha_limite=hoy + timedelta(days=365), activo=True)
+            for s in range(1, sucursales + 1)
+        ])
+        db.session.commit()
@@ -0,0 +1,33 @@
+import pytest
+
+from tests.base import crear_app, crear_tablas
+
+
+@pytest.fixture
+def ruta_db(tmp_path):
+    return tmp_path / 'libreria.db'
+
+
+@pytest.fixture
+def app(ruta_db):
+    from app import db
+    from app.services.catalogos import catalogos
+    from app.services.duplicados import duplicados
+    from app.services.facturacion import numeros_factura
+    from app.services.ids import id_allocator
+    from app.services.user_cache import user_cache
+
+    app = crear_app(ruta_db)
+    crear_tablas(app)
+    # Los servicios son singletons por proceso: no arrastrar estado de otra prueba
+    id_allocator._rangos.clear()
+    duplicados._indices.clear()
+    duplicados._pendientes.clear()
+    numeros_factura._reiniciar()
+    catalogos._catalogos.clear()
+    catalogos._versiones_leidas = 0.0
+    user_cache.limpiar()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
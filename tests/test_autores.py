@@ -0,0 +1,75 @@
+"""El nombre exacto de un autor se valida contra la base, no contra el índice de duplicados."""
+from datetime import date
+
+
+def test_autor_con_nombre_no_depende_del_indice(app):
+    from app import db
+    from app.routes.autores import autor_con_nombre
+    from app.services.duplicados import duplicados
+    from models import Autores
+
+    with app.app_context():
+        assert duplicados.autores_similares('Gabriel', 'García Márquez') == []
+
+        # Otro worker crea el autor: el índice de este worker no se entera hasta el TTL
+        db.session.add(Autores(id_autor=1, nombres='Gabriel', apellidos='García Márquez',
+                               nacionalidad='Colombiana', fecha_nacimiento=date(1927, 3, 6)))
+        db.session.commit()
+
+        assert autor_con_nombre('gabriel', 'garcía márquez') is not None
+        assert autor_con_nombre('Gabriel', 'García Márquez', excluir=1) is None
+        # Nombres con las mismas palabras en otro orden son sugerencias, no el mismo nombre
+        assert autor_con_nombre('García', 'Gabriel Márquez') is None
+
+
+def _autor(id_autor, nombres, apellidos):
+    from models import Autores
+
+    return Autores(id_autor=id_autor, nombres=nombres, apellidos=apellidos,
+                   nacionalidad='Hondureña', fecha_nacimiento=date(1950, 1, 1))
+
+
+def _esperar_reconstruccion():
+    import threading
+
+    for hilo in threading.enumerate():
+        if hilo.name.startswith('duplicados-'):
+            hilo.join(10)
+
+
+def test_indice_vencido_se_reconstruye_en_segundo_plano(app):
+    from app import db
+    from app.services.duplicados import duplicados
+
+    with app.app_context():
+        db.session.add(_autor(1, 'Ramón', 'Amaya Amador'))
+        db.session.commit()
+        assert [i for _, i, _ in duplicados.autores_similares('Ramon', 'Amaya Amador')] == [1]
+
+        db.session.add(_autor(2, 'Ramón', 'Amaya Amadór'))
+        db.session.commit()
+        duplicados.ttl = 0
+        # La búsqueda responde con el índice anterior y deja la reconstrucción en un hilo
+        assert [i for _, i, _ in duplicados.autores_similares('Ramon', 'Amaya Amador')] == [1]
+        _esperar_reconstruccion()
+        duplicados.ttl = 300
+        assert [i for _, i, _ in duplicados.autores_similares('Ramon', 'Amaya Amador')] == [1, 2]
+
+
+def test_cambios_durante_la_reconstruccion_no_se_pierden(app):
+    from app import db
+    from app.services.duplicados import duplicados
+
+    with app.app_context():
+        db.session.add(_autor(1, 'Clementina', 'Suárez'))
+        db.session.commit()
+        duplicados.autores_similares('Clementina', 'Suárez')
+
+        # Reconstrucción que leyó la base antes de que este worker creara y borrara autores
+        cambios = duplicados._empezar('autores')
+        indice = duplicados.construir('autores')
+        duplicados.registrar_autor(2, 'Clementina', 'Suarez')
+        duplicados.quitar('autores', 1)
+        duplicados._instalar('autores', cambios, indice)
+
+        assert [i for _, i, _ in duplicados.autores_similares('Clementina', 'Suárez')] == [2]
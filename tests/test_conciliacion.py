@@ -0,0 +1,108 @@
+"""La conciliación por lotes encuentra las mismas diferencias que recalcular todo con SQL."""
+import random
+from collections import defaultdict
+
+from sqlalchemy import delete, func, insert, select, update
+
+from tests.base import sembrar_tienda
+
+SUCURSALES = 3
+LIBROS = 6
+
+
+def _mover_al_azar(app, semilla=0, cantidad=300):
+    from app import db
+    from app.services.inventario import StockInsuficiente, registrar_movimiento
+
+    rnd = random.Random(semilla)
+    with app.app_context():
+        for _ in range(cantidad):
+            try:
+                registrar_movimiento(rnd.randint(1, LIBROS), rnd.randint(1, SUCURSALES),
+                                     rnd.choice(('Físico', 'fisico', 'Digital')), rnd.choice((5, 3, -2, -4, 1)),
+                                     'ajuste', 1, 'prueba')
+                db.session.commit()
+            except StockInsuficiente:
+                db.session.rollback()
+
+
+def _descuadrar(app):
+    """Una diferencia de cada tipo"""
+    from app import db
+    from models import Inventarios, Libros, StockActual
+
+    with app.app_context():
+        db.session.execute(update(StockActual).values(stock=StockActual.stock + 3).where(
+            StockActual.id_libro == 1, StockActual.id_sucursal == 1, StockActual.formato == 'fisico'))
+        db.session.execute(delete(StockActual).where(
+            StockActual.id_libro == 2, StockActual.id_sucursal == 2, StockActual.formato == 'fisico'))
+        db.session.execute(insert(StockActual).values(id_libro=LIBROS, id_sucursal=1, formato='huerfano', stock=4,
+                                                      fecha_actualizacion=func.current_timestamp()))
+        db.session.execute(update(Libros).values(stock_fisico=Libros.stock_fisico + 10).where(Libros.id_libro == 3))
+        # Dos eslabones rotos en claves distintas
+        for id_libro in (4, 5):
+            id_inventario = db.session.scalar(select(Inventarios.id_inventario).where(
+                Inventarios.id_libro == id_libro).order_by(Inventarios.id_inventario).offset(2).limit(1))
+            db.session.execute(update(Inventarios).values(stock_anterior=Inventarios.stock_anterior + 1)
+                               .where(Inventarios.id_inventario == id_inventario))
+        db.session.commit()
+
+
+def _recalcular(sesion):
+    """Diferencias esperadas con consultas de conjunto sobre todo el libro mayor"""
+    from models import Inventarios, Libros, StockActual
+
+    I = Inventarios
+    clave = (I.id_libro, I.id_sucursal, I.formato)
+    saldo_previo = func.coalesce(func.sum(I.cantidad).over(
+        partition_by=clave, order_by=(I.fecha_movimiento, I.id_inventario), rows=(None, -1)), 0)
+    cadena = select(*clave, I.cantidad, I.stock_anterior, I.stock_nuevo, saldo_previo.label('saldo')).subquery()
+    esperadas = {
+        ('cadena', f.id_libro, f.id_sucursal, f.formato, f.saldo, f.stock_anterior)
+        for f in sesion.execute(select(cadena).where(
+            (cadena.c.stock_anterior != cadena.c.saldo)
+            | (cadena.c.stock_nuevo != cadena.c.stock_anterior + cadena.c.cantidad)))
+    }
+
+    saldos = dict(((l, s, f), t) for l, s, f, t in sesion.execute(
+        select(*clave, func.sum(I.cantidad)).group_by(*clave)))
+    registrados = dict(((l, s, f), t) for l, s, f, t in sesion.execute(
+        select(StockActual.id_libro, StockActual.id_sucursal, StockActual.formato, StockActual.stock)))
+    for k in saldos.keys() | registrados.keys():
+        if k not in saldos and not registrados[k]:
+            continue
+        if saldos.get(k, 0) != registrados.get(k):
+            esperadas.add(('stock_actual', *k, saldos.get(k, 0), registrados.get(k)))
+
+    por_libro = defaultdict(int)
+    for (l, _, f), t in saldos.items():
+        por_libro[(l, f)] += t
+    for l, fisico, digital in sesion.execute(select(Libros.id_libro, Libros.stock_fisico, Libros.stock_digital)):
+        for formato, registrado in (('fisico', fisico), ('digital', digital)):
+            if por_libro[(l, formato)] != registrado:
+                esperadas.add(('libro', l, None, formato, por_libro[(l, formato)], registrado))
+    return esperadas
+
+
+def test_conciliacion_igual_a_recalcular(app):
+    from app import db
+    from app.services.conciliacion import conciliar_inventario
+    from models import Inventarios
+
+    sembrar_tienda(app, sucursales=SUCURSALES, libros=LIBROS, stock=0)
+    _mover_al_azar(app)
+    with app.app_context():
+        reporte = conciliar_inventario(procesos=2, tamano_lote=7)
+    assert reporte.discrepancias == []
+
+    _descuadrar(app)
+    with app.app_context():
+        esperadas = _recalcular(db.session)
+        movimientos = db.session.scalar(select(func.count()).select_from(Inventarios))
+        reporte = conciliar_inventario(procesos=2, tamano_lote=7)
+
+    encontradas = {d[:6] for d in reporte.discrepancias}
+    assert len(encontradas) == len(reporte.discrepancias)
+    assert encontradas == esperadas
+    assert reporte.por_tipo() == {'cadena': 2, 'stock_actual': 3, 'libro': 1}
+    assert reporte.movimientos == movimientos
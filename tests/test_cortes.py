@@ -0,0 +1,84 @@
+"""Stock a una fecha con cortes y compactación: igual a sumar todo el libro mayor."""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from tests.base import sembrar_tienda
+
+INICIO = datetime(2024, 3, 1, 8, 30)
+DIAS = 10
+
+
+def _historia(app, cantidad=500, semilla=0):
+    """Movimientos repartidos en DIAS días (más uno sin cortar); el stock puede quedar negativo"""
+    from app import db
+    from models import Inventarios
+
+    rnd = random.Random(semilla)
+    with app.app_context():
+        db.session.execute(insert(Inventarios), [
+            dict(id_inventario=i, id_libro=rnd.randint(1, 4), id_sucursal=rnd.randint(1, 3),
+                 formato=rnd.choice(('fisico', 'digital')), cantidad=rnd.choice((7, 3, -2, -5, 1)),
+                 stock_anterior=0, stock_nuevo=0, tipo_movimiento='ajuste', id_empleado=1, motivo='prueba',
+                 fecha_movimiento=INICIO + timedelta(minutes=rnd.randrange((DIAS + 1) * 24 * 60)))
+            for i in range(1, cantidad + 1)
+        ])
+        db.session.commit()
+
+
+def _fechas():
+    # Justo en cada corte, un segundo antes, a mitad del día, antes de todo y después de todo
+    cortes = [datetime(2024, 3, d) for d in range(2, DIAS + 3)]
+    return ([INICIO - timedelta(days=1), INICIO + timedelta(days=DIAS + 2)] + cortes
+            + [c - timedelta(seconds=1) for c in cortes] + [c + timedelta(hours=13) for c in cortes])
+
+
+def _esperado(sesion, fecha):
+    """{(id_sucursal, id_libro, formato): stock} sumando todos los movimientos hasta `fecha`"""
+    from models import Inventarios
+
+    I = Inventarios
+    return {(s, l, f): t for s, l, f, t in sesion.execute(
+        select(I.id_sucursal, I.id_libro, I.formato, func.sum(I.cantidad))
+        .where(I.fecha_movimiento <= fecha).group_by(I.id_sucursal, I.id_libro, I.formato))}
+
+
+def _comparar(sesion, esperados):
+    from app.services.cortes import stock_a_fecha, stock_sucursal_a_fecha
+
+    for fecha, esperado in esperados.items():
+        for id_sucursal in (1, 2, 3):
+            assert stock_sucursal_a_fecha(id_sucursal, fecha, sesion) == {
+                (l, f): t for (s, l, f), t in esperado.items() if s == id_sucursal}, fecha
+        for (id_sucursal, id_libro, formato), total in esperado.items():
+            assert stock_a_fecha(id_libro, id_sucursal, fecha, formato, sesion) == total
+        assert stock_a_fecha(4, 3, fecha, 'Físico', sesion) == esperado.get((3, 4, 'fisico'), 0)
+
+
+def test_stock_a_fecha_con_cortes_y_compactacion(app):
+    from app import db
+    from app.services.cortes import compactar, tomar_cortes_pendientes
+    from models import InventarioCortes, Inventarios, InventariosArchivo
+
+    sembrar_tienda(app, sucursales=3, libros=4, stock=0)
+    _historia(app)
+    with app.app_context():
+        esperados = {fecha: _esperado(db.session, fecha) for fecha in _fechas()}
+
+        # Sin cortes todo sale del libro mayor
+        _comparar(db.session, esperados)
+
+        cortes = tomar_cortes_pendientes(intervalo_horas=24, margen_segundos=0,
+                                         ahora=datetime(2024, 3, DIAS + 1, 12), sesion=db.session)
+        assert [c.fecha_corte.day for c in cortes] == list(range(2, DIAS + 2))
+        _comparar(db.session, esperados)
+
+        # Compactar hasta el corte del día 6 en lotes chicos
+        corte, archivados = compactar(datetime(2024, 3, 6, 12), tamano_lote=17, sesion=db.session)
+        assert corte.fecha_corte == datetime(2024, 3, 6)
+        assert archivados == db.session.scalar(select(func.count()).select_from(InventariosArchivo)) > 0
+        assert db.session.scalar(select(func.min(Inventarios.fecha_movimiento))) > corte.fecha_corte
+        assert db.session.scalar(select(func.count()).select_from(InventarioCortes)
+                                 .where(InventarioCortes.archivado.is_(True))) == 1
+        _comparar(db.session, esperados)
@@ -0,0 +1,71 @@
+"""Filtro Bloom de emails: un negativo nunca oculta un email registrado."""
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, select
+
+
+def _sembrar_clientes(app, cantidad):
+    from app import db
+    from models import Clientes, EstadoUsuarios
+
+    with app.app_context():
+        db.session.add(EstadoUsuarios(id_estado=1, nombre='Activo', permite_login=1))
+        # Mayúsculas y espacios: el filtro trabaja sobre email_normalizado
+        db.session.execute(insert(Clientes), [
+            dict(id_cliente=i, nombres='N', apellidos='A', email=f' Cliente.{i}@Ejemplo.COM ' if i % 3 else f'c{i}@x.hn',
+                 password_hash='-', telefono='-', direccion='-', tipo_usuario='cliente',
+                 fecha_registro=datetime.now(), ot=0, id_estado=1)
+            for i in range(1, cantidad + 1)
+        ])
+        db.session.commit()
+
+
+def test_sin_falsos_negativos(app):
+    from app import db
+    from app.services.emails import EmailsRegistrados
+    from models import Clientes
+
+    _sembrar_clientes(app, 3000)
+    emails = EmailsRegistrados(tasa=0.01)
+    with app.app_context():
+        registrados = db.session.scalars(select(Clientes.email_normalizado)).all()
+        assert len(registrados) == 3000
+        assert all(emails.puede_existir(e) for e in registrados)
+        assert all(emails.existe(e.upper()) for e in registrados[::50])
+
+        # Los ausentes casi siempre se descartan sin consultar la base
+        ausentes = [f'nadie.{i}@ejemplo.com' for i in range(2000)]
+        falsos_positivos = sum(emails.puede_existir(e) for e in ausentes)
+        assert falsos_positivos < 2000 * 0.03
+        assert not any(emails.existe(e) for e in ausentes[:200])
+
+        # Un registro de este worker se ve de inmediato
+        emails.agregar(' Nuevo@Ejemplo.com')
+        assert emails.puede_existir('nuevo@ejemplo.com')
+
+
+def test_registro_durante_reconstruccion(app, monkeypatch):
+    from app.services.emails import EmailsRegistrados
+
+    _sembrar_clientes(app, 50)
+    emails = EmailsRegistrados(tasa=0.01, ttl=0)
+    construir = emails._construir
+
+    def construir_y_registrar():
+        filtro = construir()
+        # Llega un registro después de leer la tabla y antes de instalar el filtro nuevo
+        emails.agregar('tarde@ejemplo.com')
+        return filtro
+
+    with app.app_context():
+        assert emails.puede_existir('c3@x.hn')
+        monkeypatch.setattr(emails, '_construir', construir_y_registrar)
+        viejo = emails._filtro
+        emails.puede_existir('c3@x.hn')  # TTL vencido: reconstruye en segundo plano
+        limite = time.monotonic() + 10
+        while (emails._reconstruyendo or emails._filtro is viejo) and time.monotonic() < limite:
+            time.sleep(0.01)
+        assert emails._filtro is not viejo
+        assert 'tarde@ejemplo.com' in emails._filtro
+        assert emails.puede_existir('c3@x.hn')
@@ -0,0 +1,129 @@
+"""
+Numeración de facturas con varios procesos vendiendo a la vez, algunos
+terminados a la fuerza con bloques a medio usar: ningún número se repite
+y, tras adoptar los bloques abandonados, no quedan huecos.
+"""
+import multiprocessing
+import os
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert, select
+
+from tests.base import crear_app, sembrar_tienda
+
+SUCURSALES = 2
+LIBROS = 30
+PROCESOS = 4
+SEGUNDOS = 4
+CONFIG = {'FACTURA_BLOQUE': 7, 'FACTURA_LEASE': 3}
+
+
+def _vender(ruta_db, semilla, matar):
+    """Proceso hijo: 3 cajas vendiendo en ambas sucursales; si `matar`, termina con os._exit a mitad"""
+    app = crear_app(ruta_db, **CONFIG)
+    from app import db
+    from app.services.inventario import StockInsuficiente
+    from app.services.ventas import VentaRechazada, procesar_venta
+
+    fin = time.monotonic() + SEGUNDOS
+
+    def caja(k):
+        aleatorio = random.Random(semilla * 100 + k)
+        with app.app_context():
+            while time.monotonic() < fin:
+                # Una de cada diez pide más stock del que hay: la venta falla y devuelve su número
+                cantidad = 2 * 10 ** 6 if aleatorio.random() < .1 else aleatorio.randint(1, 3)
+                try:
+                    procesar_venta([(aleatorio.randint(1, LIBROS), cantidad)],
+                                   aleatorio.randint(1, SUCURSALES), 1, 1, 1)
+                except (StockInsuficiente, VentaRechazada):
+                    pass
+            db.session.remove()
+
+    if matar:
+        threading.Timer(matar, lambda: os._exit(9)).start()
+    cajas = [threading.Thread(target=caja, args=(k,)) for k in range(3)]
+    for c in cajas:
+        c.start()
+    for c in cajas:
+        c.join()
+
+
+def test_numeros_sin_repetidos_ni_huecos(app, ruta_db):
+    from app import db
+    from models import CaiSucursales
+
+    # Primer CAI de cada sucursal con pocos números: las ventas pasan al segundo
+    sembrar_tienda(app, sucursales=SUCURSALES, libros=LIBROS, rango_final=60)
+    hoy = date.today()
+    with app.app_context():
+        db.session.execute(insert(CaiSucursales), [
+            dict(id_cai=10 + s, id_sucursal=s, cai=f'CAI-{s}-B', rtn_empresa='08011999000001',
+                 prefijo=f'{s:03d}-002-01', rango_inicial=61, rango_final=10 ** 6, ultimo_numero=60,
+                 fecha_autorizacion=hoy, fecha_limite=hoy + timedelta(days=365), activo=True)
+            for s in range(1, SUCURSALES + 1)
+        ])
+        db.session.commit()
+
+    contexto = multiprocessing.get_context('spawn')
+    hijos = [contexto.Process(target=_vender, args=(ruta_db, i, random.Random(i).uniform(1, 3) if i % 2 else 0))
+             for i in range(PROCESOS)]
+    for hijo in hijos:
+        hijo.start()
+    for hijo in hijos:
+        hijo.join(60)
+    assert sorted(h.exitcode for h in hijos) == [0] * (PROCESOS // 2) + [9] * (PROCESOS - PROCESOS // 2)
+
+    # Este proceso hace de worker nuevo: pasado el lease adopta los bloques abandonados y los agota
+    padre = crear_app(ruta_db, **CONFIG)
+    time.sleep(CONFIG['FACTURA_LEASE'] + 0.5)
+    from app.services.facturacion import numeros_factura, numeros_sin_usar
+    from app.services.ventas import procesar_venta
+    from models import Venta
+
+    with padre.app_context():
+        for _ in range(1000):
+            abiertos = [cai for cai, _, titular, libres in numeros_sin_usar()
+                        if libres and titular != numeros_factura.titular]
+            if not abiertos:
+                break
+            procesar_venta([(1, 1)], abiertos[0].id_sucursal, 1, 1, 1)
+        else:
+            raise AssertionError('Quedaron bloques abandonados sin adoptar')
+
+        assert numeros_factura.adopciones > 0
+        numeros = db.session.scalars(select(Venta.numero_factura)).all()
+        assert len(numeros) == len(set(numeros))
+
+        propios = {(cai.id_cai, n) for cai, _, _, libres in numeros_sin_usar() for n in libres}
+        for cai in db.session.scalars(select(CaiSucursales)).all():
+            usados = {int(n.rsplit('-', 1)[1]) for n in numeros if n.startswith(cai.prefijo + '-')}
+            assert max(usados, default=cai.rango_inicial - 1) <= cai.ultimo_numero <= cai.rango_final
+            # Todo número reservado tiene venta o sigue en la cola de este worker
+            huecos = set(range(cai.rango_inicial, cai.ultimo_numero + 1)) - usados
+            if cai.rango_final == 60:
+                assert cai.ultimo_numero == 60
+            assert huecos == {n for id_cai, n in propios if id_cai == cai.id_cai}
+        numeros_factura.liberar()
+
+
+def test_bloque_adoptado_no_se_sigue_entregando(app):
+    from app.services.facturacion import NumeradorFacturas
+
+    sembrar_tienda(app, sucursales=1, libros=1)
+    with app.app_context():
+        primero, segundo = NumeradorFacturas(bloque=5, lease=1), NumeradorFacturas(bloque=5, lease=1)
+        assert primero.tomar(1).numero == 1
+
+        # El primero se demora más que el lease: el segundo adopta su bloque
+        time.sleep(1.2)
+        adoptados = [segundo.tomar(1).numero for _ in range(5)]
+        assert segundo.adopciones == 1 and adoptados == [1, 2, 3, 4, 5]
+
+        # Al renovar, el primero ve que el bloque ya no es suyo y reserva otro
+        siguientes = [primero.tomar(1).numero for _ in range(5)]
+        assert primero.perdidos == 1
+        assert siguientes == [6, 7, 8, 9, 10]
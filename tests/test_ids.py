@@ -0,0 +1,115 @@
+"""El asignador hi/lo no repite IDs entre hilos ni entre procesos."""
+import multiprocessing
+import threading
+from datetime import date
+
+from sqlalchemy import select
+
+PROCESOS = 4
+HILOS = 3
+POR_HILO = 60
+
+
+def _pedir_ids(ruta_db, semilla):
+    """Proceso hijo: HILOS hilos que piden IDs de Autores (bloques de 5) y los insertan"""
+    from tests.base import crear_app
+
+    app = crear_app(ruta_db, ID_BLOQUE=5)
+    from app import db
+    from app.services.ids import id_allocator, siguiente_id
+    from models import Autores
+
+    ids, errores = [], []
+
+    def hilo(k):
+        with app.app_context():
+            try:
+                for i in range(POR_HILO):
+                    if (semilla + k + i) % 20 == 0:
+                        nuevos = list(id_allocator.reservar_rango(Autores, 3))
+                    else:
+                        nuevos = [siguiente_id(Autores)]
+                    db.session.add_all(Autores(id_autor=n, nombres='N', apellidos=f'A{n}', nacionalidad='HN',
+                                               fecha_nacimiento=date(2000, 1, 1)) for n in nuevos)
+                    db.session.commit()
+                    ids.extend(nuevos)
+            except Exception as error:
+                db.session.rollback()
+                errores.append(repr(error))
+            finally:
+                db.session.remove()
+
+    hilos = [threading.Thread(target=hilo, args=(k,)) for k in range(HILOS)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return ids, errores
+
+
+def test_siguiente_id_sin_repetidos_entre_procesos(app, ruta_db):
+    from app import db
+    from models import Autores, Secuencias
+
+    # La secuencia se siembra desde el MAX existente
+    with app.app_context():
+        db.session.add(Autores(id_autor=41, nombres='N', apellidos='Previo', nacionalidad='HN',
+                               fecha_nacimiento=date(2000, 1, 1)))
+        db.session.commit()
+
+    with multiprocessing.get_context('spawn').Pool(PROCESOS) as pool:
+        resultados = pool.starmap(_pedir_ids, [(ruta_db, i) for i in range(PROCESOS)])
+
+    ids = [n for ids, _ in resultados for n in ids]
+    errores = [e for _, errores in resultados for e in errores]
+    assert errores == []
+    assert len(ids) == len(set(ids))
+    assert min(ids) > 41
+
+    with app.app_context():
+        guardados = db.session.scalars(select(Autores.id_autor)).all()
+        siguiente = db.session.scalar(select(Secuencias.siguiente).where(Secuencias.nombre == 'Autores'))
+    assert sorted(guardados) == sorted(ids + [41])
+    assert siguiente > max(ids)
+
+
+def test_siguiente_id_sin_repetidos_entre_hilos(app):
+    from app.services.ids import id_allocator, siguiente_id
+    from models import Autores
+
+    id_allocator.bloque = 7
+    ids = []
+
+    def hilo():
+        with app.app_context():
+            ids.extend(siguiente_id(Autores) for _ in range(200))
+
+    hilos = [threading.Thread(target=hilo) for _ in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert len(ids) == len(set(ids)) == 1600
+
+
+def test_reinicio_continua_sobre_la_secuencia_persistida(app):
+    from app import db
+    from app.services.ids import IdAllocator
+    from models import Autores, Secuencias
+
+    with app.app_context():
+        primero = IdAllocator(bloque=10)
+        # Se usan 3 IDs de un bloque de 10: el resto del bloque se pierde al reiniciar
+        antes = [primero.siguiente(Autores) for _ in range(3)]
+        persistido = db.session.scalar(select(Secuencias.siguiente).where(Secuencias.nombre == 'Autores'))
+        assert persistido > max(antes)
+
+        # Nuevo worker (reinicio): no conoce el bloque anterior
+        segundo = IdAllocator(bloque=10)
+        despues = [segundo.siguiente(Autores) for _ in range(15)]
+        assert min(despues) >= persistido
+        assert min(despues) > max(antes)
+        assert len(set(antes + despues)) == 18
+
+        # Y el asignador anterior, si sigue vivo, no pisa el bloque del nuevo
+        assert set(primero.siguiente(Autores) for _ in range(10)).isdisjoint(despues)
@@ -0,0 +1,61 @@
+"""Importación de clientes: un lote sin contraseñas no pierde el reporte de los ya guardados."""
+import io
+
+from sqlalchemy import func, select
+
+from app.services.passwords import PasswordHasher, PasswordServiceBusy
+
+
+class HasherOcupadoEnLote(PasswordHasher):
+    """Falla con PasswordServiceBusy en la llamada número `ocupado` a hash_lote"""
+
+    def __init__(self, ocupado):
+        super().__init__(workers=0, rounds=4)
+        self.ocupado = ocupado
+        self.llamadas = 0
+
+    def hash_lote(self, passwords, pepper):
+        self.llamadas += 1
+        if self.llamadas == self.ocupado:
+            raise PasswordServiceBusy('ocupado')
+        return super().hash_lote(passwords, pepper)
+
+
+def _csv(n):
+    filas = ['nombres,apellidos,email']
+    filas += [f'Ana,Lopez,cliente{i}@ejemplo.com' for i in range(n)]
+    return io.StringIO('\n'.join(filas) + '\n')
+
+
+def test_importar_clientes_con_servicio_ocupado(app):
+    from app import db
+    from app.services.importar import importar_clientes
+    from models import Clientes, EstadoUsuarios
+
+    with app.app_context():
+        db.session.add(EstadoUsuarios(id_estado=1, nombre='Activo', permite_login=1))
+        db.session.commit()
+
+        reporte = importar_clientes(_csv(9), tamano_lote=3, hasher=HasherOcupadoEnLote(ocupado=2))
+
+        assert reporte.procesadas == 9
+        assert reporte.insertadas == 6
+        # Las filas 5 a 7 (segundo lote) quedan con error; el resto tiene su contraseña
+        assert [linea for linea, _ in reporte.errores] == [5, 6, 7]
+        assert [linea for linea, *_ in reporte.creados] == [2, 3, 4, 8, 9, 10]
+        assert all(temporal for *_, temporal in reporte.creados)
+        assert db.session.scalar(select(func.count()).select_from(Clientes)) == 6
+
+
+def test_decimal_rechaza_no_finitos():
+    from decimal import Decimal
+
+    from app.services.importar import _decimal
+
+    for valor in ('NaN', 'nan', 'sNaN', 'Infinity', '-Inf', '1e30', '-1'):
+        errores = []
+        assert _decimal(valor, 'precio_venta', errores) is None
+        assert len(errores) == 1
+    errores = []
+    assert _decimal('1,234.567', 'precio_venta', errores) == Decimal('1234.57')
+    assert errores == []
@@ -0,0 +1,122 @@
+"""Impuestos en centavos enteros: mismos totales que Decimal con ROUND_HALF_UP."""
+import random
+from array import array
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import pytest
+from sqlalchemy import BigInteger, case, cast, func, select, update
+
+from tests.base import sembrar_tienda
+
+REGLAS = dict(tasa_15=1500, tasa_18=1800, libros_18=frozenset({2, 5}), libros_exentos=frozenset({3}))
+CENTAVO = Decimal('0.01')
+
+
+def _ventas_al_azar(cantidad, semilla=0):
+    rnd = random.Random(semilla)
+    ventas = []
+    for _ in range(cantidad):
+        lineas = [(rnd.randint(1, 6), rnd.randint(1, 5), rnd.choice((1, 7, 10, 33, 50, 99, 333, 9999, 123457)))
+                  for _ in range(rnd.randint(0, 5))]
+        descuento = rnd.choice((0, 0, 1, 5, 50, 333, 10 ** 7))
+        ventas.append((lineas, descuento, rnd.random() < .2))
+    return ventas
+
+
+def test_centavos_iguales_a_decimal():
+    from app.services.impuestos import (ReglasImpuestos, a_centavos, calcular_decimal, calcular_lote,
+                                        calcular_venta)
+
+    reglas = ReglasImpuestos(**REGLAS)
+    ventas = _ventas_al_azar(3000)
+    lote = calcular_lote(
+        [len(lineas) for lineas, _, _ in ventas],
+        reglas.clases(l for lineas, _, _ in ventas for l, _, _ in lineas),
+        array('q', (c for lineas, _, _ in ventas for _, c, _ in lineas)),
+        array('q', (p for lineas, _, _ in ventas for _, _, p in lineas)),
+        [d for _, d, _ in ventas], [e for _, _, e in ventas], reglas,
+    )
+    for i, (lineas, descuento, exonerado) in enumerate(ventas):
+        centavos = calcular_venta(lineas, reglas, descuento, exonerado)
+        referencia = calcular_decimal([(l, c, Decimal(p).scaleb(-2)) for l, c, p in lineas], reglas,
+                                      Decimal(descuento).scaleb(-2), exonerado)
+        assert tuple(centavos) == tuple(map(a_centavos, referencia)) == tuple(campo[i] for campo in lote)
+
+
+@pytest.mark.parametrize('lineas, descuento, exonerado, esperado', [
+    # 0.10 × 15 % = 0.015 -> 0.02 (la mitad sube)
+    ([(1, 1, 10)], 0, False, (10, 0, 2, 0, 0, 12)),
+    # 0.30 × 15 % = 0.045 -> 0.05; 0.70 × 18 % = 0.126 -> 0.13
+    ([(1, 1, 30), (2, 1, 70)], 0, False, (100, 0, 5, 13, 0, 118)),
+    # Descuento 0.01 sobre 0.03 en tres clases: D15 = red(1/3) = 0, D18 = red(2/3) - 0 = 1
+    ([(1, 1, 1), (2, 1, 1), (3, 1, 1)], 1, False, (3, 1, 0, 0, 0, 2)),
+    # Descuento mayor que el subtotal: se limita a S y no hay ISV
+    ([(1, 2, 50), (3, 1, 25)], 1000, False, (125, 125, 0, 0, 0, 0)),
+    # Exonerada: sin ISV, base gravada (sin los exentos) como importe exonerado
+    ([(1, 1, 1000), (2, 1, 500), (3, 1, 300)], 180, True, (1800, 180, 0, 0, 1350, 1620)),
+    ([], 0, False, (0, 0, 0, 0, 0, 0)),
+])
+def test_redondeo(lineas, descuento, exonerado, esperado):
+    from app.services.impuestos import ReglasImpuestos, calcular_venta
+
+    assert tuple(calcular_venta(lineas, ReglasImpuestos(**REGLAS), descuento, exonerado)) == esperado
+
+
+def _recalcular_con_sql(sesion, reglas):
+    """Subtotales por clase con SQL y la regla documentada en impuestos.py aplicada con Decimal"""
+    from models import DetalleVenta as DV, Venta
+
+    importe = cast(func.round(DV.precio_unitario * 100, 0), BigInteger) * DV.cantidad
+    clase = lambda libros: func.sum(case((DV.id_libro.in_(libros), importe), else_=0)) if libros else 0
+    filas = sesion.execute(
+        select(Venta.id_venta, Venta.descuento, Venta.exonerado, func.sum(importe),
+               clase(reglas.libros_18), clase(reglas.libros_exentos))
+        .join(DV, DV.id_venta == Venta.id_venta).group_by(Venta.id_venta, Venta.descuento, Venta.exonerado)
+    ).all()
+    esperados = {}
+    for id_venta, descuento, exonerado, s, s18, s0 in filas:
+        s, s18, s0 = (Decimal(v).scaleb(-2) for v in (s, s18, s0))
+        s15 = s - s18 - s0
+        d = min(Decimal(str(descuento)), s)
+        d15 = (d * s15 / s).quantize(CENTAVO, ROUND_HALF_UP)
+        d18 = (d * (s15 + s18) / s).quantize(CENTAVO, ROUND_HALF_UP) - d15
+        b15, b18 = s15 - d15, s18 - d18
+        if exonerado:
+            esperados[id_venta] = (s, d, 0, 0, b15 + b18, s - d)
+        else:
+            isv_15 = (b15 * Decimal('0.15')).quantize(CENTAVO, ROUND_HALF_UP)
+            isv_18 = (b18 * Decimal('0.18')).quantize(CENTAVO, ROUND_HALF_UP)
+            esperados[id_venta] = (s, d, isv_15, isv_18, 0, s - d + isv_15 + isv_18)
+    return esperados
+
+
+def test_recalcular_ventas_igual_a_sql(app):
+    from app import db
+    from app.services.impuestos import ReglasImpuestos, recalcular_ventas
+    from app.services.ventas import procesar_venta
+    from models import Libros, Venta
+
+    sembrar_tienda(app, sucursales=1, libros=6)
+    rnd = random.Random(1)
+    reglas = ReglasImpuestos(**REGLAS)
+    with app.app_context():
+        for id_libro, precio in zip(range(1, 7), ('0.10', '0.33', '99.99', '12.35', '0.07', '1234.45')):
+            db.session.execute(update(Libros).where(Libros.id_libro == id_libro).values(precio_venta=Decimal(precio)))
+        db.session.commit()
+        for _ in range(40):
+            procesar_venta([(rnd.randint(1, 6), rnd.randint(1, 4)) for _ in range(rnd.randint(1, 4))], 1, 1, 1, 1,
+                           descuento=rnd.choice(('0', '0.01', '0.05', '3.33', '5000')),
+                           exoneracion='EX-1' if rnd.random() < .25 else None)
+        # Las ventas se registraron con las reglas por defecto; el recálculo aplica otras
+        ahora = datetime.now()
+        ventas, _, cambiadas = recalcular_ventas(ahora - timedelta(days=1), ahora + timedelta(days=1), reglas,
+                                                 tamano_lote=7)
+        assert ventas == 40 and cambiadas > 0
+
+        esperados = _recalcular_con_sql(db.session, reglas)
+        guardados = db.session.execute(select(Venta.id_venta, Venta.subtotal, Venta.descuento, Venta.isv_15,
+                                              Venta.isv_18, Venta.importe_exonerado, Venta.total)).all()
+    assert len(esperados) == len(guardados) == 40
+    for id_venta, *importes in guardados:
+        assert tuple(Decimal(str(v)).quantize(CENTAVO) for v in importes) == esperados[id_venta]
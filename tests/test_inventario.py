@@ -0,0 +1,110 @@
+"""Movimientos concurrentes sobre las mismas claves: sin actualizaciones perdidas y con saldos encadenados."""
+import multiprocessing
+import random
+import threading
+from collections import Counter, defaultdict
+
+from sqlalchemy import insert, select
+
+PROCESOS = 3
+HILOS = 3
+POR_HILO = 80
+# La primera clave recibe la mayoría de los movimientos; los formatos se escriben de varias formas
+CLAVES = [(1, 1, 'Físico'), (1, 2, 'fisico'), (2, 1, 'FISICO'), (3, 1, 'Digital')]
+
+
+def _mover(ruta_db, semilla):
+    """Proceso hijo: HILOS cajas registrando entradas y salidas al azar"""
+    from tests.base import crear_app
+
+    app = crear_app(ruta_db)
+    from app import db
+    from app.services.inventario import StockInsuficiente, registrar_movimiento, registrar_movimientos
+
+    resultado, errores = Counter(), []
+
+    def hilo(k):
+        rnd = random.Random(semilla * 100 + k)
+        with app.app_context():
+            for _ in range(POR_HILO):
+                id_libro, id_sucursal, formato = CLAVES[0] if rnd.random() < .6 else rnd.choice(CLAVES)
+                cantidad = rnd.choice((5, 3, -2, -4, 1, -1))
+                try:
+                    if rnd.random() < .2:
+                        # Dos claves en la misma transacción, pasadas sin ordenar
+                        registrar_movimientos([
+                            dict(id_libro=id_libro, id_sucursal=id_sucursal, formato=formato, cantidad=cantidad,
+                                 tipo_movimiento='venta', motivo='prueba'),
+                            dict(id_libro=1, id_sucursal=1, formato='fisico', cantidad=-1,
+                                 tipo_movimiento='venta', motivo='prueba'),
+                        ], id_empleado=1)
+                    else:
+                        registrar_movimiento(id_libro, id_sucursal, formato, cantidad, 'ajuste', 1, 'prueba')
+                    db.session.commit()
+                    resultado['confirmados'] += 1
+                except StockInsuficiente:
+                    db.session.rollback()
+                    resultado['insuficiente'] += 1
+                except Exception as error:
+                    db.session.rollback()
+                    errores.append(repr(error))
+            db.session.remove()
+
+    hilos = [threading.Thread(target=hilo, args=(k,)) for k in range(HILOS)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return resultado, errores
+
+
+def test_movimientos_concurrentes(app, ruta_db):
+    from app import db
+    from models import Inventarios, Libros, StockActual
+
+    with app.app_context():
+        db.session.execute(insert(Libros), [
+            dict(id_libro=i, isbn=str(i), titulo='Libro', formato='Físico', num_pag=1, stock_fisico=0,
+                 stock_digital=0, precio_venta=1, precio_prestamo=1)
+            for i in (1, 2, 3)
+        ])
+        db.session.commit()
+
+    with multiprocessing.get_context('spawn').Pool(PROCESOS) as pool:
+        resultados = pool.starmap(_mover, [(ruta_db, i) for i in range(PROCESOS)])
+
+    assert [e for _, errores in resultados for e in errores] == []
+    confirmados = sum(r['confirmados'] for r, _ in resultados)
+    assert confirmados > 0 and sum(r['insuficiente'] for r, _ in resultados) > 0
+
+    with app.app_context():
+        movimientos = db.session.execute(select(
+            Inventarios.id_libro, Inventarios.id_sucursal, Inventarios.formato, Inventarios.cantidad,
+            Inventarios.stock_anterior, Inventarios.stock_nuevo)).all()
+        saldos = {(s.id_libro, s.id_sucursal, s.formato): s.stock for s in db.session.scalars(select(StockActual))}
+        totales = {l.id_libro: (l.stock_fisico, l.stock_digital) for l in db.session.scalars(select(Libros))}
+
+    por_clave = defaultdict(list)
+    for m in movimientos:
+        por_clave[(m.id_libro, m.id_sucursal, m.formato)].append(m)
+    # Las variantes del formato caen en la misma clave
+    assert set(por_clave) == {(1, 1, 'fisico'), (1, 2, 'fisico'), (2, 1, 'fisico'), (3, 1, 'digital')}
+
+    for clave, lista in por_clave.items():
+        # Sin actualizaciones perdidas: el saldo es la suma de los movimientos confirmados
+        assert saldos[clave] == sum(m.cantidad for m in lista)
+        # Cada saldo nuevo es el anterior de exactamente un movimiento siguiente:
+        # la cadena va de 0 al saldo actual sin repetir ni saltar eslabones
+        balance = Counter()
+        for m in lista:
+            assert m.stock_nuevo == m.stock_anterior + m.cantidad
+            assert m.stock_nuevo >= 0
+            balance[m.stock_anterior] += 1
+            balance[m.stock_nuevo] -= 1
+        esperado = Counter({0: 1})
+        esperado[saldos[clave]] -= 1
+        assert +balance == +esperado and -balance == -esperado
+
+    for id_libro, (fisico, digital) in totales.items():
+        assert fisico == sum(s for (l, _, f), s in saldos.items() if l == id_libro and f == 'fisico')
+        assert digital == sum(s for (l, _, f), s in saldos.items() if l == id_libro and f == 'digital')
@@ -0,0 +1,76 @@
+"""Límite de intentos de login: ventana deslizante y fin del bloqueo."""
+import pytest
+
+from app.services import login_throttle as modulo
+from app.services.login_throttle import LoginThrottle, MemoryThrottleBackend
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(modulo.time, 'monotonic', reloj)
+    return reloj
+
+
+def test_bloqueo_por_email_y_vencimiento(reloj):
+    throttle = LoginThrottle(max_por_email=3, max_por_ip=100, ventana=60)
+    for segundo in (0, 10, 20):
+        reloj.ahora = 1000 + segundo
+        assert throttle.bloqueado('Ana@Correo.hn', '10.0.0.1') == 0
+        throttle.registrar_fallo('ana@correo.hn ', '10.0.0.1')
+
+    # El tercer fallo (segundo 20) bloquea hasta que el primero (segundo 0) sale de la ventana
+    reloj.ahora = 1025
+    espera = throttle.bloqueado('ana@correo.hn', '10.0.0.2')
+    assert 35 <= espera <= 36
+    reloj.ahora = 1059.5
+    assert throttle.bloqueado('ana@correo.hn', '10.0.0.2') > 0
+    reloj.ahora = 1060
+    assert throttle.bloqueado('ana@correo.hn', '10.0.0.2') == 0
+
+    # Ventana deslizante: un fallo más vuelve a bloquear, porque los de los segundos 10 y 20 siguen dentro
+    throttle.registrar_fallo('ana@correo.hn', '10.0.0.2')
+    assert throttle.bloqueado('ana@correo.hn', '10.0.0.2') > 0
+    reloj.ahora = 1081
+    assert throttle.bloqueado('ana@correo.hn', '10.0.0.2') == 0
+
+
+def test_bloqueo_por_ip_sobrevive_al_exito_de_una_cuenta(reloj):
+    throttle = LoginThrottle(max_por_email=5, max_por_ip=4, ventana=60)
+    for i in range(4):
+        throttle.registrar_fallo(f'usuario{i}@correo.hn', '10.0.0.9')
+    assert throttle.bloqueado('otro@correo.hn', '10.0.0.9') > 0
+    assert throttle.bloqueado('otro@correo.hn', '10.0.0.10') == 0
+
+    throttle.registrar_exito('usuario0@correo.hn', '10.0.0.9')
+    assert throttle.bloqueado('usuario0@correo.hn', '10.0.0.10') == 0
+    assert throttle.bloqueado('usuario0@correo.hn', '10.0.0.9') > 0
+
+
+def test_exito_limpia_la_cuenta(reloj):
+    throttle = LoginThrottle(max_por_email=2, max_por_ip=100, ventana=60)
+    throttle.registrar_fallo('ana@correo.hn', '10.0.0.1')
+    throttle.registrar_fallo('ana@correo.hn', '10.0.0.1')
+    assert throttle.bloqueado('ana@correo.hn', '10.0.0.1') > 0
+    throttle.registrar_exito('ana@correo.hn', '10.0.0.1')
+    assert throttle.bloqueado('ana@correo.hn', '10.0.0.1') == 0
+
+
+def test_memoria_acotada(reloj):
+    backend = MemoryThrottleBackend(max_keys=3)
+    for i in range(10):
+        backend.hit(f'ip:{i}', 5, 60)
+    assert len(backend) == 3
+    # Las claves vencidas se descartan al consultarlas
+    reloj.ahora += 61
+    for i in range(7, 10):
+        assert backend.retry_after(f'ip:{i}', 1, 60) == 0
+    assert len(backend) == 0
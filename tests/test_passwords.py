@@ -0,0 +1,118 @@
+"""Servicio de hash de contraseñas: admisión acotada y métricas."""
+import time
+
+import pytest
+from sqlalchemy import select
+
+from app.services.passwords import PasswordHasher, PasswordServiceBusy
+
+
+def test_metricas_separan_canceladas_y_fallidas():
+    hasher = PasswordHasher(workers=1, max_pending=8, timeout=0.2, rounds=4)
+    try:
+        # Vence la espera pero la operación sigue ocupando su lugar hasta terminar
+        with pytest.raises(PasswordServiceBusy):
+            hasher._run(time.sleep, 0.5)
+        assert hasher.metrics()['queue_depth'] == 1
+
+        # Las que aún no empezaron se pueden cancelar; las demás terminan
+        futuros = [hasher._enviar(time.sleep, 0.1) for _ in range(5)]
+        canceladas = sum(f.cancel() for f in futuros)
+        assert canceladas > 0
+        for f in futuros:
+            if not f.cancelled():
+                f.result()
+        # La primera operación (0.5 s) todavía puede estar en el proceso
+        limite = time.monotonic() + 5
+        while hasher.metrics()['queue_depth'] and time.monotonic() < limite:
+            time.sleep(0.05)
+        with pytest.raises(ValueError):
+            hasher._run(int, 'x')
+
+        metricas = hasher.metrics()
+        assert metricas['cancelled'] == canceladas
+        assert metricas['completed'] == 1 + 5 - canceladas
+        assert metricas['failed'] == 1
+        assert metricas['rejected'] == 1
+        assert metricas['queue_depth'] == 0
+        assert metricas['latency_max_ms'] >= 500
+    finally:
+        hasher.shutdown()
+
+
+def test_metricas_sin_pool():
+    hasher = PasswordHasher(workers=0, rounds=4)
+    with pytest.raises(ValueError):
+        hasher._run(int, 'x')
+    assert len(hasher.hash_lote(['uno', 'dos'], 'pepper')) == 2
+    metricas = hasher.metrics()
+    assert (metricas['completed'], metricas['failed'], metricas['queue_depth']) == (2, 1, 0)
+
+
+def _hash_legacy(password, pepper, rounds=4):
+    # Formato original: 64 hex de sal + bcrypt codificado en hex
+    import secrets
+    from bcrypt import gensalt, hashpw
+    from app.services.passwords import _hmac_password
+
+    sal = secrets.token_hex(32)
+    return sal + hashpw(_hmac_password(password, pepper, sal), gensalt(rounds=rounds)).hex()
+
+
+@pytest.mark.parametrize('formato', ['v1', 'werkzeug', 'legacy'])
+def test_formatos_de_hash(formato):
+    from werkzeug.security import generate_password_hash
+    from app.services.passwords import _hash_password_sync, _verify_password_sync, formato_hash, necesita_rehash
+
+    pepper = 'pepper'
+    guardado = {
+        'v1': lambda: _hash_password_sync('Secreta#1', pepper, 4),
+        'werkzeug': lambda: generate_password_hash('Secreta#1'),
+        'legacy': lambda: _hash_legacy('Secreta#1', pepper),
+    }[formato]()
+
+    assert formato_hash(guardado) == formato
+    assert _verify_password_sync('Secreta#1', guardado, pepper)
+    assert not _verify_password_sync('Secreta#2', guardado, pepper)
+    # Solo v1 con el costo configurado se queda como está
+    assert necesita_rehash(guardado, 4) == (formato != 'v1')
+    assert necesita_rehash(guardado, 5)
+
+
+@pytest.mark.parametrize('guardado', [None, '', 'abc', 'z' * 80, '$2b$04$' + 'x' * 53])
+def test_formato_desconocido(guardado):
+    from app.services.passwords import _verify_password_sync, formato_hash
+
+    assert formato_hash(guardado) is None
+    assert not _verify_password_sync('Secreta#1', guardado, 'pepper')
+
+
+@pytest.mark.parametrize('formato', ['werkzeug', 'legacy'])
+def test_login_rehashea_formatos_antiguos(app, formato):
+    from datetime import datetime
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.services.passwords import _verify_password_sync, formato_hash, password_service
+    from models import Clientes, EstadoUsuarios
+
+    pepper = app.config['PEPPER_SECRET']
+    antiguo = generate_password_hash('Secreta#1') if formato == 'werkzeug' else _hash_legacy('Secreta#1', pepper)
+    with app.app_context():
+        db.session.add(EstadoUsuarios(id_estado=1, nombre='Activo', permite_login=1))
+        db.session.add(Clientes(id_cliente=1, nombres='Ana', apellidos='Pérez', email='Ana@Ejemplo.com',
+                                password_hash=antiguo, telefono='-', direccion='-', tipo_usuario='cliente',
+                                fecha_registro=datetime.now(), ot=0, id_estado=1))
+        db.session.commit()
+    rehasheados = password_service.metrics()['rehashed']
+
+    respuesta = app.test_client().post('/login', data={'email': 'ana@ejemplo.com', 'password': 'Secreta#1'})
+    assert respuesta.status_code == 302
+    # El re-hash corre en un único hilo: esperar a que termine lo encolado
+    password_service._rehash_executor.submit(lambda: None).result(timeout=10)
+
+    with app.app_context():
+        nuevo = db.session.scalar(select(Clientes.password_hash).where(Clientes.id_cliente == 1))
+    assert formato_hash(nuevo) == 'v1'
+    assert _verify_password_sync('Secreta#1', nuevo, pepper)
+    assert not password_service.necesita_rehash(nuevo)
+    assert password_service.metrics()['rehashed'] == rehasheados + 1
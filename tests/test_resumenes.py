@@ -0,0 +1,90 @@
+"""Resúmenes incrementales (ventas y anulaciones) iguales a agrupar las tablas de hechos."""
+import random
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from tests.base import sembrar_tienda
+
+IMPORTES = ('subtotal', 'descuento', 'isv_15', 'isv_18', 'importe_exonerado', 'total')
+CENTAVO = Decimal('0.01')
+
+
+def _c(valor):
+    return Decimal(str(valor)).quantize(CENTAVO)
+
+
+def _resumenes(sesion):
+    """({clave del día: valores}, {id_libro: valores}) tal como están en las tablas"""
+    from models import ResumenVentasDia as D, ResumenVentasLibro as L
+
+    dias = {(f.fecha, f.id_sucursal, f.id_empleado, f.id_metodo_pago):
+            (f.ventas, f.anuladas, f.unidades, *(_c(getattr(f, c)) for c in IMPORTES))
+            for f in sesion.scalars(select(D))}
+    # Un libro cuyas ventas se anularon todas queda en cero; reconstruir no crea esa fila
+    libros = {(f.fecha, f.id_libro): (f.ventas, f.unidades, _c(f.importe))
+              for f in sesion.scalars(select(L)) if f.ventas}
+    return dias, libros
+
+
+def _agrupar(sesion):
+    """Lo mismo recorriendo Venta, Detalle_Venta y Facturas_Sar fila por fila"""
+    from models import DetalleVenta, FacturasSar, Venta
+
+    dias = defaultdict(lambda: [0, 0, 0] + [Decimal(0)] * len(IMPORTES))
+    libros = defaultdict(lambda: [set(), 0, Decimal(0)])
+    filas = sesion.execute(select(Venta, FacturasSar.id_sucursal, FacturasSar.anulada)
+                           .join(FacturasSar, FacturasSar.id_venta == Venta.id_venta)).all()
+    for venta, id_sucursal, anulada in filas:
+        fecha = venta.fecha_venta.date()
+        detalle = sesion.scalars(select(DetalleVenta).where(DetalleVenta.id_venta == venta.id_venta)).all()
+        fila = dias[(fecha, id_sucursal, venta.id_empleado, venta.id_metodo_pago)]
+        if anulada:
+            fila[1] += 1
+            continue
+        fila[0] += 1
+        fila[2] += sum(d.cantidad for d in detalle)
+        for i, campo in enumerate(IMPORTES, 3):
+            fila[i] += _c(getattr(venta, campo))
+        for d in detalle:
+            libro = libros[(fecha, d.id_libro)]
+            libro[0].add(venta.id_venta)
+            libro[1] += d.cantidad
+            libro[2] += _c(d.subtotal)
+    return ({k: tuple(v) for k, v in dias.items()},
+            {k: (len(ventas), unidades, importe) for k, (ventas, unidades, importe) in libros.items()})
+
+
+def test_resumenes_incrementales(app):
+    from app import db
+    from app.services.resumenes import reconstruir_dia
+    from app.services.ventas import anular_venta, procesar_venta
+
+    sembrar_tienda(app, sucursales=2, libros=5)
+    rnd = random.Random(3)
+    with app.app_context():
+        ventas = []
+        for _ in range(60):
+            carrito = [(rnd.randint(1, 5), rnd.randint(1, 3)) for _ in range(rnd.randint(1, 4))]
+            ventas.append(procesar_venta(carrito, rnd.randint(1, 2), rnd.randint(1, 3), 1, rnd.randint(1, 2),
+                                         descuento=rnd.choice(('0', '1.50', '10')),
+                                         exoneracion='EX-1' if rnd.random() < .2 else None).id_venta)
+        anuladas = rnd.sample(ventas, 12)
+        for id_venta in anuladas:
+            assert anular_venta(id_venta)
+        # Anular dos veces no descuenta dos veces
+        assert not anular_venta(anuladas[0])
+
+        incrementales = _resumenes(db.session)
+        esperados = _agrupar(db.session)
+        assert incrementales == esperados
+        assert sum(f[1] for f in incrementales[0].values()) == 12
+
+        # reconstruir_dia llega a las mismas filas desde las tablas de hechos
+        db.session.close()
+        with db.engine.begin() as conn:
+            total, _, _ = reconstruir_dia(conn, date.today())
+        assert total == 60
+        assert _resumenes(db.session) == esperados
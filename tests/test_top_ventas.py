@@ -0,0 +1,97 @@
+"""Top N por grupo con heaps: mismo resultado que ordenar todo."""
+import random
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from tests.base import sembrar_tienda
+
+CENTAVO = Decimal('0.01')
+
+
+def _ordenar_todo(filas, n):
+    por_grupo = {}
+    for grupo, id_libro, unidades, importe in filas:
+        por_grupo.setdefault(grupo, []).append((id_libro, unidades, importe))
+    return {grupo: sorted(libros, key=lambda l: (-l[1], l[0]))[:n] for grupo, libros in por_grupo.items()}
+
+
+@pytest.mark.parametrize('n', [1, 2, 5, 40])
+def test_top_por_grupo(n):
+    from app.services.top_ventas import top_por_grupo
+
+    rnd = random.Random(n)
+    # Pocas cantidades distintas: casi todo son empates que decide el id_libro
+    filas = [(g, l, rnd.randint(1, 4), Decimal(rnd.randint(1, 999))) for g in range(1, 6)
+             for l in rnd.sample(range(1, 200), rnd.randint(1, 30))]
+    rnd.shuffle(filas)
+    resultado = top_por_grupo(iter(filas), n)
+    assert resultado == _ordenar_todo(filas, n)
+    assert all(len(libros) <= n for libros in resultado.values())
+
+
+def test_top_por_grupo_empates():
+    from app.services.top_ventas import top_por_grupo
+
+    filas = [('a', 9, 5, 1), ('a', 3, 5, 2), ('a', 7, 8, 3), ('a', 1, 2, 4), ('a', 4, 5, 5)]
+    assert top_por_grupo(filas, 3) == {'a': [(7, 8, 3), (3, 5, 2), (4, 5, 5)]}
+    assert top_por_grupo(filas, 0) == {}
+    assert top_por_grupo([], 3) == {}
+
+
+def _top_sql(sesion, dimension, n):
+    """ROW_NUMBER sobre el agrupado completo del día"""
+    from models import DetalleVenta, FacturasSar, LibroCategoria, ResumenVentasLibro as R
+
+    if dimension == 'categoria':
+        agrupado = (select(LibroCategoria.id_categoria.label('grupo'), R.id_libro.label('id_libro'),
+                           func.sum(R.unidades).label('unidades'), func.sum(R.importe).label('importe'))
+                    .join(LibroCategoria, LibroCategoria.id_libro == R.id_libro)
+                    .where(R.fecha == date.today()).group_by(LibroCategoria.id_categoria, R.id_libro))
+    else:
+        agrupado = (select(FacturasSar.id_sucursal.label('grupo'), DetalleVenta.id_libro.label('id_libro'),
+                           func.sum(DetalleVenta.cantidad).label('unidades'),
+                           func.sum(DetalleVenta.subtotal).label('importe'))
+                    .join(FacturasSar, FacturasSar.id_venta == DetalleVenta.id_venta)
+                    .where(FacturasSar.anulada == 0).group_by(FacturasSar.id_sucursal, DetalleVenta.id_libro))
+    agrupado = agrupado.subquery()
+    puesto = func.row_number().over(partition_by=agrupado.c.grupo,
+                                    order_by=(agrupado.c.unidades.desc(), agrupado.c.id_libro)).label('puesto')
+    numerado = select(agrupado, puesto).subquery()
+    top = {}
+    for grupo, id_libro, unidades, importe, _ in sesion.execute(
+            select(numerado).where(numerado.c.puesto <= n).order_by(numerado.c.grupo, numerado.c.puesto)):
+        top.setdefault(grupo, []).append((id_libro, unidades, Decimal(str(importe)).quantize(CENTAVO)))
+    return top
+
+
+@pytest.mark.parametrize('dimension', ['categoria', 'sucursal'])
+def test_calcular_top_igual_a_sql(app, dimension):
+    from app import db
+    from app.services.top_ventas import calcular_top
+    from app.services.ventas import anular_venta, procesar_venta
+    from models import Categorias, LibroCategoria
+
+    sembrar_tienda(app, sucursales=3, libros=25)
+    rnd = random.Random(7)
+    with app.app_context():
+        db.session.execute(insert(Categorias), [dict(id_categoria=c, nombre=f'C{c}', descripcion='-')
+                                                for c in range(1, 5)])
+        # Cada libro en una o dos categorías
+        pares = {(l, c) for l in range(1, 26) for c in rnd.sample(range(1, 5), rnd.randint(1, 2))}
+        db.session.execute(insert(LibroCategoria), [dict(id_libro_categoria=i, id_libro=l, id_categoria=c)
+                                                    for i, (l, c) in enumerate(sorted(pares), 1)])
+        db.session.commit()
+        ventas = [procesar_venta([(rnd.randint(1, 25), rnd.randint(1, 2)) for _ in range(rnd.randint(1, 3))],
+                                 rnd.randint(1, 3), 1, 1, 1).id_venta for _ in range(80)]
+        for id_venta in rnd.sample(ventas, 10):
+            anular_venta(id_venta)
+
+        for n in (1, 3, 10, 100):
+            top = calcular_top(dimension, date.today(), date.today(), n)
+            obtenido = {grupo: [(l.id_libro, l.unidades, Decimal(str(l.importe)).quantize(CENTAVO)) for l in libros]
+                        for grupo, libros in top.grupos.items()}
+            assert obtenido == _top_sql(db.session, dimension, n)
+            assert all(l.titulo == f'Libro {l.id_libro}' for libros in top.grupos.values() for l in libros)
@@ -0,0 +1,39 @@
+"""Cache del usuario autenticado: invalidación visible desde otros workers."""
+from datetime import datetime
+
+from sqlalchemy import update
+
+
+def test_invalidacion_llega_a_otros_workers(app, monkeypatch):
+    from app import db
+    from app.services.catalogos import catalogos
+    from app.services.user_cache import UserCache, cargar_usuario_sesion
+    from models import Clientes, EstadoUsuarios
+
+    monkeypatch.setattr(catalogos, 'intervalo', 0)
+    worker_a, worker_b = UserCache(), UserCache()
+    with app.app_context():
+        db.session.add_all([EstadoUsuarios(id_estado=1, nombre='Activo', permite_login=1),
+                            EstadoUsuarios(id_estado=2, nombre='Bloqueado', permite_login=0)])
+        db.session.add(Clientes(id_cliente=1, nombres='Ana', apellidos='Pérez', email='ana@ejemplo.com',
+                                password_hash='-', telefono='-', direccion='-', tipo_usuario='cliente',
+                                fecha_registro=datetime.now(), ot=0, id_estado=1))
+        db.session.commit()
+        assert worker_a.get(1, cargar_usuario_sesion).is_active
+        assert worker_b.get(1, cargar_usuario_sesion).is_active
+
+        # Sin invalidar, cada worker sigue sirviendo su copia hasta el TTL
+        db.session.execute(update(Clientes).where(Clientes.id_cliente == 1).values(id_estado=2))
+        db.session.commit()
+        assert worker_b.get(1, cargar_usuario_sesion).is_active
+
+        # La vista corre en el worker A; B lo ve por Versiones_Catalogo
+        worker_a.invalidar(1)
+        assert not worker_b.get(1, cargar_usuario_sesion).is_active
+        assert worker_b.stats()['misses'] == 2
+
+        # Lo mismo al cambiar permite_login de un estado
+        db.session.execute(update(EstadoUsuarios).where(EstadoUsuarios.id_estado == 2).values(permite_login=1))
+        db.session.commit()
+        worker_a.invalidar_estado(2)
+        assert worker_b.get(1, cargar_usuario_sesion).is_active
@@ -0,0 +1,109 @@
+"""procesar_venta: validaciones antes de reservar números de factura y manejo del número."""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, select, update
+
+from tests.base import sembrar_tienda
+
+
+@pytest.fixture
+def tienda(app):
+    sembrar_tienda(app, sucursales=1, libros=3)
+    return app
+
+
+@pytest.mark.parametrize('descuento', [-1, '-0.01', 'NaN', 'abc'])
+def test_descuento_invalido(tienda, descuento):
+    from app import db
+    from app.services.ventas import VentaRechazada, procesar_venta
+    from models import FacturasBloques, Venta
+
+    with tienda.app_context():
+        with pytest.raises(VentaRechazada):
+            procesar_venta([(1, 1)], 1, 1, 1, 1, descuento=descuento)
+        assert db.session.scalar(select(func.count()).select_from(Venta)) == 0
+        # Se rechaza antes de reservar un bloque de números
+        assert db.session.scalar(select(func.count()).select_from(FacturasBloques)) == 0
+
+
+def test_descuento_mayor_que_el_subtotal(tienda):
+    from app.services.ventas import procesar_venta
+
+    with tienda.app_context():
+        resultado = procesar_venta([(1, 2)], 1, 1, 1, 1, descuento='1000')
+        assert resultado.totales['descuento'] == resultado.totales['subtotal'] == Decimal('202.00')
+        assert resultado.totales['total'] == 0
+        assert resultado.numero_factura == '001-001-01-00000001'
+
+
+def test_medir_ventas(app):
+    resultado = app.test_cli_runner().invoke(
+        args=['medir-ventas', '--sucursales', '2', '--cajas', '2', '--segundos', '1', '--libros', '20'])
+    assert resultado.exit_code == 0, resultado.output
+    assert 'números de factura repetidos: 0' in resultado.output
+    por_sucursal = [l for l in resultado.output.splitlines() if l.startswith('sucursal')]
+    assert len(por_sucursal) == 2
+    assert all(l.endswith(' 0 errores') for l in por_sucursal)
+
+
+def test_falla_al_reservar_ids_no_pierde_el_numero(tienda, monkeypatch):
+    from app.services import ventas
+    from app.services.ventas import procesar_venta
+
+    with tienda.app_context():
+        assert procesar_venta([(1, 1)], 1, 1, 1, 1).numero_factura == '001-001-01-00000001'
+
+        def sin_ids(modelo):
+            raise RuntimeError('No se pudo reservar un bloque de IDs')
+
+        monkeypatch.setattr(ventas, 'siguiente_id', sin_ids)
+        with pytest.raises(RuntimeError):
+            procesar_venta([(2, 1)], 1, 1, 1, 1)
+        monkeypatch.undo()
+
+        # El número siguiente no quedó tomado por la venta que falló
+        assert procesar_venta([(2, 1)], 1, 1, 1, 1).numero_factura == '001-001-01-00000002'
+
+
+def test_esquema_sqlite_no_cambia_la_metadata():
+    from sqlalchemy.dialects import mssql
+    from sqlalchemy.schema import CreateTable
+    from app.services.banco_pruebas import esquema_sqlite
+    from models import Base
+
+    copia = esquema_sqlite()
+    assert copia is not Base.metadata and copia.tables.keys() == Base.metadata.tables.keys()
+    ddl = str(CreateTable(Base.metadata.tables['Clientes']).compile(dialect=mssql.dialect()))
+    assert 'COLLATE Modern_Spanish_CI_AS' in ddl
+    assert 'TINYINT' in ddl
+    assert not any(getattr(c.type, 'collation', None) for t in copia.tables.values() for c in t.columns)
+
+
+def test_numero_ya_vendido_se_descarta(tienda, monkeypatch):
+    from app import db
+    from app.services import ventas
+    from app.services.facturacion import NumeradorFacturas, numeros_factura
+    from app.services.ventas import procesar_venta
+    from models import FacturasBloques
+
+    with tienda.app_context():
+        # Este worker tiene el bloque 1..10 en memoria y deja de renovarlo
+        numeros_factura.devolver(numeros_factura.tomar(1))
+        db.session.execute(update(FacturasBloques).values(fecha_renovacion=datetime.now() - timedelta(days=1)))
+        db.session.commit()
+
+        # Otro worker adopta el bloque y vende el 1
+        otro = NumeradorFacturas(lease=60)
+        monkeypatch.setattr(ventas, 'numeros_factura', otro)
+        assert procesar_venta([(1, 1)], 1, 1, 1, 1).numero_factura == '001-001-01-00000001'
+        monkeypatch.undo()
+
+        # El 1 choca con el índice único: se descarta con su bloque y se usa uno nuevo
+        resultado = procesar_venta([(2, 1)], 1, 1, 1, 1)
+        assert resultado.numero_factura == '001-001-01-00000011'
+        assert resultado.intentos == 2
+        assert numeros_factura.perdidos == 1
+        assert all(n > 10 for n, _ in numeros_factura._libres[1])
+        assert procesar_venta([(3, 1)], 1, 1, 1, 1).numero_factura == '001-001-01-00000012'